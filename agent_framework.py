@@ -1,41 +1,303 @@
+import copy
 import json
+import time
+import asyncio
 import threading
 import configparser
-from typing import Dict, Union, List, Optional
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Callable, Dict, Union, List, Optional, Tuple
 # queue 已经不需要在 framework 里显式使用了，除非用于其他目的
 # import queue 
-import re
-from brain import LLM_Ollama
-from tools import list_all_tools_simple, call_tool_by_name, expose_tools_as_service, get_tool_output_description, get_tool_audio_sync_mode, set_system_tts
+import sys
+from brain import LLM_Ollama, ollama_extra_body
+from llm_router import router
+from tools import ToolTimeoutError, ToolCancelledError, cancel_tool_calls, prepare_tool_call, list_tool_models, list_all_tools_simple, call_tool_by_name, render_tools_prompt, tool_prompt_cost, list_tool_schemas, get_tool_output_description, get_tool_audio_sync_mode, set_system_tts
 from logger import logger
+from utils.speculation import WorkerPrior, SpeculativeRun, SpeculationStats
+from utils.dispatch_parser import DispatchParser
+from utils.json_stream import JsonObjectScanner
+from utils.tracing import tracer
+from utils.intent_router import IntentMatch, IntentRouter
+from utils.summarizer import ConversationSummarizer
+from utils.warmup import ModelWarmup
 # from utils.tts import CosyTTS
+from utils.audio_engine import configure_engine
 from utils.tts import CosyTTS
+from utils.tts_cache import PhraseCache, prerender_phrases
+
+# --- 辅助类：流式回复分句播报 ---
+class _ReplyStreamer:
+    """
+    把 Worker 的流式回复切成可播报的分句，边生成边交给 TTS：
+    - 跳过开头的 <think>...</think>
+    - 一旦出现 JSON / 代码块起始符，停止播报并缓存剩余内容，留给工具调用解析
+    - 正文同时送入增量 JSON 扫描器，每个对象一闭合就返回给调用方，可以在生成结束前执行工具
+    """
+    seg_chars = '。！？，；\n'
+    hold_chars = '{`'
+
+    def __init__(self, speak=None):
+        self.speak = speak
+        self.text = ""
+        self.holding = False
+        self.scanner = JsonObjectScanner()
+        self._pos = 0
+        self._scan_pos = 0
+        self._body_start = None
+        self._start_time = time.perf_counter()
+        self._first_spoken = False
+
+    def _emit(self, segment):
+        if not segment.strip():
+            return
+        if not self._first_spoken:
+            self._first_spoken = True
+            logger.info(f"Worker 首句送入 TTS，距开始生成 {(time.perf_counter()-self._start_time)*1000:.0f} ms")
+        self.speak(segment)
+
+    def _skip_think(self):
+        """定位思考段之后正文的起始位置；返回 False 表示仍在思考段内，需要继续等待"""
+        if self._body_start is not None:
+            return True
+        stripped = self.text.lstrip()
+        if not stripped or (stripped.startswith('<think>') and '</think>' not in self.text) \
+                or '<think>'.startswith(stripped):
+            return False
+        end = self.text.find('</think>') if stripped.startswith('<think>') else -1
+        self._body_start = end + len('</think>') if end != -1 else 0
+        self._pos = self._scan_pos = self._body_start
+        return True
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        送入一段新生成的文本
+        :return: 本段文本中新闭合的 JSON 对象
+        """
+        self.text += chunk
+        if not self._skip_think():
+            return []
+        closed = self.scanner.feed(self.text[self._scan_pos:])
+        self._scan_pos = len(self.text)
+        if self.speak is None or self.holding:
+            return closed
+        pending = self.text[self._pos:]
+        hold_idx = min((i for i in (pending.find(c) for c in self.hold_chars) if i != -1), default=-1)
+        if hold_idx != -1:
+            self.holding = True
+            pending = pending[:hold_idx]
+        cut = max(pending.rfind(c) for c in self.seg_chars)
+        if cut != -1:
+            self._emit(pending[:cut+1])
+            self._pos += cut + 1
+        return closed
+
+    def close(self) -> str:
+        """
+        生成结束：取回扫描器中未闭合 JSON 的原文（从未配对的 “{” 开始）
+        没有完整的工具调用时这段原文随 flush 作为普通回复播报；已有工具调用时不执行，只记录日志
+        """
+        held = self.scanner.close()
+        if held and self.scanner.objects:
+            logger.warning(f"工具调用之后的 JSON 没有闭合，已忽略: {held[:80]}")
+        return held
+
+    def flush(self):
+        """生成结束且确认不是工具调用时，播报剩余内容（包括未闭合的 JSON 原文）"""
+        if self.speak is None or not self._skip_think():
+            return
+        self._emit(self.text[self._pos:])
+        self._pos = len(self.text)
+
+    @property
+    def reply(self) -> str:
+        """去掉思考段后的完整回复"""
+        text = self.text
+        if '</think>' in text:
+            text = text[text.rfind('</think>')+len('</think>'):]
+        return text.strip()
+
+# 需要独占音频的工具（audioSyncMode 非 0）在所有 Worker 之间串行执行
+_audio_lock = threading.Lock()
+
+
+class _ToolBudget:
+    """
+    一次任务中工具执行的总时限（秒，None 为不限）：只累计各批工具从第一个调用提交到结果全部取回的时间，
+    不含 LLM 生成；每批的截止时间为开始时的剩余额度
+    """
+    def __init__(self, seconds: Optional[float]):
+        self.left = seconds
+
+    def begin(self) -> Tuple[float, Optional[float]]:
+        """一批工具开始执行：返回 (开始时间, 截止时间)"""
+        now = time.monotonic()
+        return now, (now + self.left if self.left is not None else None)
+
+    def end(self, started: float):
+        if self.left is not None:
+            self.left = max(0.0, self.left - (time.monotonic() - started))
+
+
+class _ToolBatch:
+    """
+    一轮回复中的工具调用：提交到 Worker 的有界线程池并行执行，按调用顺序取回结果
+    工具函数直接在线程池中执行，时限与取消在取结果的一端执行：超时或被打断的调用立即返回结构化结果，工具线程收到取消后自行结束
+    需要独占音频的工具按出现顺序串行：等待本轮上一个音频工具结束（包括超时后仍在执行的），并持有全局音频锁
+    budget: 本次任务的工具时限，第一个调用提交时确定这一批的截止时间，取回全部结果后扣除这一批的耗时
+    """
+    def __init__(self, worker: "WorkerAgent", tts_client=None, budget: Optional[_ToolBudget] = None):
+        self.worker = worker
+        self.tts_client = tts_client
+        self.budget = budget or _ToolBudget(None)
+        self.deadline: Optional[float] = None
+        self._started: Optional[float] = None
+        self.futures: Dict[int, Future] = {}
+        self.calls: Dict[int, object] = {}
+        self._last_audio: Optional[Future] = None
+
+    def submit(self, res: Dict) -> Future:
+        """提交一个调用，同一个对象只提交一次（流式中提前提交的调用直接复用）"""
+        if id(res) in self.futures:
+            return self.futures[id(res)]
+        if self._started is None:
+            self._started, self.deadline = self.budget.begin()
+        call = prepare_tool_call(res.get("name"), self.deadline, scope=self.worker.llm.cancel_event)
+        ctx = contextvars.copy_context()
+        if get_tool_audio_sync_mode(res.get("name")) == 0:
+            future = self.worker._tool_executor.submit(ctx.run, self.worker._execute_tool_call, res, self.tts_client, call)
+        else:
+            future = self.worker._tool_executor.submit(ctx.run, self._run_exclusive, res, call, self._last_audio)
+            self._last_audio = future
+        # 没有走到工具函数（如被拒绝、执行前出错）时也要让等待方返回
+        future.add_done_callback(lambda _: call.finish())
+        self.futures[id(res)] = future
+        self.calls[id(res)] = call
+        return future
+
+    def _run_exclusive(self, res: Dict, call, previous: Optional[Future]):
+        if previous is not None:
+            # 上一个音频工具先于本调用提交，不会反过来等待本调用
+            wait([previous])
+        with _audio_lock:
+            return self.worker._execute_tool_call(res, self.tts_client, call)
+
+    def gather(self, calls: List[Dict]) -> List[Future]:
+        """提交全部调用，返回与调用顺序一致的 Future 列表"""
+        return [self.submit(res) for res in calls]
+
+    def results(self, calls: List[Dict]) -> List:
+        """提交并等待全部调用，按调用顺序返回结果，并从任务的工具时限中扣除这一批的耗时"""
+        try:
+            self.gather(calls)
+            return [self._result(res) for res in calls]
+        finally:
+            self.finish()
+
+    async def aresults(self, calls: List[Dict]) -> List:
+        """results 的异步版本"""
+        try:
+            self.gather(calls)
+            return await asyncio.gather(*(self._aresult(res) for res in calls))
+        finally:
+            self.finish()
+
+    def _result(self, res: Dict):
+        call = self.calls[id(res)]
+        try:
+            call.wait()
+        except (ToolTimeoutError, ToolCancelledError) as e:
+            return self.worker._tool_stopped(res.get("name"), e, call.elapsed)
+        return self.futures[id(res)].result()
+
+    async def _aresult(self, res: Dict):
+        call = self.calls[id(res)]
+        try:
+            await call.await_done()
+        except (ToolTimeoutError, ToolCancelledError) as e:
+            return self.worker._tool_stopped(res.get("name"), e, call.elapsed)
+        return await asyncio.wrap_future(self.futures[id(res)])
+
+    def finish(self):
+        if self._started is not None:
+            self.budget.end(self._started)
+            self._started = None
+
 
 # --- 辅助类：单个工作Agent的抽象 ---
 class WorkerAgent:
     """
     代表一个具备特定工具和能力的执行Agent (原模型B/C/D的逻辑封装)
     """
-    def __init__(self, agent_id: int, name: str, description: str, character: str, model_name: str, tool_names: List[str]):
+    def __init__(self, agent_id: int, name: str, description: str, character: str, model_name: str, tool_names: List[str], llm_options: Optional[Dict] = None,
+                 stream_reply: bool = True, tool_mode: str = "text", tool_workers: int = 4, tool_budget: float = 60.0):
         self.id = agent_id
         self.name = name
         self.description = description
         self.model_name = model_name
         self.character = character
+        # 流式生成最终回复，边生成边按分句送入 TTS
+        self.stream_reply = stream_reply
+        # 工具调用方式：text 为提示词 + JSON 文本协议；native 为 OpenAI 原生 function calling，
+        # 模型不支持时自动回退到 text
+        self.tool_mode = tool_mode
         
-        # 初始化LLM
-        self.llm = LLM_Ollama(model=model_name)
+        # 初始化LLM（llm_options 透传给 LLM_Ollama，如 context_tokens）
+        self.llm_options = llm_options or {}
+        self.llm = LLM_Ollama(model=model_name, **self.llm_options)
         self.llm.messages = []
         
         # 工具处理
         self.tool_names = tool_names
         self.tools_info = list_all_tools_simple(tool_names)
-        self.tools_service = expose_tools_as_service(tool_names)
+        # 文本协议的工具说明（紧凑写法，注册中心缓存）与原生调用的 tools 参数，每次请求都会带上
+        self.tools_prompt = render_tools_prompt(tool_names)
+        self.tool_schemas = list_tool_schemas(tool_names)
+        if tool_names:
+            cost = tool_prompt_cost(tool_names)
+            logger.info(f"[{name}] {len(cost)} 个工具的说明每次请求约占 text {sum(c['text'] for c in cost)} / "
+                        f"native {sum(c['native'] for c in cost)} tokens（{tool_mode}）")
+        # 工具调用（含流式生成中提前触发的）在有界线程池中并行执行，见 _ToolBatch
+        self._tool_executor = ThreadPoolExecutor(max_workers=max(1, tool_workers), thread_name_prefix=f"tool-{name}")
+        # 一次任务中所有工具调用的总时间预算（秒），每个调用的等待时间不超过剩余预算；0 表示不限制
+        self.tool_budget = tool_budget
         
         # 初始化系统Prompt
         self._init_system_prompt()
 
+    def fork(self) -> "WorkerAgent":
+        """为新会话复制一个 Worker：共享工具信息与工具线程池，使用独立的对话上下文"""
+        worker = copy.copy(self)
+        worker.llm = LLM_Ollama(model=self.model_name, **self.llm_options)
+        worker.llm.messages = []
+        worker._init_system_prompt()
+        return worker
+
+    def _use_native_tools(self) -> bool:
+        return self.tool_mode == "native" and bool(self.tool_schemas) and self.llm.supports_native_tools(self.model_name)
+
+    def _fallback_to_text_tools(self):
+        """模型不支持原生工具调用：换成文本协议的系统提示词，保留已有对话"""
+        history = self.llm.messages.to_list()[1:]
+        summary = self.llm.messages.summary
+        self.llm.messages = []
+        self._init_system_prompt()
+        self.llm.messages.extend(history)
+        if summary:
+            self.llm.messages.apply_summary(summary, [])
+
     def _init_system_prompt(self):
+        if self._use_native_tools():
+            # 工具描述通过 tools 参数传给模型，提示词中不再重复
+            system_prompt = f"""
+        你是 {self.name} (ID: {self.id})
+        描述: {self.description} {self.character}
+        你的任务是根据用户请求调用工具或直接回答。
+        需要时请直接调用提供的工具；已获得工具结果或直接回答时，直接输出你要对用户说的自然语言内容，不要使用 JSON。
+        """
+            self.llm.messages.append({"role": "system", "content": system_prompt})
+            return
         base_prompt = '''
         你的任务是根据用户请求调用工具或直接回答。
         *** 非常重要：输出格式规则 ***
@@ -52,16 +314,19 @@ class WorkerAgent:
         system_prompt = f"""
         你是 {self.name} (ID: {self.id})
         描述: {self.description} {self.character}
-        可用工具服务: {self.tools_service}
+        可用工具（名称(参数): 说明）:
+        {self.tools_prompt}
         {base_prompt}
         """
         self.llm.messages.append({"role": "system", "content": system_prompt})
 
-    def run_task(self, callback_func=None, tts_client=None, dispatcher_msg=None):
+    def run_task(self, callback_func=None, tts_client=None, dispatcher_msg=None, speculation: Optional[SpeculativeRun] = None):
         """
         执行具体的任务循环 (工具调用 -> 思考 -> 回答)
+        speculation: 已确认命中的投机执行，第一轮直接复用其生成结果
         """
         logger.info(f"[{self.name}] 开始处理任务...")
+        budget = self._tool_budget()
         # self.llm.messages.append({"role": "user", "content": '/no_think\n'+user_query})
         
         max_turns = 5
@@ -69,72 +334,250 @@ class WorkerAgent:
         tool_audio_sync_mode = 0
         flag=1
         while current_turn < max_turns:
+            if self.llm.cancelled:
+                logger.info(f"[{self.name}] 任务被用户打断")
+                return tool_audio_sync_mode
             current_turn += 1
-            response = self.llm.return_text("", self.model_name)
+            speculative_reply = speculation.result() if speculation and current_turn == 1 else None
+            streamer = None
+            batch = _ToolBatch(self, tts_client, budget)
+            native = self._use_native_tools()
+            tools = self.tool_schemas if native else None
+            if speculative_reply is not None:
+                response = self.llm.commit_reply(speculative_reply)
+            elif self.stream_reply:
+                streamer = _ReplyStreamer(self._speaker(callback_func, tool_audio_sync_mode, flag))
+                for chunk in self.llm.stream_text("", self.model_name, tools=tools):
+                    for obj in streamer.feed(chunk):
+                        # 原生模式下工具调用走结构化的 tool_calls，不按正文提前执行，避免重复调用
+                        if not native:
+                            self._dispatch_early(obj, batch)
+                streamer.close()
+                response = streamer.reply
+            else:
+                response = self.llm.return_text("", self.model_name, tools=tools)
+            if self.llm.cancelled:
+                # 用户打断：已生成的部分留在上下文中，不再执行工具与播报
+                logger.info(f"[{self.name}] 任务被用户打断")
+                return tool_audio_sync_mode
+            
+            if native and self.llm.tools_rejected:
+                # 端点拒绝了 tools 参数：换其他端点重做本轮，所有端点都拒绝时切换到文本协议
+                if not self._use_native_tools():
+                    self._fallback_to_text_tools()
+                current_turn -= 1
+                continue
+            if native and self.llm.last_tool_calls:
+                # 原生工具调用：结果以 tool 消息写回上下文
+                calls = self.llm.last_tool_calls
+                results = batch.results([self._native_call(call) for call in calls])
+                tool_outputs, tool_audio_sync_mode, flag = self._collect_tool_results(results, tool_audio_sync_mode, flag)
+                self._append_tool_results(calls, tool_outputs)
+                continue
             
-            # 尝试解析JSON
-            parsed_res = self._parse_json(response)
+            # 尝试解析JSON（流式时扫描器已经解析过，直接复用）
+            parsed_res = self._parse_json(response) if streamer is None else (streamer.scanner.objects or {"raw": response})
             if not isinstance(parsed_res, list):
                 # 情况1：直接回答（非JSON或解析失败视为直接回答）
-                if "action" not in parsed_res:
-                    final_content = response if isinstance(parsed_res, dict) else parsed_res
-                    logger.info(f"[{self.name}] 最终输出: {final_content}")
-                    
-                    self.llm.messages.append({"role": "assistant", "content": final_content})
-                    if dispatcher_msg:
-                        dispatcher_msg.append({"role": "agent_id="+str(self.id), "content": final_content})
-                if tool_audio_sync_mode!=2 or flag==1:
-                    if callback_func:
-                        callback_func(final_content)
+                if streamer:
+                    # 已经边生成边播报，这里只补播剩余内容
+                    streamer.flush()
+                    callback_func = None
+                self._finish_task(response, parsed_res, tool_audio_sync_mode, flag, callback_func, dispatcher_msg)
                 return tool_audio_sync_mode
             else:
-                tool_outputs = []
-                for res in parsed_res:
-                    # 情况2：调用工具
-                    # res = json.loads(res)
-                    tool_name = res.get("name")
-                    params = res.get("params", {})
-                    logger.info(f"[{self.name}] 调用工具: {tool_name}")
-                    try:
-                        tool_audio_sync_mode = get_tool_audio_sync_mode(tool_name)
-                        
-                        if tool_audio_sync_mode==2:
-                            if tts_client:
-                                tts_client.wait_until_done()
-                        result = call_tool_by_name(tool_name, **params)
-                        if len(result)==2:
-                            tool_result, flag = result
-                        else:
-                            tool_result = result
-                        tool_utput_desc = get_tool_output_description(tool_name)
-                        result_str = str(tool_result)
-                        this_tool_output = f"工具{tool_name}调用结果: {result_str}\n{tool_utput_desc.strip()}"
-                        tool_outputs.append(this_tool_output)
-                        
-                    except Exception as e:
-                        logger.error(f"工具调用失败: {e}")
-                        this_tool_output = f"工具{tool_name}调用失败: {str(e)}"
-                        tool_outputs.append(this_tool_output)
-                self.llm.messages.append({
-                            "role": "assistant", 
-                            "content": f"{'\n'.join(tool_outputs)}/no_think"
-                        })
+                # 情况2：调用工具（并行执行，流式中已提前提交的直接取结果）
+                results = batch.results(parsed_res)
+                tool_outputs, tool_audio_sync_mode, flag = self._collect_tool_results(results, tool_audio_sync_mode, flag)
+                self._append_tool_outputs(tool_outputs)
         return tool_audio_sync_mode
+
+    async def arun_task(self, callback_func=None, tts_client=None, dispatcher_msg=None):
+        """
+        run_task 的异步版本：LLM 请求走共享的异步连接池，
+        工具函数本身是同步实现，放到工具线程池中执行以免阻塞事件循环
+        """
+        logger.info(f"[{self.name}] 开始处理任务(async)...")
+        budget = self._tool_budget()
+        max_turns = 5
+        current_turn = 0
+        tool_audio_sync_mode = 0
+        flag=1
+        while current_turn < max_turns:
+            if self.llm.cancelled:
+                logger.info(f"[{self.name}] 任务被用户打断")
+                return tool_audio_sync_mode
+            current_turn += 1
+            streamer = None
+            batch = _ToolBatch(self, tts_client, budget)
+            native = self._use_native_tools()
+            tools = self.tool_schemas if native else None
+            if self.stream_reply:
+                streamer = _ReplyStreamer(self._speaker(callback_func, tool_audio_sync_mode, flag))
+                async for chunk in self.llm.astream_text("", self.model_name, tools=tools):
+                    for obj in streamer.feed(chunk):
+                        # 原生模式下工具调用走结构化的 tool_calls，不按正文提前执行，避免重复调用
+                        if not native:
+                            self._dispatch_early(obj, batch)
+                streamer.close()
+                response = streamer.reply
+            else:
+                response = await self.llm.areturn_text("", self.model_name, tools=tools)
+            if self.llm.cancelled:
+                logger.info(f"[{self.name}] 任务被用户打断")
+                return tool_audio_sync_mode
+            if native and self.llm.tools_rejected:
+                if not self._use_native_tools():
+                    self._fallback_to_text_tools()
+                current_turn -= 1
+                continue
+            if native and self.llm.last_tool_calls:
+                calls = self.llm.last_tool_calls
+                results = await batch.aresults([self._native_call(call) for call in calls])
+                tool_outputs, tool_audio_sync_mode, flag = self._collect_tool_results(results, tool_audio_sync_mode, flag)
+                self._append_tool_results(calls, tool_outputs)
+                continue
+            parsed_res = self._parse_json(response) if streamer is None else (streamer.scanner.objects or {"raw": response})
+            if not isinstance(parsed_res, list):
+                if streamer:
+                    streamer.flush()
+                    callback_func = None
+                self._finish_task(response, parsed_res, tool_audio_sync_mode, flag, callback_func, dispatcher_msg)
+                return tool_audio_sync_mode
+            else:
+                results = await batch.aresults(parsed_res)
+                tool_outputs, tool_audio_sync_mode, flag = self._collect_tool_results(results, tool_audio_sync_mode, flag)
+                self._append_tool_outputs(tool_outputs)
+        return tool_audio_sync_mode
+
+    @staticmethod
+    def _speaker(callback_func, tool_audio_sync_mode, flag):
+        """与 _finish_task 相同的播报条件：独占音频且工具要求不口播时不送 TTS"""
+        if callback_func and (tool_audio_sync_mode!=2 or flag==1):
+            return callback_func
+        return None
+
+    def _finish_task(self, response, parsed_res, tool_audio_sync_mode, flag, callback_func=None, dispatcher_msg=None):
+        """处理最终的自然语言回复：写入上下文、同步给 dispatcher，并按音频同步模式决定是否播报"""
+        if "action" not in parsed_res:
+            final_content = response if isinstance(parsed_res, dict) else parsed_res
+            logger.info(f"[{self.name}] 最终输出: {final_content}")
+            
+            self.llm.messages.append({"role": "assistant", "content": final_content})
+            if dispatcher_msg:
+                dispatcher_msg.append({"role": "agent_id="+str(self.id), "content": final_content})
+        if tool_audio_sync_mode!=2 or flag==1:
+            if callback_func:
+                callback_func(final_content)
+
+    def _dispatch_early(self, obj: Dict, batch: _ToolBatch):
+        """流式生成中一个工具调用对象刚闭合，不等生成结束就提交到工具线程池"""
+        if obj.get("action") != "call_tool":
+            return
+        logger.info(f"[{self.name}] 流式检测到工具调用，提前执行: {obj.get('name')}")
+        batch.submit(obj)
+
+    def _tool_budget(self) -> _ToolBudget:
+        return _ToolBudget(self.tool_budget if self.tool_budget > 0 else None)
+
+    def _execute_tool_call(self, res: Dict, tts_client=None, tool_call=None):
+        """
+        执行单个工具调用，输出中附带本次调用耗时
+        tool_call: _ToolBatch 创建的调用（以会话的打断事件为 scope），时限与取消由 _ToolBatch 在取结果时执行；
+        开始执行前已超时或已被打断的调用输出结构化的结果
+        播放音频的工具（audioSyncMode 非 0）在本机扬声器上播放，tts_client.local_audio 为 False（如网关的远程会话）时不执行
+        :return: (工具输出文本, 音频同步模式, 是否口播标志；工具未返回标志时为 None)
+        """
+        tool_name = res.get("name")
+        params = res.get("params", {})
+        tool_audio_sync_mode = 0
+        logger.info(f"[{self.name}] 调用工具: {tool_name}")
+        start = time.perf_counter()
+        try:
+            tool_audio_sync_mode = get_tool_audio_sync_mode(tool_name)
+            if tool_audio_sync_mode and not getattr(tts_client, "local_audio", True):
+                logger.info(f"[{self.name}] 会话没有本机扬声器，不执行播放工具 {tool_name}")
+                return (f"工具{tool_name}未执行: 当前设备不支持播放音乐、故事、课程等音频\n"
+                        f"请简短地告诉用户这台设备暂时不能播放这类内容"), 0, None
+
+            if tool_audio_sync_mode==2:
+                if tts_client:
+                    tts_client.wait_until_done()
+            # 耗时只计工具本身，不含等待 TTS 播完的时间
+            start = time.perf_counter()
+            with tracer.span(f"tool.{tool_name}", agent=self.name):
+                result = call_tool_by_name(tool_name, tool_call=tool_call, scope=self.llm.cancel_event, **params)
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
+            logger.info(f"[{self.name}] 工具 {tool_name} 耗时 {elapsed_ms}ms")
+            flag = None
+            # 工具可以返回 (结果, 口播标志)，其余返回值（含长度为 2 的字符串、数字）都是结果本身
+            if isinstance(result, tuple) and len(result)==2:
+                tool_result, flag = result
+            else:
+                tool_result = result
+            tool_utput_desc = get_tool_output_description(tool_name)
+            result_str = str(tool_result)
+            return f"工具{tool_name}调用结果（耗时{elapsed_ms}ms）: {result_str}\n{tool_utput_desc.strip()}", tool_audio_sync_mode, flag
+            
+        except (ToolTimeoutError, ToolCancelledError) as e:
+            return self._tool_stopped(tool_name, e, time.perf_counter() - start)
+        except Exception as e:
+            logger.error(f"工具调用失败: {e}")
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
+            return f"工具{tool_name}调用失败（耗时{elapsed_ms}ms）: {str(e)}", tool_audio_sync_mode, None
+
+    def _tool_stopped(self, tool_name: str, error: Union[ToolTimeoutError, ToolCancelledError], elapsed: float):
+        """超时或被打断的工具调用：输出结构化的结果，由 LLM 告知用户（被打断时本轮随后结束）"""
+        logger.warning(f"[{self.name}] {error}")
+        elapsed_ms = round(elapsed * 1000)
+        if isinstance(error, ToolCancelledError):
+            return f"工具{tool_name}调用被取消（耗时{elapsed_ms}ms）: {json.dumps(error.to_result(), ensure_ascii=False)}", 0, None
+        return (f"工具{tool_name}调用超时（耗时{elapsed_ms}ms）: {json.dumps(error.to_result(), ensure_ascii=False)}\n"
+                f"请简短地告诉用户这个操作超时没有完成，可以稍后再试"), get_tool_audio_sync_mode(tool_name), None
+
+    @staticmethod
+    def _collect_tool_results(results, tool_audio_sync_mode=0, flag=1):
+        """按调用顺序汇总工具结果：音频同步模式取最后一个工具的，口播标志取最后一个返回了标志的"""
+        tool_outputs = []
+        for output, call_mode, call_flag in results:
+            tool_outputs.append(output)
+            tool_audio_sync_mode = call_mode
+            if call_flag is not None:
+                flag = call_flag
+        return tool_outputs, tool_audio_sync_mode, flag
+
+    def _execute_tools(self, parsed_res, tts_client=None, tool_audio_sync_mode=0, flag=1):
+        """
+        并行执行解析出的工具调用，按调用顺序汇总
+        :return: (工具输出列表, 音频同步模式, 是否口播标志)
+        """
+        results = _ToolBatch(self, tts_client, self._tool_budget()).results(parsed_res)
+        return self._collect_tool_results(results, tool_audio_sync_mode, flag)
+
+    def _append_tool_outputs(self, tool_outputs):
+        self.llm.messages.append({
+                    "role": "assistant", 
+                    "content": f"{'\n'.join(tool_outputs)}/no_think"
+                })
+
+    def _append_tool_results(self, tool_calls, tool_outputs):
+        """原生工具调用的结果：每个调用对应一条 tool 消息"""
+        for call, output in zip(tool_calls, tool_outputs):
+            self.llm.messages.append({"role": "tool", "tool_call_id": call["id"], "content": output})
+
+    @staticmethod
+    def _native_call(call: Dict) -> Dict:
+        """把原生 tool_call 转换为与文本协议相同的调用结构"""
+        try:
+            params = json.loads(call["arguments"]) if call["arguments"] else {}
+        except ValueError:
+            params = {}
+        return {"action": "call_tool", "name": call["name"], "params": params if isinstance(params, dict) else {}}
     
     def _parse_json(self, content: str) -> Union[Dict, List[Dict]]:
         try:   
-            # 使用正则表达式匹配所有JSON对象
-            # 匹配以{开头，}结尾的JSON对象（支持嵌套）
-            pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-            matches = re.findall(pattern, content)
-            
-            json_objects = []
-            for match in matches:
-                try:
-                    json_obj = json.loads(match)
-                    json_objects.append(json_obj)
-                except:
-                    continue
+            # 增量扫描器按括号深度匹配所有JSON对象（支持任意层嵌套、字符串中的括号）
+            json_objects = JsonObjectScanner().feed(content)
             
             if len(json_objects) == 0:
                 return {"raw": content}
@@ -144,15 +587,146 @@ class WorkerAgent:
         except Exception as e:
             return {"raw": content, "error": str(e)}
 
+# --- 辅助类：会话 ---
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """
+    一个会话（如一台机器人）的对话状态：dispatcher 与各 Worker 的对话历史、调度先验、TTS 客户端
+    模型客户端（client_pool）、工具注册表与工具线程池在所有会话之间共享
+    Worker 在会话第一次调度到它时才从框架的 Worker 模板复制
+    """
+    def __init__(self, session_id: str, framework: "AgentFramework", tts_client=None):
+        self.session_id = session_id
+        self.framework = framework
+        # 用户打断（barge-in）：置位后本轮的 LLM 流式请求立即停止，不再送入 TTS；下一轮开始时清除
+        self.interrupt_event = threading.Event()
+        self.dispatcher_llm = framework._new_dispatcher_llm()
+        self.dispatcher_llm.cancel_event = self.interrupt_event
+        self.tts_client = tts_client
+        # 本轮最后送入 TTS 的一段话的播放完成 Future（tts_client.add_text 返回）；本轮结束时只等它，不等其他会话的播报
+        self.last_utterance: Optional[Future] = None
+        self.worker_prior = WorkerPrior()
+        self.workers: Dict[int, WorkerAgent] = {}
+        # 事件回调 listener(event, data)：调度决策、送入 TTS 的文本等（如网关转发给客户端）
+        self.listener: Optional[Callable[[str, Dict], None]] = None
+        # 同一会话的请求逐个处理，保证历史的顺序
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def worker(self, agent_id: int) -> Optional[WorkerAgent]:
+        worker = self.workers.get(agent_id)
+        if worker is None:
+            template = self.framework.workers.get(agent_id)
+            if template is None:
+                return None
+            forked = template.fork()
+            forked.llm.cancel_event = self.interrupt_event
+            worker = self.workers.setdefault(agent_id, forked)
+        return worker
+
+    def speak(self, content: str, source: str = "dispatcher"):
+        """送入 TTS；source 为 dispatcher（过渡语/直接回复）或 worker；本轮被打断后不再播报"""
+        if not content or self.interrupt_event.is_set():
+            return
+        self.emit("text", source=source, text=content)
+        if self.tts_client:
+            self.last_utterance = self.tts_client.add_text(content)
+
+    def wait_spoken(self):
+        """等待本轮送入 TTS 的语音播完（有上限，由 tts_client.wait_for 决定）；本轮没有播报时直接返回"""
+        utterance, self.last_utterance = self.last_utterance, None
+        if utterance is not None and self.tts_client:
+            self.tts_client.wait_for(utterance)
+
+    async def await_spoken(self):
+        """wait_spoken 的异步版本：在事件循环中等待播放完成 Future，不占用线程"""
+        utterance, self.last_utterance = self.last_utterance, None
+        if utterance is not None and self.tts_client:
+            await self.tts_client.await_for(utterance)
+
+    def speak_worker(self, content: str):
+        self.speak(content, "worker")
+
+    def emit(self, event: str, **data):
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, data)
+        except Exception as e:
+            logger.error(f"[{self.session_id}] 会话事件回调异常: {e}")
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+class _DefaultSession(Session):
+    """默认会话：直接使用框架自身的 dispatcher_llm / workers / tts_client，兼容单会话的用法"""
+    def __init__(self, framework: "AgentFramework"):
+        self.session_id = DEFAULT_SESSION
+        self.framework = framework
+        # 框架的 dispatcher 与 Worker 模板在创建时关联这个事件
+        self.interrupt_event = threading.Event()
+        self.last_utterance: Optional[Future] = None
+        self.listener = None
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    @property
+    def dispatcher_llm(self):
+        return self.framework.dispatcher_llm
+
+    @property
+    def tts_client(self):
+        return self.framework.tts_client
+
+    @property
+    def worker_prior(self):
+        return self.framework.worker_prior
+
+    @property
+    def workers(self):
+        return self.framework.workers
+
+    def worker(self, agent_id: int) -> Optional[WorkerAgent]:
+        return self.framework.workers.get(agent_id)
+
+
 # --- 主框架类 ---
 class AgentFramework:
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, tts_client: Optional[CosyTTS] = None):
+        """
+        :param tts_client: 外部创建的 TTS 客户端（如使用离线替身的 CosyTTS）；不传时按配置文件创建
+        """
         self.workers: Dict[int, WorkerAgent] = {} 
         self.dispatcher_llm: Optional[LLM_Ollama] = None
         self.dispatcher_model_name = "qwen3:8b"
+        self.dispatcher_llm_options: Dict = {}
+
+        # 投机执行：dispatcher 决策前按历史先验预先启动最可能的 Worker
+        self.speculative = False
+        self.speculative_threshold = 0.6
+        self.worker_prior = WorkerPrior()
+        self.speculation_stats = SpeculationStats()
+        # 意图快速通道：高置信的常见意图跳过 dispatcher LLM，直接调度 Worker
+        self.intent_router: Optional[IntentRouter] = None
+        # 后台对话摘要：一轮结束后把较早的对话折叠为滚动摘要，控制 dispatcher / Worker 的 prompt 长度
+        self.summarizer: Optional[ConversationSummarizer] = None
+        # 模型预热：启动时及定期让 dispatcher、各 Worker 与工具用到的模型保持驻留
+        self.warmup: Optional[ModelWarmup] = None
+        # 多会话：session_id -> Session，按最近活跃排序，超过 max_sessions 时淘汰最久未活跃的空闲会话
+        self.max_sessions = 256
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self._default_session = _DefaultSession(self)
+        # 用户打断（barge-in）：{"threshold_ratio", "min_speech_ms", "stop_music"}，未启用时为 None
+        self.barge_in: Optional[Dict] = None
+        # interrupt() 从调用到扬声器静音的耗时（秒）
+        self.interrupt_latencies = deque(maxlen=200)
         
         # --- TTS 改造部分 ---
-        self.tts_client = None
+        self.tts_client = tts_client
         # 注意：这里不再需要 self.tts_queue，因为逻辑已移交 test_tts 内部处理
         self.seg_pattern = ['。', '！', '？', '，', '；']
         self.character = "除了指定的回复格式要求，你说话的文本需要具有人格特点，你的人格如下：角色定位\n你是一位暖心朋友，可靠又好聊。\n表达风格\n1. 语气温和，但更口语化，偶尔带点“呗”“嘛”增强亲近感。  \n2. 偏向安慰和鼓励，用“别急”“咱们一起来看看”来拉近关系。  \n3. 喜欢举一些生活化的小例子，贴近日常。  \n禁止与边界\n- 不替代心理/医疗专业意见。  \n- 不用“长辈口吻”，保持同龄人氛围。"
@@ -170,12 +744,23 @@ class AgentFramework:
         cfg = configparser.ConfigParser()
         cfg.read(config_path, encoding='utf-8')
         
+        # 0. LLM 端点路由（需在创建任何 LLM 之前加载）
+        router.load_config(cfg)
+        
         # 1. 初始化TTS
         if cfg.has_section("General"):
             voice = cfg.get("General", "tts_voice", fallback="zh-CN-XiaoxiaoNeural")
+            tracer.configure(enabled=cfg.getboolean("General", "trace", fallback=True))
             # 初始化即启动后台线程
-            self.tts_client = CosyTTS(voice=voice)
+            if self.tts_client is None:
+                # 进程共用的音频引擎（[Audio]）：TTS 与音乐作为两路音源接入，声卡与解码器常驻
+                configure_engine(cfg)
+                # 常用短语（问候、过渡语等）命中缓存时不请求合成服务，启动时在后台预合成
+                phrase_cache = PhraseCache.from_config(cfg)
+                self.tts_client = CosyTTS(voice=voice, lookahead=cfg.getint("General", "tts_lookahead", fallback=3), cache=phrase_cache)
+                self.tts_client.prerender(prerender_phrases(cfg))
             set_system_tts(self.tts_client)
+            self.max_sessions = cfg.getint("General", "max_sessions", fallback=256)
             self.character = cfg.get("General", "character", 
                 fallback="除了指定的回复格式要求，你说话的文本需要具有人格特点，你的人格如下：角色定位\n你是一位暖心朋友，可靠又好聊。\n表达风格\n1. 语气温和，但更口语化，偶尔带点“呗”“嘛”增强亲近感。  \n2. 偏向安慰和鼓励，用“别急”“咱们一起来看看”来拉近关系。  \n3. 喜欢举一些生活化的小例子，贴近日常。  \n禁止与边界\n- 不替代心理/医疗专业意见。  \n- 不用“长辈口吻”，保持同龄人氛围。")
             
@@ -184,6 +769,23 @@ class AgentFramework:
             self.dispatcher_model_name = cfg.get("Dispatcher", "model_name", fallback="qwen3:8b")
             self.system_prompt = cfg.get("Dispatcher", "description", 
                 fallback="你是一个快速反应的对话决策中心...") + self.character
+            self.dispatcher_llm_options = self._read_llm_options(cfg, "Dispatcher")
+            self.speculative = cfg.getboolean("Dispatcher", "speculative", fallback=False)
+            self.speculative_threshold = cfg.getfloat("Dispatcher", "speculative_threshold", fallback=0.6)
+        if cfg.has_section("BargeIn") and cfg.getboolean("BargeIn", "enabled", fallback=False):
+            self.barge_in = {
+                "threshold_ratio": cfg.getfloat("BargeIn", "threshold_ratio", fallback=3.0),
+                "min_speech_ms": cfg.getint("BargeIn", "min_speech_ms", fallback=240),
+                "stop_music": cfg.getboolean("BargeIn", "stop_music", fallback=True),
+            }
+        self.intent_router = IntentRouter.from_config(cfg)
+        self.summarizer = ConversationSummarizer.from_config(cfg)
+        self.warmup = ModelWarmup.from_config(cfg)
+        if self.warmup:
+            self.warmup.add_model(self.dispatcher_model_name, ollama_extra_body(self.dispatcher_llm_options.get("keep_alive"),
+                                                                                self.dispatcher_llm_options.get("num_ctx")))
+        if self.intent_router:
+            self.intent_router.build_async()
             
         # 3. 初始化 Workers
         for section in cfg.sections():
@@ -194,26 +796,81 @@ class AgentFramework:
                 model = cfg.get(section, "model_name")
                 tools_str = cfg.get(section, "tools", fallback="")
                 tools = [t.strip() for t in tools_str.split(",") if t.strip()]
-                self.create_agent(agent_id, agent_name, desc, self.character, model, tools)
+                self.create_agent(agent_id, agent_name, desc, self.character, model, tools,
+                                  llm_options=self._read_llm_options(cfg, section),
+                                  worker_options=self._read_worker_options(cfg, section))
 
         # 4. 配置完成后，初始化Dispatcher Prompt
         self._init_dispatcher()
 
-    def create_agent(self, agent_id: int, name: str, description: str, character: str, model_name: str, tools: List[str]):
+        # 5. 后台预热所有引用到的模型
+        if self.warmup:
+            if self.summarizer and self.summarizer.model:
+                self.warmup.add_model(self.summarizer.model)
+            self.warmup.start()
+
+    @staticmethod
+    def _read_llm_options(cfg: configparser.ConfigParser, section: str) -> Dict:
+        """读取某个 Agent 段落中的 LLM 参数（未配置的项不传，使用 LLM_Ollama 默认值）"""
+        options = {}
+        if cfg.has_option(section, "context_tokens"):
+            options["context_tokens"] = cfg.getint(section, "context_tokens")
+        if cfg.has_option(section, "keep_alive"):
+            options["keep_alive"] = cfg.get(section, "keep_alive")
+        if cfg.has_option(section, "num_ctx"):
+            options["num_ctx"] = cfg.getint(section, "num_ctx")
+        if cfg.has_option(section, "prefix_stable"):
+            options["prefix_stable"] = cfg.getboolean(section, "prefix_stable")
+        return options
+
+    @staticmethod
+    def _read_worker_options(cfg: configparser.ConfigParser, section: str) -> Dict:
+        """读取 Worker 段落中的执行参数"""
+        options = {}
+        if cfg.has_option(section, "stream_reply"):
+            options["stream_reply"] = cfg.getboolean(section, "stream_reply")
+        if cfg.has_option(section, "tool_mode"):
+            options["tool_mode"] = cfg.get(section, "tool_mode").strip().lower()
+        if cfg.has_option(section, "tool_workers"):
+            options["tool_workers"] = cfg.getint(section, "tool_workers")
+        if cfg.has_option(section, "tool_budget"):
+            options["tool_budget"] = cfg.getfloat(section, "tool_budget")
+        return options
+
+    def create_agent(self, agent_id: int, name: str, description: str, character: str, model_name: str, tools: List[str], llm_options: Optional[Dict] = None,
+                     worker_options: Optional[Dict] = None):
         """
         【API接口】手动创建并注册一个Agent
+        llm_options 透传给 LLM_Ollama，worker_options 透传给 WorkerAgent（如 stream_reply、tool_mode）
         """
-        worker = WorkerAgent(agent_id, name, description, character, model_name, tools)
+        worker = WorkerAgent(agent_id, name, description, character, model_name, tools, llm_options=llm_options, **(worker_options or {}))
+        worker.llm.cancel_event = self._default_session.interrupt_event
         self.workers[agent_id] = worker
+        if self.warmup:
+            self.warmup.add_model(model_name, worker.llm.extra_body)
+            for tool_model in list_tool_models(tools):
+                self.warmup.add_model(tool_model)
         logger.info(f"Agent已注册: [{agent_id}] {name}")
         logger.info(f"{name}.prompt: {worker.llm.messages[0]['content']}")
         self._init_dispatcher()
 
     def _init_dispatcher(self):
         """初始化或刷新分发者（Router）"""
-        self.dispatcher_llm = LLM_Ollama(model=self.dispatcher_model_name)
+        # 复用已有的 dispatcher（客户端来自共享连接池），只刷新模型和系统提示词
+        if self.dispatcher_llm is None:
+            self.dispatcher_llm = LLM_Ollama(model=self.dispatcher_model_name, **self.dispatcher_llm_options)
+            self.dispatcher_llm.cancel_event = self._default_session.interrupt_event
+        self.dispatcher_llm.model = self.dispatcher_model_name
         self.dispatcher_llm.messages = []
-        
+        self.dispatcher_llm.messages.append({"role": "system", "content": self._dispatcher_system_prompt()})
+
+    def _new_dispatcher_llm(self) -> LLM_Ollama:
+        """为新会话创建 dispatcher：系统提示词与默认会话相同，历史独立"""
+        llm = LLM_Ollama(model=self.dispatcher_model_name, **self.dispatcher_llm_options)
+        llm.messages = [self.dispatcher_llm.messages[0]]
+        return llm
+
+    def _dispatcher_system_prompt(self) -> str:
         agents_desc_text = ""
         for aid, worker in self.workers.items():
             agents_desc_text += f"""
@@ -242,7 +899,52 @@ class AgentFramework:
         **查询新闻、信息、天气（默认：长沙）、歌曲之类的时候一定要使用工具,回复为'1:'开头**
         回复文本根据实际用户问题和agent的功能，保持自然的过渡，更像人与人之间的交流，但不应该胡编乱造，需要使用工具时一句话即可。
         """
-        self.dispatcher_llm.messages.append({"role": "system", "content": system_prompt})
+        return system_prompt
+
+    def get_session(self, session_id: Optional[str] = None, tts_client=None) -> Session:
+        """
+        【API接口】获取会话，不存在时创建
+        tts_client: 新会话的语音输出（需提供 add_text（返回播放完成 Future）/ wait_for / await_for / wait_until_done，参考 CosyTTS），不传则该会话不播报
+        """
+        if session_id is None or session_id == DEFAULT_SESSION:
+            return self._default_session
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self, tts_client)
+                self._sessions[session_id] = session
+                logger.info(f"新建会话: {session_id}（共 {len(self._sessions)} 个）")
+                self._evict_sessions()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self):
+        """【API接口】关闭框架持有的 TTS（取消未完成的合成任务、停止其线程与事件循环）与模型预热，进程退出前调用"""
+        if self.warmup:
+            self.warmup.stop()
+        close = getattr(self.tts_client, "close", None)
+        if close is not None:
+            close()
+
+    def close_session(self, session_id: str):
+        """【API接口】丢弃会话的对话历史"""
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+
+    @property
+    def session_ids(self) -> List[str]:
+        with self._sessions_lock:
+            return list(self._sessions)
+
+    def _evict_sessions(self):
+        """会话数超过上限时，从最久未活跃的开始淘汰没有在处理请求的会话"""
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if not session.lock.locked():
+                del self._sessions[session_id]
+                logger.info(f"淘汰空闲会话: {session_id}")
 
     def safe_tts(self, content: str):
         """
@@ -255,69 +957,80 @@ class AgentFramework:
         # 这个操作是瞬间完成的，不会阻塞
         self.tts_client.add_text(content)
 
-    def process_user_query(self, user_query: str, target_workers: List[int] = None):
+    def _feed_reply(self, session: "Session", buffer: str, text: str) -> str:
+        """把 dispatcher 的回复文本累积到 buffer，遇到分句标点时送入 TTS，返回未送出的部分"""
+        if not text:
+            return buffer
+        buffer += text
+        if text[-1] in self.seg_pattern:
+            session.speak(buffer)
+            return ""
+        return buffer
+
+    def process_user_query(self, user_query: str, target_workers: List[int] = None, session_id: Optional[str] = None):
         """
         【API接口】处理用户请求
+        session_id: 会话标识（如机器人编号），不同会话的对话历史相互独立，可以在多个线程中并发调用；
+        不传时使用默认会话。同一会话的请求按顺序逐个处理
         """
-        logger.info(f"收到请求: {user_query}")
+        session = self.get_session(session_id)
+        with session.lock:
+            session.touch()
+            return self._process_query(session, user_query)
+
+    def _process_query(self, session: "Session", user_query: str):
+        logger.info(f"[{session.session_id}] 收到请求: {user_query}")
+        session.interrupt_event.clear()
+        tracer.ensure_turn()
+        self._yield_summaries(session)
+        intent = self._classify_intent(user_query)
+        if intent and intent.confident:
+            self._bypass_dispatcher(session, user_query, intent)
+            return self._finish_query(session, self._dispatch_worker(session, intent.agent_id, 1))
+        tracer.mark("dispatcher.request")
+        speculation = self._start_speculation(session, user_query)
         
-        stream = self.dispatcher_llm.stream_text(user_query, self.dispatcher_model_name)
+        stream = session.dispatcher_llm.stream_text(user_query, self.dispatcher_model_name)
+        parser = DispatchParser(self.workers.keys())
         buffer = ""
         final_text = ""
         real_response = ""
-        decision_made = False
         worker_thread = None 
         
         for chunk in stream:
-            buffer += chunk
-            final_text += chunk
+            if not real_response:
+                tracer.mark("dispatcher.ttft", ttft_ms=round((session.dispatcher_llm.last_ttft or 0) * 1000, 1))
             real_response += chunk
-            if chunk in self.seg_pattern:
-                self.safe_tts(buffer)
-                buffer = ""
-            if not decision_made and len(buffer) > 4:
-                # ... (保留原有的解析逻辑) ...
-                try:
-                    parts = buffer.split(":")
-                    if len(parts) >= 3:
-                        use_tool_str = parts[0].strip()
-                        agent_id_str = parts[1].strip()
-                        # 简单的鲁棒性处理
-                        if use_tool_str == 'use_tool':
-                            buffer = buffer.replace(use_tool_str, '1')
-                            use_tool_str = '1'
-                        # print(use_tool_str, agent_id_str)
-                        if not (use_tool_str.isdigit() and agent_id_str.isdigit()):
-                             if len(parts) > 3: # 尝试移位解析
-                                use_tool_str = parts[1].strip()
-                                agent_id_str = parts[2].strip()
-
-                        if use_tool_str.isdigit() and agent_id_str.isdigit():
-                            use_tool = int(use_tool_str)
-                            agent_id = int(agent_id_str)
-                            
-                            prefix_signature = f"{use_tool_str}:{agent_id_str}:"
-                            content_start_idx = buffer.find(prefix_signature)
-                            
-                            if content_start_idx != -1:
-                                content_start_idx += len(prefix_signature)
-                                transition_text = buffer[content_start_idx:] 
-                                decision_made = True
-                                
-                                logger.info(f"决策: Tool={use_tool}, Agent={agent_id}")
-                                worker_thread = self._dispatch_worker(agent_id, use_tool, self.tts_client)
-                                buffer = transition_text
-                                final_text = transition_text
-                except ValueError:
-                    pass 
-        self.safe_tts(buffer)
+            decision, text = parser.feed(chunk)
+            if decision:
+                use_tool, agent_id = decision
+                logger.info(f"决策: Tool={use_tool}, Agent={agent_id}")
+                tracer.mark("dispatcher.decision", use_tool=use_tool, agent_id=agent_id)
+                session.emit("decision", use_tool=use_tool, agent_id=agent_id, bypass=False)
+                session.worker_prior.observe(use_tool, agent_id)
+                self._record_intent_fallback(intent, use_tool, agent_id)
+                worker_thread = self._dispatch_worker(session, agent_id, use_tool, speculation=speculation)
+                speculation = None
+            final_text += text
+            buffer = self._feed_reply(session, buffer, text)
+        if speculation:
+            speculation.cancel()
+            self.speculation_stats.record_miss(speculation, "未解析出决策")
+        if parser.decision is None:
+            self._record_intent_fallback(intent, None, None)
+        rest = parser.close()
+        final_text += rest
+        session.speak(buffer + rest)
         final_text = final_text.strip()
         logger.info(f"原始回复: {real_response}")
         # 1. 播放过渡语
         if final_text:
             logger.info(f"主控回复: {final_text}")
             # self.safe_tts(final_text)
+        return self._finish_query(session, worker_thread)
 
+    def _finish_query(self, session: "Session", worker_thread):
+        """等待 Worker 与本轮语音播放完成，结束 trace 轮次，返回 Worker 的音频同步模式"""
         # 2. 等待 Agent 工作完成
         if worker_thread and worker_thread.is_alive():
             logger.info("主线程等待 Worker 处理完成...")
@@ -326,41 +1039,253 @@ class AgentFramework:
         
         # 3. 可选：等待语音播放完毕 (如果业务需要在这里阻塞等待说完再接收下一个用户请求)
         # 如果希望完全异步，可以注释掉下面这行
-        if self.tts_client:
-             self.tts_client.wait_until_done()
+        if session.tts_client:
+             session.wait_spoken()
              logger.info("本轮语音播放完毕。")
+        tracer.end_turn()
+        self._schedule_summaries(session)
         return worker_thread._result_container[0] if worker_thread and worker_thread._result_container else 0
 
-    def _dispatch_worker(self, agent_id: int, use_tool: int, tts_client=None):
-        """内部方法：根据ID调度Worker，并返回线程对象"""
-        if use_tool == 0:
-            return None 
-        
-        worker = self.workers.get(agent_id)
-        cnt = 0
+    async def aprocess_user_query(self, user_query: str, target_workers: List[int] = None, session_id: Optional[str] = None):
+        """
+        【API接口】process_user_query 的异步版本
+        dispatcher 与 worker 的 LLM 请求都在事件循环中完成，不再为每个请求占用一个线程；
+        一个事件循环可以同时处理多个会话
+        """
+        session = self.get_session(session_id)
+        await self._aacquire(session.lock)
+        try:
+            session.touch()
+            return await self._aprocess_query(session, user_query)
+        finally:
+            session.lock.release()
+
+    @staticmethod
+    async def _aacquire(lock: threading.Lock):
+        """
+        在线程中等待会话锁（同步与异步接口共用线程锁），以免阻塞事件循环
+        等待期间被取消（如网关连接断开）时，拿到锁后立即释放，不留下无人释放的锁
+        """
+        if lock.acquire(blocking=False):
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(lambda _: lock.release())
+            raise
+
+    async def _aprocess_query(self, session: "Session", user_query: str):
+        logger.info(f"[{session.session_id}] 收到请求(async): {user_query}")
+        session.interrupt_event.clear()
+        tracer.ensure_turn()
+        self._yield_summaries(session)
+        intent = await asyncio.to_thread(self._classify_intent, user_query)
+        if intent and intent.confident:
+            self._bypass_dispatcher(session, user_query, intent)
+            return await self._afinish_query(session, self._adispatch_worker(session, intent.agent_id, 1))
+        tracer.mark("dispatcher.request")
+
+        parser = DispatchParser(self.workers.keys())
+        buffer = ""
+        final_text = ""
+        real_response = ""
+        worker_task = None
+
+        try:
+            async for chunk in session.dispatcher_llm.astream_text(user_query, self.dispatcher_model_name):
+                if not real_response:
+                    tracer.mark("dispatcher.ttft", ttft_ms=round((session.dispatcher_llm.last_ttft or 0) * 1000, 1))
+                real_response += chunk
+                decision, text = parser.feed(chunk)
+                if decision:
+                    use_tool, agent_id = decision
+                    logger.info(f"决策: Tool={use_tool}, Agent={agent_id}")
+                    tracer.mark("dispatcher.decision", use_tool=use_tool, agent_id=agent_id)
+                    session.emit("decision", use_tool=use_tool, agent_id=agent_id, bypass=False)
+                    session.worker_prior.observe(use_tool, agent_id)
+                    self._record_intent_fallback(intent, use_tool, agent_id)
+                    worker_task = self._adispatch_worker(session, agent_id, use_tool)
+                final_text += text
+                buffer = self._feed_reply(session, buffer, text)
+        except asyncio.CancelledError:
+            # 本轮被取消（如网关连接断开）：已启动的 Worker 一并取消，不再向会话输出
+            if worker_task:
+                worker_task.cancel()
+            raise
+        if parser.decision is None:
+            self._record_intent_fallback(intent, None, None)
+        rest = parser.close()
+        final_text += rest
+        session.speak(buffer + rest)
+        final_text = final_text.strip()
+        logger.info(f"原始回复: {real_response}")
+        if final_text:
+            logger.info(f"主控回复: {final_text}")
+        return await self._afinish_query(session, worker_task)
+
+    async def _afinish_query(self, session: "Session", worker_task):
+        """_finish_query 的异步版本"""
+        result = 0
+        if worker_task:
+            logger.info("等待 Worker 处理完成...")
+            result = await worker_task
+            logger.info("Worker 任务结束。")
+
+        if session.tts_client:
+            await session.await_spoken()
+            logger.info("本轮语音播放完毕。")
+        tracer.end_turn()
+        self._schedule_summaries(session)
+        return result
+
+    def interrupt(self, session_id: Optional[str] = None) -> float:
+        """
+        【API接口】用户打断（barge-in）：停止会话正在进行的一轮（dispatcher 与 Worker 的流式请求），
+        取消仍在执行的工具调用（如搜索后准备播放的歌曲），丢弃未播报的文本与音频并立即静音；配置了 stop_music 时同时停止音乐播放
+        正在等待的 process_user_query 随后返回，可以立即开始新的一轮。返回从调用到静音的耗时（秒）
+        """
+        start = time.perf_counter()
+        session = self.get_session(session_id)
+        session.interrupt_event.set()
+        cancelled = cancel_tool_calls(session.interrupt_event)
+        if cancelled:
+            logger.info(f"[{session.session_id}] 打断时取消 {cancelled} 个执行中的工具调用")
+        if session.tts_client and hasattr(session.tts_client, "interrupt"):
+            session.tts_client.interrupt()
+        if self.barge_in is None or self.barge_in["stop_music"]:
+            # 只在播放过音乐（已导入音频模块）时处理，不为打断导入播放器
+            audio = sys.modules.get("utils.audio")
+            if audio is not None:
+                audio.audio_player.interrupt()
+        latency = time.perf_counter() - start
+        self.interrupt_latencies.append(latency)
+        session.emit("interrupted", latency_ms=round(latency * 1000, 1))
+        logger.info(f"[{session.session_id}] 用户打断，{latency * 1000:.1f}ms 后静音")
+        return latency
+
+    def _session_llms(self, session: "Session"):
+        """会话中的 (LLM, 模型名)：dispatcher 与已调度过的 Worker"""
+        yield session.dispatcher_llm, self.dispatcher_model_name
+        for worker in list(session.workers.values()):
+            yield worker.llm, worker.model_name
+
+    def _schedule_summaries(self, session: "Session"):
+        """本轮结束后在后台压缩过长的对话历史"""
+        if self.summarizer:
+            for llm, model in self._session_llms(session):
+                self.summarizer.maybe_schedule(llm, model)
+
+    def _yield_summaries(self, session: "Session"):
+        """新一轮开始时取消本会话仍在进行的摘要，避免与本轮争用推理资源"""
+        if self.summarizer:
+            self.summarizer.yield_to_turn(*(llm for llm, _ in self._session_llms(session)))
+
+    def _classify_intent(self, user_query: str) -> Optional[IntentMatch]:
+        if not self.intent_router:
+            return None
+        with tracer.span("intent_router"):
+            return self.intent_router.classify(user_query)
+
+    def _record_intent_fallback(self, intent: Optional[IntentMatch], use_tool: Optional[int], agent_id: Optional[int]):
+        """未走快速通道时，把 dispatcher 的决策与最接近的意图对比，统计快速通道的一致率"""
+        if self.intent_router:
+            self.intent_router.stats.record_fallback(intent, use_tool, agent_id)
+
+    def _bypass_dispatcher(self, session: "Session", user_query: str, intent: IntentMatch):
+        """意图快速通道：不请求 dispatcher LLM，播报固定过渡语后直接调度 Worker"""
+        logger.info(f"意图快速通道: {intent}")
+        tracer.mark("dispatcher.decision", use_tool=1, agent_id=intent.agent_id, bypass=True)
+        session.emit("decision", use_tool=1, agent_id=intent.agent_id, bypass=True)
+        self.intent_router.stats.record_bypass()
+        logger.info(f"意图快速通道统计: {self.intent_router.stats.summary()}")
+        # 按 dispatcher 的输出格式写入历史，交接给 Worker 的用户消息与后续对话上下文保持完整
+        session.dispatcher_llm.messages.append(session.dispatcher_llm.user_message(user_query))
+        session.dispatcher_llm.commit_reply(f"1:{intent.agent_id}:{intent.transition}")
+        session.worker_prior.observe(1, intent.agent_id)
+        session.speak(intent.transition)
+
+    @staticmethod
+    def _collect_handoff(messages) -> List[Dict]:
+        """从 dispatcher 历史中取出要交给 Worker 的用户消息"""
+        handoff = []
         # 取最近6条消息，若不足6条则全部取出
-        recent_msgs = self.dispatcher_llm.messages[-6:] if len(self.dispatcher_llm.messages) >= 6 else self.dispatcher_llm.messages
+        recent_msgs = messages[-6:] if len(messages) >= 6 else messages
         for msg in recent_msgs:
             if msg['role'] == 'user':
-                worker.llm.messages.append(msg)
-                print(msg)
-                cnt += 1
-            if cnt>2:
+                handoff.append(msg)
+            if len(handoff)>2:
                 break
+        return handoff
+
+    def _handoff_to_worker(self, session: "Session", agent_id: int, use_tool: int):
+        """把 dispatcher 最近的用户消息交给目标 Worker，返回 Worker；无需调度时返回 None"""
+        if use_tool == 0:
+            return None 
+        
+        worker = session.worker(agent_id)
         if not worker:
             logger.error(f"未找到ID为 {agent_id} 的Agent")
             return None
+        for msg in self._collect_handoff(session.dispatcher_llm.messages):
+            worker.llm.messages.append(msg)
+            logger.debug(f"[{worker.name}] 交接消息: {msg}")
+        return worker
+
+    def _start_speculation(self, session: "Session", user_query: str) -> Optional[SpeculativeRun]:
+        """
+        投机执行：按历史先验选出最可能的 Worker，立即用“交接后”的上下文预生成第一轮回复，
+        与 dispatcher 的流式决策并行进行
+        """
+        if not self.speculative:
+            return None
+        agent_id, prob = session.worker_prior.predict()
+        worker = session.worker(agent_id) if agent_id is not None else None
+        # 原生工具调用的 Worker 需要结构化的 tool_calls，投机执行只预生成文本，不适用
+        if worker is None or prob < self.speculative_threshold or worker._use_native_tools():
+            self.speculation_stats.record_skip()
+            return None
+        pending = session.dispatcher_llm.messages.to_list() + [session.dispatcher_llm.user_message(user_query)]
+        request_messages = worker.llm.messages.preview_append(self._collect_handoff(pending))
+        logger.info(f"投机执行: 预测 agent {agent_id} (p={prob:.2f})")
+        return SpeculativeRun(worker, request_messages)
+
+    def _dispatch_worker(self, session: "Session", agent_id: int, use_tool: int, speculation: Optional[SpeculativeRun] = None):
+        """内部方法：根据ID调度Worker，并返回线程对象；speculation 在这里被确认或取消"""
+        decision_time = time.perf_counter()
+        worker = self._handoff_to_worker(session, agent_id, use_tool)
+        if speculation:
+            if worker and speculation.matches(agent_id, worker.llm.messages.to_list()):
+                self.speculation_stats.record_hit(speculation, decision_time)
+            else:
+                speculation.cancel()
+                self.speculation_stats.record_miss(speculation, "决策不一致" if worker else "无需Worker")
+                speculation = None
+            logger.info(f"投机执行统计: {self.speculation_stats.summary()}")
+        if not worker:
+            return None
 
         result_container = []   # 用于收集子线程返回值
 
         def run():
             # 捕获run_task的返回值
-            ret = worker.run_task(callback_func=self.safe_tts, tts_client=tts_client, dispatcher_msg=self.dispatcher_llm.messages)
+            ret = worker.run_task(callback_func=session.speak_worker, tts_client=session.tts_client, dispatcher_msg=session.dispatcher_llm.messages,
+                                  speculation=speculation)
             result_container.append(ret)
 
-        t = threading.Thread(target=run)
+        # 在子线程中沿用当前 trace 轮次
+        t = threading.Thread(target=contextvars.copy_context().run, args=(run,))
         t.daemon = True
         t.start()
         # 将线程对象与结果容器一并返回，方便主线程等待并取值
         t._result_container = result_container
-        return t
\ No newline at end of file
+        return t
+
+    def _adispatch_worker(self, session: "Session", agent_id: int, use_tool: int) -> Optional[asyncio.Task]:
+        """内部方法：_dispatch_worker 的异步版本，Worker 作为任务在当前事件循环中运行"""
+        worker = self._handoff_to_worker(session, agent_id, use_tool)
+        if not worker:
+            return None
+        return asyncio.create_task(
+            worker.arun_task(callback_func=session.speak_worker, tts_client=session.tts_client, dispatcher_msg=session.dispatcher_llm.messages)
+        )
@@ -0,0 +1,68 @@
+"""
+音频输出开销测试：逐句播放 --utterances 句假音频（每句 --audio-ms），对比
+- 每句启动一个播放进程（改动前 CosyTTS 每次 flush 关闭并重启 ffplay 的做法，用 fake_player_cmd 替身）
+- 常驻的音频引擎（fake_engine：一个常驻的解码替身进程 + 输出端），每句写入后等待 mark()
+统计每句从开始写入到报告播完的耗时减去音频时长（即每句额外的开销）与被测进程的 CPU 时间
+
+用法:
+    python -m benchmarks.audio_output --utterances 20 --audio-ms 400 --speed 4
+"""
+import argparse
+import subprocess
+import time
+
+from benchmarks.fakes import AUDIO_BYTES_PER_MS, fake_engine, fake_player_cmd
+from logger import logger
+
+
+def run_process(args, audio: bytes):
+    overheads = []
+    for _ in range(args.utterances):
+        start = time.perf_counter()
+        proc = subprocess.Popen(fake_player_cmd(args.speed), stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        proc.stdin.write(audio)
+        proc.stdin.close()
+        proc.wait()
+        overheads.append(time.perf_counter() - start - args.audio_ms / 1000 / args.speed)
+    return overheads
+
+
+def run_engine(args, audio: bytes):
+    engine = fake_engine(args.speed)
+    stream = engine.open_stream("tts", fmt="mp3")
+    # 解码进程（及备用解码器）启动一次，不计入
+    stream.write(audio[:AUDIO_BYTES_PER_MS])
+    stream.mark().result()
+    time.sleep(0.5)
+    overheads = []
+    for _ in range(args.utterances):
+        start = time.perf_counter()
+        stream.write(audio)
+        stream.mark().result()
+        overheads.append(time.perf_counter() - start - args.audio_ms / 1000 / args.speed)
+    engine.stop()
+    return overheads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每句启动播放进程与常驻音频引擎的每句开销对比（本地替身）")
+    parser.add_argument("--utterances", type=int, default=20)
+    parser.add_argument("--audio-ms", type=float, default=400.0, help="每句的音频时长")
+    parser.add_argument("--speed", type=float, default=4.0, help="播放倍速（缩短测试时间，不影响每句的固定开销）")
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.remove()
+
+    audio = b"\0" * int(args.audio_ms * AUDIO_BYTES_PER_MS)
+    print(f"\n{args.utterances} 句 × {args.audio_ms:g}ms 音频，{args.speed:g} 倍速播放")
+    print(f"{'':14s} {'每句开销 p50(ms)':>16s} {'max(ms)':>8s} {'CPU(ms/句)':>11s}")
+    for label, run in (("每句一个进程", run_process), ("常驻音频引擎", run_engine)):
+        cpu = time.process_time()
+        overheads = sorted(run(args, audio))
+        cpu = (time.process_time() - cpu) / args.utterances * 1000
+        print(f"{label:14s} {overheads[len(overheads) // 2] * 1000:16.1f} {overheads[-1] * 1000:8.1f} {cpu:11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+用户打断（barge-in）测试：合成、音频引擎与 LLM 均为本地替身，音频引擎按实时播放
+
+- TTS：播报一段长回复，开始出声 --after-ms 后调用 CosyTTS.interrupt()，统计从打断到清空待播音频（静音）的耗时，
+  打断时已写入引擎但还没播放的音频时长，以及打断后新一句话的首个音频块延迟
+- 整轮：dispatcher 流式回复一段长文本，边生成边播报，同样在出声后打断（AgentFramework.interrupt()），
+  统计静音耗时与 process_user_query 返回（可以开始新一轮）的耗时
+
+用法:
+    python -m benchmarks.barge_in --repeat 5 --after-ms 800
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.fakes import FakeCommunicate, FakeLLMServer, fake_engine
+from benchmarks.tts_pipeline import REPLY
+from logger import logger
+
+QUERY = "给我讲讲今天的天气"
+NEXT_TEXT = "好的，你说。"
+
+CONFIG_TEMPLATE = """
+[General]
+tts_voice = zh-CN-XiaoxiaoNeural
+trace = false
+
+[Endpoints]
+bench = {base_url}
+
+[Dispatcher]
+model_name = bench-dispatcher
+description = 你是一个快速反应的对话决策中心。
+
+[BargeIn]
+enabled = true
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+description = 用语言和用户交互的智能助手。
+tools =
+"""
+
+
+def _wait_for(predicate, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("等待超时")
+        time.sleep(0.002)
+
+
+def new_tts(args):
+    from utils.tts import CosyTTS
+    communicate_cls = FakeCommunicate.configure(first_audio_ms=args.first_audio_ms, ms_per_char=args.audio_ms_per_char,
+                                                synth_speed=args.synth_speed)
+    return CosyTTS(communicate_cls=communicate_cls, engine=fake_engine(1.0))
+
+
+def run_tts(args):
+    """只打断 TTS：返回 (静音耗时, 已写入引擎但未播放的音频时长, 打断后新一句的首个音频块延迟)，单位秒"""
+    tts = new_tts(args)
+    tts.add_text(REPLY)
+    _wait_for(lambda: tts.output.played > 0)
+    time.sleep(args.after_ms / 1000)
+    # 合成仍在进行的分段未计入，实际省去的播报只会更多
+    remaining = (tts.output.expected - tts.output.played) / tts.engine.sample_rate
+    latency = tts.interrupt()
+    resumed = len(tts.first_audio_times)
+    tts.add_text(NEXT_TEXT)
+    _wait_for(lambda: len(tts.first_audio_times) > resumed)
+    next_first_audio = tts.first_audio_times[-1]
+    tts.wait_until_done()
+    tts.close()
+    tts.engine.stop()
+    return latency, remaining, next_first_audio
+
+
+def run_turn(args, framework):
+    """打断一整轮：返回 (静音耗时, 从打断到 process_user_query 返回的耗时)，单位秒"""
+    tts = framework.tts_client
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (framework.process_user_query(QUERY), done.set()), daemon=True)
+    thread.start()
+    # 每轮开始时 interrupt() 清零过播放位置，等到这一轮出声
+    _wait_for(lambda: tts.output.played > 0)
+    time.sleep(args.after_ms / 1000)
+    start = time.perf_counter()
+    latency = framework.interrupt()
+    done.wait(timeout=30)
+    return latency, time.perf_counter() - start
+
+
+def pct(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户打断后的静音与收尾耗时（合成、播放与 LLM 均为本地替身）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--after-ms", type=float, default=800.0, help="开始出声多久后打断")
+    parser.add_argument("--first-audio-ms", type=float, default=150.0, help="合成服务每段的首个音频块延迟")
+    parser.add_argument("--synth-speed", type=float, default=4.0, help="合成速度（实时的倍数）")
+    parser.add_argument("--audio-ms-per-char", type=float, default=200.0, help="每个字的音频时长")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0, help="LLM 生成速度")
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.remove()
+
+    tts_runs = [run_tts(args) for _ in range(args.repeat)]
+
+    from agent_framework import AgentFramework
+    server = FakeLLMServer(routes={QUERY: "0:0:" + REPLY}, tokens_per_sec=args.tokens_per_sec).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = os.path.join(workdir, "bench_config.ini")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(CONFIG_TEMPLATE.format(base_url=server.base_url))
+        framework = AgentFramework(config_path=config_path, tts_client=new_tts(args))
+        turn_runs = [run_turn(args, framework) for _ in range(args.repeat)]
+        framework.close()
+        framework.tts_client.engine.stop()
+    server.stop()
+
+    print(f"\n{len(REPLY)} 字回复，出声 {args.after_ms:g}ms 后打断，重复 {args.repeat} 次（p50 / max，ms）")
+    silence, remaining, resume = zip(*tts_runs)
+    print(f"TTS   打断到静音 {pct(silence, 0.5):7.1f} / {pct(silence, 1):7.1f}   "
+          f"省去的剩余播报 {pct(remaining, 0.5):8.0f} / {pct(remaining, 1):8.0f}   "
+          f"新一句首个音频 {pct(resume, 0.5):6.1f} / {pct(resume, 1):6.1f}")
+    silence, exit_ = zip(*turn_runs)
+    print(f"整轮  打断到静音 {pct(silence, 0.5):7.1f} / {pct(silence, 1):7.1f}   "
+          f"打断到本轮返回 {pct(exit_, 0.5):8.1f} / {pct(exit_, 1):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
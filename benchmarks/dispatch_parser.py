@@ -0,0 +1,158 @@
+"""
+dispatcher 前缀解析的模糊测试与性能对比：
+
+- 模糊测试：随机生成合法/非法的 dispatcher 输出并随机切分成 chunk，检查 DispatchParser 的增量结果
+  与一次性解析完全一致（决策相同、透传文本拼起来等于回复正文；非法输出原文完整交还），
+  合法输出的决策与旧的 split(":") 解析一致
+- 性能：按流式输出逐 chunk 驱动，对比旧逻辑（每个 chunk 重新 split / find 整个缓冲区）与增量解析的耗时，
+  包含没有前缀的长回复（旧逻辑退化为 O(n^2) 的最坏情况）
+
+用法:
+    python -m benchmarks.dispatch_parser --cases 20000 --seed 1
+"""
+import argparse
+import random
+import time
+from utils.dispatch_parser import DispatchParser, parse_decision
+
+BODIES = ["你好呀！很高兴为你服务。", "好的，我这就为您播放晴天。", "正在查询长沙的天气，请稍等", "", "时间是 12:30，记得休息",
+          "嗯：这个问题我想想", "1:0:重复的前缀", "好"]
+JUNK = ["决策", "答", "use_tool", "回复", "abc"]
+
+
+def legacy_parse(buffer: str):
+    """旧实现（AgentFramework._parse_decision），作为对照"""
+    parts = buffer.split(":")
+    if len(parts) >= 3:
+        use_tool_str = parts[0].strip()
+        agent_id_str = parts[1].strip()
+        if use_tool_str == 'use_tool':
+            buffer = buffer.replace(use_tool_str, '1')
+            use_tool_str = '1'
+        if not (use_tool_str.isdigit() and agent_id_str.isdigit()):
+            if len(parts) > 3:
+                use_tool_str = parts[1].strip()
+                agent_id_str = parts[2].strip()
+        if use_tool_str.isdigit() and agent_id_str.isdigit():
+            prefix_signature = f"{use_tool_str}:{agent_id_str}:"
+            content_start_idx = buffer.find(prefix_signature)
+            if content_start_idx != -1:
+                return int(use_tool_str), int(agent_id_str), buffer[content_start_idx + len(prefix_signature):]
+    return None
+
+
+def random_output(rng: random.Random):
+    """生成一条 dispatcher 输出，返回 (文本, 期望的 (use_tool, agent_id, 正文) 或 None, 是否与旧实现可比)"""
+    use_tool, agent_id, body = rng.randint(0, 1), rng.randint(0, 12), rng.choice(BODIES)
+    colon = lambda: rng.choice([":", ":", "："])
+    pad = lambda: rng.choice(["", "", " ", "\n"])
+    kind = rng.random()
+    if kind < 0.5:
+        return f"{use_tool}:{agent_id}:{body}", (use_tool, agent_id, body), True
+    if kind < 0.7:
+        parts = [pad(), str(use_tool), pad(), colon(), pad(), str(agent_id), pad(), colon()]
+        # 旧实现只在没有空白、都是半角冒号时能解析
+        return "".join(parts) + body, (use_tool, agent_id, body), "".join(parts) == f"{use_tool}:{agent_id}:"
+    if kind < 0.8:
+        junk = rng.choice(JUNK)
+        expected_tool = 1 if junk == "use_tool" else use_tool
+        text = f"{junk}:{agent_id}:{body}" if junk == "use_tool" else f"{junk}:{use_tool}:{agent_id}:{body}"
+        return text, (expected_tool, agent_id, body), False
+    # 不符合格式的输出：闲聊原文、字段非数字、前缀过长
+    text = rng.choice(["你好呀，今天过得怎么样", "时间是 12:30，记得休息", f"{use_tool}:x:{body}", f"{'很' * 20}:{use_tool}:{agent_id}:{body}", f"决策:答:{use_tool}:{agent_id}:",
+                      "10:30:00 出发", f"{use_tool}:²:{body}"])
+    return text, None, False
+
+
+def random_chunks(rng: random.Random, text: str):
+    chunks, i = [], 0
+    while i < len(text):
+        n = rng.choice([1, 1, 1, 2, 3, 5, 8])
+        chunks.append(text[i:i + n])
+        i += n
+    return chunks
+
+
+def run_stream(chunks):
+    parser = DispatchParser()
+    decisions, body = [], []
+    for chunk in chunks:
+        decision, text = parser.feed(chunk)
+        if decision:
+            decisions.append(tuple(decision))
+        body.append(text)
+    body.append(parser.close())
+    return decisions, "".join(body)
+
+
+def fuzz(cases: int, rng: random.Random) -> int:
+    failures = 0
+    for _ in range(cases):
+        text, expected, comparable = random_output(rng)
+        chunks = random_chunks(rng, text)
+        decisions, body = run_stream(chunks)
+        problem = None
+        if expected is None:
+            if decisions or body != text:
+                problem = f"非法输出应原样交还: decisions={decisions} body={body!r}"
+        elif decisions != [expected[:2]] or body != expected[2]:
+            problem = f"期望 {expected}，得到 decisions={decisions} body={body!r}"
+        elif parse_decision(text) != expected:
+            problem = f"一次性解析不一致: {parse_decision(text)}"
+        elif comparable and legacy_parse(text) != expected:
+            problem = f"与旧实现不一致: {legacy_parse(text)}"
+        if problem:
+            failures += 1
+            if failures <= 10:
+                print(f"FAIL {text!r} chunks={chunks}: {problem}")
+    return failures
+
+
+def bench_legacy(chunks):
+    buffer, decided = "", False
+    for chunk in chunks:
+        buffer += chunk
+        if not decided and len(buffer) > 4:
+            decided = legacy_parse(buffer) is not None
+
+
+def bench_incremental(chunks):
+    parser = DispatchParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+def bench(name, outputs, repeat):
+    print(f"\n{name}")
+    for label, fn in [("旧实现 split/find", bench_legacy), ("DispatchParser", bench_incremental)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for chunks in outputs:
+                fn(chunks)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:20s} {elapsed / (repeat * len(outputs)) * 1e6:9.1f} us/条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dispatcher 前缀增量解析的模糊测试与性能对比")
+    parser.add_argument("--cases", type=int, default=20000, help="模糊测试用例数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=200, help="性能测试重复次数")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    failures = fuzz(args.cases, rng)
+    print(f"模糊测试: {args.cases} 条，失败 {failures} 条")
+
+    # 逐字流式（每个 chunk 一个字，与 Ollama 中文输出接近）
+    typical = [list(f"1:{i % 3}:好的，我这就为您播放晴天，请稍等一下。") for i in range(50)]
+    no_prefix = [list("你好呀" + "今天天气不错，适合出去走走。" * 30) for _ in range(10)]
+    bench("带前缀的常规回复（约 20 字）", typical, args.repeat)
+    bench("没有前缀的长回复（约 450 字，旧实现每个 chunk 都重新扫描）", no_prefix, max(1, args.repeat // 10))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+离线性能测试用的本地服务替身：
+
+- FakeLLMServer   : OpenAI 兼容的 /v1/chat/completions（流式与非流式）与 /v1/models，
+                    可配置首 token 延迟与生成速度；dispatcher 模型按脚本返回决策，
+                    worker 模型先调用计算器工具（原生 tool_calls 或文本 JSON 协议），拿到结果后给出最终回复；
+                    摘要模型返回固定的对话摘要；可模拟 Ollama 的模型加载（load_ms）与 /api/ps 驻留查询
+- FakeASRServer   : FunASR 风格的 websocket 服务，收到 is_speaking=false 后按 wav_name
+                    （utt-<序号>）回放对应的转写文本
+- FakeCommunicate : 接口同 edge_tts.Communicate 的合成替身，按字数生成假音频数据
+- fake_engine     : 音频引擎替身：解码进程把假音频按字节数换算为 PCM，输出端按实时（或倍速）取走
+- fake_player_cmd : 替代 ffplay 的播放进程，按音频字节数模拟播放时长（对比每句启动一个播放进程的旧做法）
+
+单独启动（如让 main.py 连接本地替身）:
+    python -m benchmarks.fakes --llm-port 18080 --asr-port 10095
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from websockets.sync.server import serve
+
+# 假音频的码率：16 字节/毫秒（约 128kbps mp3），合成与播放替身按此换算时长
+AUDIO_BYTES_PER_MS = 16
+# Ollama 请求未指定 options.num_ctx 时使用的上下文长度
+OLLAMA_DEFAULT_NUM_CTX = 2048
+
+DEFAULT_ROUTE = "0:0:好呀，我在听，你接着说。"
+TOOL_LEAD = "我来算一下。"
+TOOL_CALL = {"name": "add", "arguments": {"a": 1, "b": 2}}
+FINAL_REPLY = "算好啦，一加二等于三。还有什么需要帮忙的吗？"
+SUMMARY_REPLY = "用户打了招呼，说自己有点累，多次让助手计算一加二，助手回答等于三。"
+
+# 脚本化的用户话语：text 为 ASR 回放的转写，route 为 dispatcher 的决策回复
+UTTERANCES = [
+    {"text": "你好呀", "route": "0:0:你好呀！今天过得怎么样？"},
+    {"text": "帮我算一下一加二等于几", "route": "1:0:好的，我来算一下。"},
+    {"text": "今天有点累", "route": "0:0:辛苦啦，先歇会儿，喝口水呗。"},
+    {"text": "一加二是多少", "route": "1:0:稍等，马上算好。"},
+]
+
+
+class FakeLLMServer:
+    """
+    OpenAI 兼容的假推理服务
+    :param routes: 用户原话 -> dispatcher 回复（use_tool:agent_id:回复文本），未命中时返回 DEFAULT_ROUTE
+    :param dispatcher_model: 按 dispatcher 规则回复的模型名，其余模型按 worker 规则回复
+    :param summary_model: 返回 SUMMARY_REPLY 的模型名
+    :param ttft_ms: 首 token 延迟
+    :param tokens_per_sec: 生成速度，每个字符算一个 token
+    :param load_ms: 模型未驻留（或驻留实例的 num_ctx 与请求不同）时额外的加载延迟；请求带 keep_alive 时按它计算驻留到期时间，否则为 keep_alive_s
+    """
+    def __init__(self, host="127.0.0.1", port=0, routes: Optional[Dict[str, str]] = None, dispatcher_model="bench-dispatcher",
+                 ttft_ms=80.0, tokens_per_sec=60.0, summary_model="bench-summary", load_ms=0.0, keep_alive_s=300.0):
+        self.routes = routes or {}
+        self.dispatcher_model = dispatcher_model
+        self.summary_model = summary_model
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.requests = 0
+        self.load_delay = load_ms / 1000
+        self.keep_alive_s = keep_alive_s
+        # 模型名 -> (驻留到期时间（time.time()）, 加载时的 num_ctx)
+        self.loaded: Dict[str, tuple] = {}
+        self._load_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.base_url = f"http://{host}:{self.port}/v1"
+
+    def reply_for(self, request: Dict):
+        """
+        按请求内容生成回复
+        :return: (正文, 原生工具调用或 None)
+        """
+        messages = request["messages"]
+        last = messages[-1]
+        if request["model"] == self.summary_model:
+            return SUMMARY_REPLY, None
+        if request["model"] == self.dispatcher_model:
+            # 用户消息带有 /no_think 前缀，取最后一行作为原话
+            text = (last.get("content") or "").strip().splitlines()[-1:] or [""]
+            return self.routes.get(text[0].strip(), DEFAULT_ROUTE), None
+        content = last.get("content") or ""
+        if last["role"] == "tool" or "调用结果" in content or "调用失败" in content:
+            return FINAL_REPLY, None
+        if request.get("tools"):
+            return TOOL_LEAD, {"id": f"call_{self.requests}", "type": "function",
+                               "function": {"name": TOOL_CALL["name"], "arguments": json.dumps(TOOL_CALL["arguments"])}}
+        call = {"action": "call_tool", "name": TOOL_CALL["name"], "params": TOOL_CALL["arguments"]}
+        return TOOL_LEAD + json.dumps(call, ensure_ascii=False), None
+
+    def load(self, model: str, keep_alive, num_ctx=None) -> float:
+        """模拟 Ollama 加载模型：未驻留、已到期或 num_ctx 与驻留实例不同时返回加载延迟，并刷新驻留到期时间"""
+        from utils.warmup import parse_keep_alive
+        now = time.time()
+        num_ctx = num_ctx or OLLAMA_DEFAULT_NUM_CTX
+        with self._load_lock:
+            expires, loaded_ctx = self.loaded.get(model, (0.0, None))
+            cold = expires <= now or loaded_ctx != num_ctx
+            self.loaded[model] = (now + (parse_keep_alive(keep_alive) if keep_alive is not None else self.keep_alive_s), num_ctx)
+        return self.load_delay if cold else 0.0
+
+    def resident_models(self) -> List[Dict]:
+        now = time.time()
+        with self._load_lock:
+            return [{"name": m, "model": m, "expires_at": datetime.fromtimestamp(min(t, now + 10 ** 8), timezone.utc).isoformat(),
+                     "context_length": num_ctx}
+                    for m, (t, num_ctx) in self.loaded.items() if t > now]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, text):
+                data = text.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _sse(self, model, delta, finish_reason=None):
+                chunk = {"id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                self._write_chunk("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+
+            def do_GET(self):
+                if self.path.endswith("/api/ps"):
+                    self._send_json({"models": server.resident_models()})
+                    return
+                self._send_json({"object": "list", "data": [{"id": server.dispatcher_model, "object": "model"}]})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.requests += 1
+                reply, tool_call = server.reply_for(request)
+                model = request["model"]
+                time.sleep(server.load(model, request.get("keep_alive"), (request.get("options") or {}).get("num_ctx")) + server.ttft)
+                if not request.get("stream"):
+                    time.sleep(server.token_interval * len(reply))
+                    message = {"role": "assistant", "content": reply}
+                    if tool_call:
+                        message["tool_calls"] = [tool_call]
+                    self._send_json({"id": "bench", "object": "chat.completion", "created": int(time.time()), "model": model,
+                                     "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+                                     "usage": {"prompt_tokens": 0, "completion_tokens": len(reply), "total_tokens": len(reply)}})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, ch in enumerate(reply):
+                        if i:
+                            time.sleep(server.token_interval)
+                        self._sse(model, {"content": ch})
+                    if tool_call:
+                        self._sse(model, {"tool_calls": [dict(tool_call, index=0)]})
+                    self._sse(model, {}, "tool_calls" if tool_call else "stop")
+                    self._write_chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端中途取消（投机执行、摘要让路）
+                    pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-llm").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+class FakeASRServer:
+    """
+    FunASR 2pass 协议的假识别服务：客户端先发 JSON 配置（wav_name=utt-<序号>），再发音频帧，
+    最后发 {"is_speaking": false}；服务端等待 latency_ms 后回复对应序号的转写文本
+    """
+    def __init__(self, transcripts: List[str], host="127.0.0.1", port=0, latency_ms=150.0):
+        self.transcripts = transcripts
+        self.latency = latency_ms / 1000
+        self._server = serve(self._handle, host, port, subprotocols=["binary"])
+        self.port = self._server.socket.getsockname()[1]
+        self.uri = f"ws://{host}:{self.port}"
+
+    def transcript_for(self, wav_name: str) -> str:
+        try:
+            index = int(wav_name.rsplit("-", 1)[-1])
+        except ValueError:
+            index = 0
+        return self.transcripts[index % len(self.transcripts)]
+
+    def _handle(self, websocket):
+        wav_name = "utt-0"
+        for message in websocket:
+            if isinstance(message, bytes):
+                continue
+            meg = json.loads(message)
+            wav_name = meg.get("wav_name", wav_name)
+            if meg.get("is_speaking") is False:
+                time.sleep(self.latency)
+                # 与 FunASR 2pass 离线结果一致：is_final 为 False 的 2pass-offline 消息
+                websocket.send(json.dumps({"mode": "2pass-offline", "text": self.transcript_for(wav_name),
+                                           "wav_name": wav_name, "is_final": False}, ensure_ascii=False))
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-asr").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+class FakeCommunicate:
+    """
+    edge_tts.Communicate 的替身：首个音频块在 first_audio_ms 后产出，每个字对应 ms_per_char 毫秒音频，
+    合成速度为实时的 synth_speed 倍；用 configure() 生成带参数的子类传给 CosyTTS(communicate_cls=...)
+    """
+    first_audio_ms = 120.0
+    ms_per_char = 50.0
+    synth_speed = 10.0
+    chunk_ms = 100
+
+    def __init__(self, text, voice=None):
+        self.text = text
+        self.voice = voice
+
+    @classmethod
+    def configure(cls, **params):
+        return type("FakeCommunicate", (cls,), params)
+
+    async def stream(self):
+        await asyncio.sleep(self.first_audio_ms / 1000)
+        remaining = len(self.text) * self.ms_per_char
+        while remaining > 0:
+            duration = min(self.chunk_ms, remaining)
+            remaining -= duration
+            yield {"type": "audio", "data": b"\0" * int(duration * AUDIO_BYTES_PER_MS)}
+            if remaining > 0:
+                await asyncio.sleep(duration / 1000 / self.synth_speed)
+
+
+# 播放替身：边读边累计播放进度，stdin 关闭后等到最后一个采样“播完”再退出
+_PLAYER_SCRIPT = """
+import sys, time
+rate = float(sys.argv[1])
+end = time.monotonic()
+while True:
+    data = sys.stdin.buffer.read1(65536)
+    if not data:
+        break
+    if rate > 0:
+        end = max(end, time.monotonic()) + len(data) / {bytes_per_ms} / 1000 / rate
+time.sleep(max(0.0, end - time.monotonic()))
+""".format(bytes_per_ms=AUDIO_BYTES_PER_MS)
+
+
+def fake_player_cmd(playback_rate: float = 1.0) -> List[str]:
+    """
+    替代 ffplay 的播放命令
+    :param playback_rate: 播放倍速，1 为实时，0 表示不等待播放时长
+    """
+    return [sys.executable, "-c", _PLAYER_SCRIPT, str(playback_rate)]
+
+
+# 解码替身：假音频每毫秒 AUDIO_BYTES_PER_MS 字节，输出 16kHz 单声道 PCM（每毫秒 16 帧 = 32 字节）
+_DECODER_SCRIPT = """
+import sys
+while True:
+    data = sys.stdin.buffer.read1(65536)
+    if not data:
+        break
+    sys.stdout.buffer.write(bytes(len(data) * 32 // {bytes_per_ms}))
+    sys.stdout.buffer.flush()
+""".format(bytes_per_ms=AUDIO_BYTES_PER_MS)
+
+
+def fake_engine(playback_rate: float = 1.0):
+    """
+    离线测试用的音频引擎：常驻的解码替身进程 + 不接声卡的输出端
+    :param playback_rate: 播放倍速，1 为实时，0 表示有音频就尽快取完
+    """
+    from utils.audio_engine import AudioEngine, ClockSink, LinearCounter
+    return AudioEngine(sample_rate=16000, channels=1, sink=ClockSink(playback_rate),
+                       decoder_cmd=lambda fmt, rate, channels: [sys.executable, "-c", _DECODER_SCRIPT],
+                       counter_factory=lambda fmt: LinearCounter(16 / AUDIO_BYTES_PER_MS))
+
+
+def run_servers(llm_options: Dict, asr_options: Dict, ready=None):
+    """
+    在当前进程中启动 LLM 与 ASR 替身并阻塞运行；ready 为 multiprocessing 队列时回传 (llm base_url, asr uri)
+    基准测试在子进程中调用，替身自身的 CPU 开销不计入被测进程
+    """
+    llm = FakeLLMServer(**llm_options).start()
+    asr = FakeASRServer(**asr_options).start()
+    if ready is not None:
+        ready.put((llm.base_url, asr.uri))
+    print(f"fake LLM: {llm.base_url}  fake ASR: {asr.uri}", flush=True)
+    threading.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地 LLM / ASR 服务替身")
+    parser.add_argument("--llm-port", type=int, default=18080)
+    parser.add_argument("--asr-port", type=int, default=10095)
+    parser.add_argument("--ttft-ms", type=float, default=80.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--asr-latency-ms", type=float, default=150.0)
+    parser.add_argument("--dispatcher-model", default="qwen3:8b")
+    args = parser.parse_args()
+    run_servers(
+        {"port": args.llm_port, "routes": {u["text"]: u["route"] for u in UTTERANCES}, "dispatcher_model": args.dispatcher_model,
+         "ttft_ms": args.ttft_ms, "tokens_per_sec": args.tokens_per_sec},
+        {"port": args.asr_port, "transcripts": [u["text"] for u in UTTERANCES], "latency_ms": args.asr_latency_ms},
+    )
+
+
+if __name__ == "__main__":
+    main()
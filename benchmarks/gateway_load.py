@@ -0,0 +1,183 @@
+"""
+WebSocket 网关压测：LLM 替身与网关分别运行在子进程中（网关使用 FakeCommunicate 合成假音频），
+本进程用 asyncio 模拟多台机器人并发连接，每台连续发送 --turns 个文本轮次
+
+每轮统计（从发出 text 开始计时）：decision / 首段文本 / 首个音频块 / done 的耗时 p50/p95，以及吞吐与音频字节数；
+并检查音频是否跟在对应的 text 之后：每条 text 之后的音频字节数应大于 0 且不超过这段文本按 --audio-ms-per-char 合成的长度
+--read-delay-ms 让客户端每收到一个音频块后暂停一段时间，模拟网络慢或处理慢的机器人，观察背压下的表现
+
+用法:
+    python -m benchmarks.gateway_load --clients 16 --turns 4
+    python -m benchmarks.gateway_load --clients 4 --read-delay-ms 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from websockets.asyncio.client import connect
+
+from benchmarks.fakes import AUDIO_BYTES_PER_MS, UTTERANCES, FakeCommunicate, run_servers
+
+CONFIG_TEMPLATE = """
+[General]
+trace = false
+
+[Endpoints]
+bench = {base_url}
+
+[Dispatcher]
+model_name = bench-dispatcher
+context_tokens = 3000
+prefix_stable = true
+description = 你是一个快速反应的对话决策中心。
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+context_tokens = 6000
+prefix_stable = true
+tool_mode = native
+description = 用语言和用户交互的智能助手，能够做简单计算。
+tools = calculator
+
+[Gateway]
+max_pending_audio = {max_pending_audio}
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_gateway(config_path, port, tts_params, quiet):
+    """子进程入口：用假音频合成启动网关"""
+    from logger import logger
+    if quiet:
+        logger.remove()
+    from gateway import Gateway
+    gateway = Gateway.from_config(config_path, communicate_cls=FakeCommunicate.configure(**tts_params))
+    asyncio.run(gateway.serve("127.0.0.1", port))
+
+
+def start_services(args):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    llm_options = {"routes": {u["text"]: u["route"] for u in UTTERANCES}, "ttft_ms": args.ttft_ms,
+                   "tokens_per_sec": args.tokens_per_sec}
+    fakes = ctx.Process(target=run_servers, args=(llm_options, {"transcripts": [u["text"] for u in UTTERANCES]}, ready), daemon=True)
+    fakes.start()
+    base_url, _ = ready.get(timeout=30)
+    config_path = os.path.join(tempfile.mkdtemp(prefix="xjrobot-gateway-"), "bench_config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(CONFIG_TEMPLATE.format(base_url=base_url, max_pending_audio=args.max_pending_audio))
+    port = free_port()
+    tts_params = {"first_audio_ms": args.tts_first_audio_ms, "ms_per_char": args.audio_ms_per_char}
+    gateway = ctx.Process(target=serve_gateway, args=(config_path, port, tts_params, not args.verbose), daemon=True)
+    gateway.start()
+    return [fakes, gateway], f"ws://127.0.0.1:{port}"
+
+
+async def wait_ready(uri, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with connect(uri):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run_client(uri, index, args, results):
+    async with connect(uri, max_queue=4) as websocket:
+        await websocket.send(json.dumps({"type": "hello", "session_id": f"load-{index}", "audio_out": True}))
+        json.loads(await websocket.recv())
+        for turn in range(args.turns):
+            text = UTTERANCES[(index + turn) % len(UTTERANCES)]["text"]
+            start = time.perf_counter()
+            await websocket.send(json.dumps({"type": "text", "text": text}, ensure_ascii=False))
+            marks = {}
+            audio_bytes = 0
+            # (text, 其后收到的音频字节数)
+            spoken = []
+            while True:
+                message = await websocket.recv()
+                elapsed = (time.perf_counter() - start) * 1000
+                if isinstance(message, bytes):
+                    marks.setdefault("first_audio", elapsed)
+                    audio_bytes += len(message)
+                    if spoken:
+                        spoken[-1][1] += len(message)
+                    if args.read_delay_ms:
+                        await asyncio.sleep(args.read_delay_ms / 1000)
+                    continue
+                msg = json.loads(message)
+                if msg["type"] == "decision":
+                    marks.setdefault("decision", elapsed)
+                elif msg["type"] == "text":
+                    marks.setdefault("first_text", elapsed)
+                    spoken.append([msg["text"], 0])
+                elif msg["type"] == "error":
+                    marks["error"] = msg.get("message")
+                elif msg["type"] == "done":
+                    marks["done"] = elapsed
+                    break
+            marks["audio_bytes"] = audio_bytes
+            marks["misaligned"] = sum(1 for text, size in spoken
+                                      if text.strip() and not 0 < size <= len(text) * args.audio_ms_per_char * AUDIO_BYTES_PER_MS)
+            results.append(marks)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+async def run(args, uri):
+    await wait_ready(uri)
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(uri, i, args, results) for i in range(args.clients)))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 网关压测（LLM / TTS 为本地替身）")
+    parser.add_argument("--clients", type=int, default=8, help="并发连接（会话）数")
+    parser.add_argument("--turns", type=int, default=4, help="每个连接的轮数")
+    parser.add_argument("--ttft-ms", type=float, default=80.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--tts-first-audio-ms", type=float, default=120.0)
+    parser.add_argument("--audio-ms-per-char", type=float, default=50.0)
+    parser.add_argument("--max-pending-audio", type=int, default=32, help="网关每个连接未发出的音频块上限")
+    parser.add_argument("--read-delay-ms", type=float, default=0.0, help="客户端每个音频块的处理延迟，模拟慢客户端")
+    parser.add_argument("--verbose", action="store_true", help="保留网关日志输出")
+    args = parser.parse_args()
+
+    processes, uri = start_services(args)
+    try:
+        results, wall = asyncio.run(run(args, uri))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    errors = [r["error"] for r in results if "error" in r]
+    print(f"\n{args.clients} 个连接 x {args.turns} 轮，共 {len(results)} 轮，错误 {len(errors)} 轮")
+    print(f"{'阶段':12s} {'p50(ms)':>10s} {'p95(ms)':>10s}")
+    for stage in ["decision", "first_text", "first_audio", "done"]:
+        values = [r[stage] for r in results if stage in r]
+        print(f"{stage:12s} {percentile(values, 0.5):10.1f} {percentile(values, 0.95):10.1f}")
+    audio = sum(r["audio_bytes"] for r in results)
+    misaligned = sum(r["misaligned"] for r in results)
+    print(f"\n墙钟 {wall:.2f}s  吞吐 {len(results) / wall:.2f} 轮/s  音频 {audio / 1024:.0f} KiB  音频与 text 不对应 {misaligned} 段")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+意图快速通道评估：用 config.ini 中的 [Intent.*] 样例构建 IntentRouter，对一组标注查询
+（与样例句不同的说法）按不同阈值统计跳过 dispatcher 的比例与被跳过查询的调度准确率，
+用于选择 [IntentRouter] threshold / margin
+
+用法:
+    python -m benchmarks.intent_router --config config.ini --thresholds 0.80,0.84,0.88,0.92
+"""
+import argparse
+import configparser
+import time
+from utils.intent_router import IntentRouter
+
+# 标注查询：agent_id 为 dispatcher 应调度的 Worker，None 表示闲聊（不应跳过 dispatcher）
+SAMPLES = [
+    {"text": "放一首林俊杰的江南", "agent_id": 0},
+    {"text": "我想听点轻松的音乐", "agent_id": 0},
+    {"text": "来一首周杰伦的晴天", "agent_id": 0},
+    {"text": "给孩子放首儿歌吧", "agent_id": 0},
+    {"text": "音乐关了吧", "agent_id": 0},
+    {"text": "先别唱了", "agent_id": 0},
+    {"text": "停一下音乐", "agent_id": 0},
+    {"text": "今天长沙天气怎么样", "agent_id": 0},
+    {"text": "明天要带伞吗", "agent_id": 0},
+    {"text": "北京现在多少度", "agent_id": 0},
+    {"text": "后天天气好不好", "agent_id": 0},
+    {"text": "最近有什么大新闻", "agent_id": 0},
+    {"text": "给我讲讲今天的头条", "agent_id": 0},
+    {"text": "体育新闻有啥", "agent_id": 0},
+    {"text": "给我讲个故事吧", "agent_id": 0},
+    {"text": "你好呀", "agent_id": None},
+    {"text": "我今天心情不太好", "agent_id": None},
+    {"text": "你能做什么", "agent_id": None},
+    {"text": "谢谢啦", "agent_id": None},
+    {"text": "晚饭吃什么好呢", "agent_id": None},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评估意图快速通道的跳过率与准确率")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--thresholds", default="0.80,0.84,0.88,0.92")
+    args = parser.parse_args()
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config, encoding="utf-8")
+    # 评估时忽略 enabled 开关
+    if not cfg.has_section("IntentRouter"):
+        cfg.add_section("IntentRouter")
+    cfg.set("IntentRouter", "enabled", "true")
+    router = IntentRouter.from_config(cfg)
+    if router is None:
+        print("配置中没有 [Intent.*] 样例")
+        return
+    if not router.build():
+        print("样例句向量计算失败，请检查句向量服务")
+        return
+
+    # 每条查询只计算一次句向量，不同阈值复用相似度结果
+    router.threshold = -1.0
+    matches, latencies = [], []
+    for sample in SAMPLES:
+        start = time.perf_counter()
+        matches.append(router.classify(sample["text"]))
+        latencies.append(time.perf_counter() - start)
+    for sample, match in zip(SAMPLES, matches):
+        name = match.intent.name if match else "-"
+        print(f"{sample['text']:<16s} -> {name:<12s} score={match.score if match else 0:.3f} margin={match.margin if match else 0:.3f}")
+
+    print(f"\n查询耗时 p50={sorted(latencies)[len(latencies) // 2] * 1000:.1f} ms  margin={router.margin}")
+    print("阈值    跳过率   准确率   跳过/总数")
+    for threshold in [float(t) for t in args.thresholds.split(",")]:
+        bypassed = [(s, m) for s, m in zip(SAMPLES, matches)
+                    if m and m.agent_id is not None and m.score >= threshold and m.margin >= router.margin]
+        correct = sum(1 for s, m in bypassed if m.agent_id == s["agent_id"])
+        accuracy = f"{correct / len(bypassed):.1%}" if bypassed else "-"
+        print(f"{threshold:.2f}  {len(bypassed) / len(SAMPLES):7.1%}  {accuracy:>7s}   {len(bypassed)}/{len(SAMPLES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+前缀缓存 TTFT 测试：同一段多轮对话分别以两种方式发送，对比每轮首 token 延迟
+
+- stable : LLM_Ollama(prefix_stable=True)，历史只追加不改写，超预算时批量淘汰
+- legacy : 模拟旧逻辑，每轮按条数截断（保留系统提示词 + 最近 N 条）并把所有过长的
+           助手消息压缩为首尾各 100 字，请求前缀几乎每轮都会变化
+
+前缀能被服务端复用时，stable 模式的 TTFT 应随对话变长基本保持不变，legacy 模式会
+在截断开始后明显升高。
+
+用法:
+    python -m benchmarks.prefix_cache_ttft --base-url http://47.108.93.204:11435/v1 --model qwen3:8b --turns 16
+"""
+import argparse
+import statistics
+from brain import LLM_Ollama
+
+QUESTIONS = [
+    "给我讲讲长沙有什么好玩的地方",
+    "那附近有什么好吃的",
+    "周末去的话需要注意什么",
+    "帮我规划一个两天的行程",
+    "如果下雨怎么调整",
+    "推荐几家适合带老人的餐厅",
+    "晚上有什么活动",
+    "交通怎么安排比较方便",
+]
+
+
+def build_system_prompt(repeat):
+    # 足够长的系统提示词，放大前缀预填充的开销
+    rule = "你是一位暖心朋友，可靠又好聊。语气温和，口语化，回复控制在150字左右，不要使用markdown。"
+    return "\n".join(f"规则{i}: {rule}" for i in range(repeat))
+
+
+def legacy_trim(llm, cap):
+    """复现旧版 return_text 的按条数截断 + 助手消息压缩"""
+    msgs = llm.messages.to_list()
+    if len(msgs) > cap:
+        msgs = [msgs[0]] + msgs[-(cap - 1):]
+    clipped = []
+    for msg in msgs:
+        if msg["role"] == "assistant" and len(msg["content"]) > 200:
+            msg = dict(msg, content=msg["content"][:100] + '...' + msg["content"][-100:])
+        clipped.append(msg)
+    llm.messages = clipped
+
+
+def run_conversation(args, mode):
+    llm = LLM_Ollama(base_url=args.base_url, model=args.model, context_tokens=args.context_tokens,
+                     keep_alive=args.keep_alive, num_ctx=args.num_ctx, prefix_stable=(mode == "stable"))
+    llm.messages = [{"role": "system", "content": build_system_prompt(args.system_repeat)}]
+    ttfts = []
+    for turn in range(args.turns):
+        question = QUESTIONS[turn % len(QUESTIONS)] + f"（第{turn + 1}轮）"
+        for _ in llm.stream_text(question, args.model):
+            pass
+        ttfts.append(llm.last_ttft or 0.0)
+        print(f"[{mode}] turn {turn + 1:>2}: ttft={ttfts[-1] * 1000:7.0f} ms  prompt≈{llm.last_prompt_tokens} tokens"
+              f"  server={llm.last_usage_prompt_tokens}")
+        if mode == "legacy":
+            legacy_trim(llm, args.legacy_cap)
+    return ttfts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比前缀稳定模式与旧截断逻辑的 TTFT")
+    parser.add_argument("--base-url", default="http://47.108.93.204:11435/v1")
+    parser.add_argument("--model", default="qwen3:8b")
+    parser.add_argument("--turns", type=int, default=16)
+    parser.add_argument("--system-repeat", type=int, default=40, help="系统提示词重复行数，控制前缀长度")
+    parser.add_argument("--context-tokens", type=int, default=6000)
+    parser.add_argument("--legacy-cap", type=int, default=8, help="legacy 模式保留的最大消息条数")
+    parser.add_argument("--keep-alive", default="30m")
+    parser.add_argument("--num-ctx", type=int, default=8192)
+    args = parser.parse_args()
+
+    results = {mode: run_conversation(args, mode) for mode in ("stable", "legacy")}
+    # 第一轮包含模型加载/冷缓存，不计入统计
+    print("\n模式      平均TTFT(ms)  中位数(ms)  最大(ms)")
+    for mode, ttfts in results.items():
+        steady = ttfts[1:] or ttfts
+        print(f"{mode:<8} {statistics.mean(steady) * 1000:12.0f} {statistics.median(steady) * 1000:11.0f} {max(steady) * 1000:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+多会话吞吐测试：一个 AgentFramework 同时服务多个会话，LLM 使用本地替身（benchmarks.fakes.FakeLLMServer，运行在子进程中）
+
+按不同会话数依次测试，每个会话连续处理 --turns 轮脚本化话语（同步接口每个会话一个线程，异步接口每个会话一个协程），
+输出吞吐与单轮耗时 p50/p95，并检查各会话的 dispatcher 历史只包含本会话的话语
+
+用法:
+    python -m benchmarks.sessions --sessions 1,4,16,64 --turns 4 --ttft-ms 80 --tokens-per-sec 60
+    python -m benchmarks.sessions --mode async
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.fakes import UTTERANCES, run_servers
+from logger import logger
+from utils.tracing import tracer
+
+CONFIG_TEMPLATE = """
+[General]
+trace = false
+max_sessions = {max_sessions}
+
+[Endpoints]
+bench = {base_url}
+
+[Dispatcher]
+model_name = bench-dispatcher
+context_tokens = 3000
+prefix_stable = true
+description = 你是一个快速反应的对话决策中心。
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+context_tokens = 6000
+prefix_stable = true
+tool_mode = {tool_mode}
+description = 用语言和用户交互的智能助手，能够做简单计算。
+tools = calculator
+"""
+
+
+def start_llm(args):
+    """在子进程中启动 LLM / ASR 替身（本测试只用 LLM），返回 (进程, base_url)"""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    llm_options = {"routes": {u["text"]: u["route"] for u in UTTERANCES}, "ttft_ms": args.ttft_ms,
+                   "tokens_per_sec": args.tokens_per_sec}
+    asr_options = {"transcripts": [u["text"] for u in UTTERANCES]}
+    process = ctx.Process(target=run_servers, args=(llm_options, asr_options, ready), daemon=True)
+    process.start()
+    base_url, _ = ready.get(timeout=30)
+    return process, base_url
+
+
+def utterance(session_index, turn):
+    return UTTERANCES[(session_index + turn) % len(UTTERANCES)]["text"]
+
+
+def run_sync(framework, session_ids, turns):
+    latencies = []
+
+    def lane(index, session_id):
+        for turn in range(turns):
+            start = time.perf_counter()
+            framework.process_user_query(utterance(index, turn), session_id=session_id)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=lane, args=(i, sid), daemon=True) for i, sid in enumerate(session_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_async(framework, session_ids, turns):
+    latencies = []
+
+    async def lane(index, session_id):
+        for turn in range(turns):
+            start = time.perf_counter()
+            await framework.aprocess_user_query(utterance(index, turn), session_id=session_id)
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(lane(i, sid) for i, sid in enumerate(session_ids)))
+
+    asyncio.run(main())
+    return latencies
+
+
+def check_isolation(framework, session_ids, turns):
+    """每个会话的 dispatcher 历史应恰好包含本会话发出的话语"""
+    errors = 0
+    for index, session_id in enumerate(session_ids):
+        messages = framework.get_session(session_id).dispatcher_llm.messages
+        sent = [m["content"].splitlines()[-1] for m in messages if m["role"] == "user"]
+        expected = [utterance(index, turn) for turn in range(turns)][-len(sent):] if sent else []
+        if sent != expected:
+            errors += 1
+    return errors
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单进程多会话吞吐测试（LLM 为本地替身）")
+    parser.add_argument("--sessions", default="1,4,16,64", help="依次测试的会话数，逗号分隔")
+    parser.add_argument("--turns", type=int, default=4, help="每个会话的轮数")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--ttft-ms", type=float, default=80.0, help="LLM 替身首 token 延迟")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0, help="LLM 替身生成速度")
+    parser.add_argument("--tool-mode", choices=["native", "text"], default="native")
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.sessions.split(",")]
+
+    process, base_url = start_llm(args)
+    if not args.verbose:
+        logger.remove()
+    tracer.configure(enabled=False)
+    config_path = os.path.join(tempfile.mkdtemp(prefix="xjrobot-sessions-"), "bench_config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(CONFIG_TEMPLATE.format(base_url=base_url, tool_mode=args.tool_mode, max_sessions=max(levels) * len(levels)))
+
+    from agent_framework import AgentFramework
+    framework = AgentFramework(config_path=config_path)
+    run = run_async if args.mode == "async" else run_sync
+    # 预热：建立连接
+    run(framework, ["warmup"], 1)
+
+    print(f"\n模式 {args.mode}，每会话 {args.turns} 轮，LLM 替身 ttft={args.ttft_ms:.0f}ms {args.tokens_per_sec:.0f} tok/s")
+    print(f"{'会话数':>6s} {'轮数':>6s} {'墙钟(s)':>8s} {'吞吐(轮/s)':>10s} {'p50(ms)':>9s} {'p95(ms)':>9s} {'CPU/轮(ms)':>10s} {'历史串扰':>8s}")
+    for level in levels:
+        session_ids = [f"bench-{level}-{i}" for i in range(level)]
+        cpu_start = os.times()
+        wall_start = time.perf_counter()
+        latencies = run(framework, session_ids, args.turns)
+        wall = time.perf_counter() - wall_start
+        cpu_end = os.times()
+        cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+        errors = check_isolation(framework, session_ids, args.turns)
+        print(f"{level:6d} {len(latencies):6d} {wall:8.2f} {len(latencies) / wall:10.2f} {percentile(latencies, 0.5) * 1000:9.0f} "
+              f"{percentile(latencies, 0.95) * 1000:9.0f} {cpu / max(1, len(latencies)) * 1000:10.1f} {errors:8d}")
+        for session_id in session_ids:
+            framework.close_session(session_id)
+    framework.close()
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+后台对话摘要测试：同一个会话连续处理 --turns 轮脚本化话语（LLM 为本地替身，运行在子进程中），
+分别在关闭 / 开启 [Summary] 时统计 dispatcher 与 Worker 每次请求的 prompt token 数、单轮耗时，
+以及被淘汰（直接丢失）与折叠进摘要的消息条数
+
+用法:
+    python -m benchmarks.summary --turns 40
+    python -m benchmarks.summary --turns 40 --think-ms 0 --summary-ttft-ms 1500 --no-yield
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import UTTERANCES, run_servers
+from logger import logger
+from utils.tracing import tracer
+
+CONFIG_TEMPLATE = """
+[General]
+trace = false
+
+[Endpoints]
+bench = {base_url}
+summary = {summary_url} | bench-summary
+
+[Dispatcher]
+model_name = bench-dispatcher
+context_tokens = {dispatcher_tokens}
+prefix_stable = true
+description = 你是一个快速反应的对话决策中心。
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+context_tokens = {worker_tokens}
+prefix_stable = true
+tool_mode = native
+description = 用语言和用户交互的智能助手，能够做简单计算。
+tools = calculator
+
+[Summary]
+enabled = {enabled}
+model_name = bench-summary
+trigger = {trigger}
+keep = {keep}
+yield_to_turns = {yield_to_turns}
+"""
+
+
+def start_fake(ttft_ms, tokens_per_sec):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    llm_options = {"routes": {u["text"]: u["route"] for u in UTTERANCES}, "ttft_ms": ttft_ms, "tokens_per_sec": tokens_per_sec}
+    process = ctx.Process(target=run_servers, args=(llm_options, {"transcripts": []}, ready), daemon=True)
+    process.start()
+    base_url, _ = ready.get(timeout=30)
+    return process, base_url
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(args, base_url, summary_url, enabled):
+    from agent_framework import AgentFramework
+    config_path = os.path.join(tempfile.mkdtemp(prefix="xjrobot-summary-"), "bench_config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(CONFIG_TEMPLATE.format(base_url=base_url, summary_url=summary_url, enabled=str(enabled).lower(),
+                                       dispatcher_tokens=args.dispatcher_tokens, worker_tokens=args.worker_tokens,
+                                       trigger=args.trigger, keep=args.keep, yield_to_turns=str(not args.no_yield).lower()))
+    framework = AgentFramework(config_path=config_path)
+    session = framework.get_session("bench")
+    dispatcher_tokens, worker_tokens, latencies = [], [], []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        framework.process_user_query(UTTERANCES[turn % len(UTTERANCES)]["text"], session_id="bench")
+        latencies.append(time.perf_counter() - start)
+        dispatcher_tokens.append(session.dispatcher_llm.last_prompt_tokens)
+        worker = session.workers.get(0)
+        if worker:
+            worker_tokens.append(worker.llm.last_prompt_tokens)
+        if args.think_ms:
+            # 用户两轮之间的间隔，后台摘要在这段时间内完成
+            time.sleep(args.think_ms / 1000)
+    windows = [session.dispatcher_llm.messages] + [w.llm.messages for w in session.workers.values()]
+    return {
+        "dispatcher": dispatcher_tokens,
+        "worker": worker_tokens,
+        "latency": latencies,
+        "evicted": sum(w.evicted_count for w in windows),
+        "summarized": sum(w.summarized_count for w in windows),
+        "summary": session.dispatcher_llm.messages.summary,
+        "stats": framework.summarizer.stats if framework.summarizer else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台对话摘要对 prompt 长度与单轮耗时的影响（LLM 为本地替身）")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--dispatcher-tokens", type=int, default=1200, help="dispatcher 的 context_tokens")
+    parser.add_argument("--worker-tokens", type=int, default=1500, help="Worker 的 context_tokens")
+    parser.add_argument("--trigger", type=float, default=0.7)
+    parser.add_argument("--keep", type=float, default=0.3)
+    parser.add_argument("--think-ms", type=float, default=300.0, help="两轮之间的间隔")
+    parser.add_argument("--ttft-ms", type=float, default=40.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--summary-ttft-ms", type=float, default=200.0, help="摘要模型替身的首 token 延迟（模拟较慢的摘要请求）")
+    parser.add_argument("--no-yield", action="store_true", help="新一轮开始时不取消进行中的摘要（摘要模型在单独端点时）")
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+
+    fake, base_url = start_fake(args.ttft_ms, args.tokens_per_sec)
+    summary_fake, summary_url = start_fake(args.summary_ttft_ms, args.tokens_per_sec)
+    if not args.verbose:
+        logger.remove()
+    tracer.configure(enabled=False)
+    try:
+        results = {label: run(args, base_url, summary_url, enabled) for label, enabled in [("关闭摘要", False), ("开启摘要", True)]}
+    finally:
+        fake.terminate()
+        summary_fake.terminate()
+
+    print(f"\n{args.turns} 轮，dispatcher 预算 {args.dispatcher_tokens}，Worker 预算 {args.worker_tokens} tokens")
+    print(f"{'':8s} {'dispatcher p50/max':>18s} {'worker p50/max':>16s} {'单轮 p50/p95(ms)':>16s} {'淘汰条数':>8s} {'折叠条数':>8s}")
+    for label, r in results.items():
+        print(f"{label:8s} {percentile(r['dispatcher'], 0.5):9.0f}/{max(r['dispatcher']):<8.0f} "
+              f"{percentile(r['worker'], 0.5):7.0f}/{max(r['worker'] or [0]):<8.0f} "
+              f"{percentile(r['latency'], 0.5) * 1000:7.0f}/{percentile(r['latency'], 0.95) * 1000:<8.0f} "
+              f"{r['evicted']:8d} {r['summarized']:8d}")
+    enabled = results["开启摘要"]
+    print(f"\n摘要任务: {enabled['stats']}")
+    print(f"dispatcher 当前摘要: {enabled['summary'] or '（无）'}")
+
+
+if __name__ == "__main__":
+    main()
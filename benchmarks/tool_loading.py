@@ -0,0 +1,95 @@
+"""
+工具模块加载的导入耗时与内存报告：每种情况在新的子进程中测量
+
+- 基线：只启动解释器
+- 按需加载：import tools（按工具清单登记，不导入工具模块）
+- 全部导入：import tools 之后立即导入所有工具模块（相当于改动前的行为），并给出每个模块的导入耗时
+- 工具清单：使用缓存与重新解析全部模块的耗时
+
+用法:
+    python -m benchmarks.tool_loading
+    python -m benchmarks.tool_loading --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MARKER = "__TOOL_LOADING__"
+
+PROBE = """
+import json, os, sys, time
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+mode = sys.argv[1]
+result = {"rss_mb": rss_mb()}
+start = time.perf_counter()
+if mode == "lazy" or mode == "eager":
+    import tools
+    result["import_ms"] = (time.perf_counter() - start) * 1000
+    result["tools"] = len(tools.list_all_tools())
+    if mode == "eager":
+        start = time.perf_counter()
+        tools.preload_tools()
+        result["preload_ms"] = (time.perf_counter() - start) * 1000
+        result["modules"] = {name: (t * 1000 if t is not None else None) for name, t in tools._tool_registry.lazy_modules.items()}
+    result["rss_mb"] = rss_mb()
+    result["heavy"] = sorted(m for m in ("pandas", "sklearn", "cv2", "PIL", "requests", "bs4", "numpy") if m in sys.modules)
+elif mode == "manifest":
+    from utils.tool_manifest import load_manifest, tool_module_files, scan_module
+    directory = os.path.join(os.getcwd(), "tools")
+    start = time.perf_counter()
+    load_manifest(directory, write=False)
+    result["cached_ms"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for path in tool_module_files(directory).values():
+        with open(path, "rb") as f:
+            scan_module(f.read())
+    result["scan_ms"] = (time.perf_counter() - start) * 1000
+print("__TOOL_LOADING__" + json.dumps(result))
+"""
+
+
+def probe(mode: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE, mode], capture_output=True, text=True, cwd=os.getcwd()).stdout
+    for line in output.splitlines():
+        if line.startswith(MARKER):
+            return json.loads(line[len(MARKER):])
+    raise RuntimeError(f"子进程没有输出结果（{mode}）:\n{output}")
+
+
+def best(results, key):
+    values = [r[key] for r in results if r.get(key) is not None]
+    return min(values) if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具模块按需加载的导入耗时与内存报告")
+    parser.add_argument("--repeat", type=int, default=3, help="每种情况重复的子进程数，耗时取最小值")
+    args = parser.parse_args()
+
+    runs = {mode: [probe(mode) for _ in range(args.repeat)] for mode in ["baseline", "lazy", "eager", "manifest"]}
+    baseline = best(runs["baseline"], "rss_mb")
+    lazy, eager = runs["lazy"][-1], runs["eager"][-1]
+    print(f"\n{'':12s} {'导入耗时(ms)':>12s} {'RSS(MB)':>9s} {'较基线(MB)':>11s}  已导入的重型依赖")
+    print(f"{'基线':12s} {'-':>12s} {baseline:9.1f} {0:11.1f}")
+    print(f"{'按需加载':12s} {best(runs['lazy'], 'import_ms'):12.1f} {lazy['rss_mb']:9.1f} {lazy['rss_mb'] - baseline:11.1f}  {', '.join(lazy['heavy']) or '无'}")
+    eager_ms = min(r["import_ms"] + r["preload_ms"] for r in runs["eager"])
+    print(f"{'全部导入':12s} {eager_ms:12.1f} {eager['rss_mb']:9.1f} {eager['rss_mb'] - baseline:11.1f}  {', '.join(eager['heavy']) or '无'}")
+    print(f"\n登记工具 {lazy['tools']} 个；工具清单读取缓存 {best(runs['manifest'], 'cached_ms'):.1f} ms，重新解析全部模块 {best(runs['manifest'], 'scan_ms'):.1f} ms")
+    print("\n各模块首次调用时的导入耗时（全部导入时测得，失败表示缺少依赖）:")
+    for name, elapsed in sorted(eager["modules"].items(), key=lambda item: -(item[1] or 0)):
+        print(f"  {name:20s} {f'{elapsed:8.1f} ms' if elapsed is not None else '    导入失败'}")
+
+
+if __name__ == "__main__":
+    main()
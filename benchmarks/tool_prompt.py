@@ -0,0 +1,51 @@
+"""
+工具说明的 prompt token 开销：按 config.ini 中各 [Worker.*] 的 tools，列出每个工具与每个 Agent 的说明
+在每次请求中占用的 token 数（估算），对比原先写入提示词的 expose_tools_as_service 原始写法（service）、
+紧凑写法（text）与原生 function calling 的 tools 参数（native）
+
+用法:
+    python -m benchmarks.tool_prompt --config config.ini
+    python -m benchmarks.tool_prompt --show Chat
+"""
+import argparse
+import configparser
+
+from tools import expose_tools_as_service, render_tools_prompt, tool_prompt_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各工具与各 Agent 的工具说明 token 开销")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--show", default="", help="输出指定 Agent 的原始写法与紧凑写法全文")
+    args = parser.parse_args()
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config, encoding="utf-8")
+    agents = {}
+    for section in cfg.sections():
+        if section.startswith("Worker."):
+            tools = [t.strip() for t in cfg.get(section, "tools", fallback="").split(",") if t.strip()]
+            agents[section[len("Worker."):]] = (tools, cfg.get(section, "tool_mode", fallback="text"))
+
+    print(f"\n{'工具':22s} {'模块':16s} {'service':>8s} {'text':>6s} {'native':>7s}")
+    seen = set()
+    for tools, _ in agents.values():
+        for item in tool_prompt_cost(tools):
+            if item["name"] not in seen:
+                seen.add(item["name"])
+                print(f"{item['name']:22s} {item['module']:16s} {item['service']:8d} {item['text']:6d} {item['native']:7d}")
+
+    print(f"\n{'Agent':10s} {'工具数':>6s} {'service':>8s} {'text':>6s} {'native':>7s}  tool_mode  每次请求")
+    for name, (tools, mode) in agents.items():
+        cost = tool_prompt_cost(tools) if tools else []
+        service, text, native = (sum(c[key] for c in cost) for key in ("service", "text", "native"))
+        print(f"{name:10s} {len(cost):6d} {service:8d} {text:6d} {native:7d}  {mode:9s}  {native if mode == 'native' else text}")
+
+    if args.show in agents:
+        tools = agents[args.show][0]
+        print(f"\n[{args.show}] 原始写法:\n{expose_tools_as_service(tools)}")
+        print(f"\n[{args.show}] 紧凑写法:\n{render_tools_prompt(tools)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+TTS 短语缓存测试：用 edge_tts 替身（每段首个音频块 --first-audio-ms）反复播报问候语、过渡语等常用短语，
+对比四种情况下每句的首个音频块延迟与请求合成服务的次数：
+- 不使用缓存
+- 冷启动：缓存为空，边播报边写入
+- 预合成：启动时在后台预合成全部短语
+- 重启：新进程使用已有的缓存目录（内存层为空，全部从磁盘读取）
+
+用法:
+    python -m benchmarks.tts_cache --rounds 3
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from benchmarks.fakes import FakeCommunicate, fake_engine
+from logger import logger
+
+PHRASES = [
+    "您好，请问有什么可以帮您的吗？",
+    "好嘞，这就给你放。",
+    "我帮你看看天气哈。",
+    "我没有听清楚，麻烦您再说一次",
+    "音乐播放已停止，您还有什么需要帮助的吗？",
+    "我帮你看看最新消息。",
+]
+
+
+class _CountingCommunicate(FakeCommunicate):
+    calls = 0
+
+    def __init__(self, text, voice=None):
+        super().__init__(text, voice)
+        type(self).calls += 1
+
+
+def run(args, cache_dir, use_cache=True, prerender=False):
+    from utils.tts import CosyTTS
+    from utils.tts_cache import PhraseCache
+    communicate_cls = _CountingCommunicate.configure(first_audio_ms=args.first_audio_ms, synth_speed=args.synth_speed, calls=0)
+    cache = PhraseCache(directory=cache_dir) if use_cache else None
+    tts = CosyTTS(communicate_cls=communicate_cls, engine=fake_engine(0), cache=cache)
+    if prerender:
+        tts.prerender(PHRASES).result(timeout=60)
+    # 预合成在启动时完成，只统计播报期间的合成请求
+    calls_before = communicate_cls.calls
+    for _ in range(args.rounds):
+        for phrase in PHRASES:
+            # 每句之间停顿一下，每句都从空闲开始，计入首个音频块延迟
+            tts.add_text(phrase)
+            tts.wait_until_done()
+            time.sleep(0.05)
+    first_audio = sorted(tts.first_audio_times)
+    tts.close()
+    tts.engine.stop()
+    return {
+        "p50": first_audio[len(first_audio) // 2] * 1000,
+        "max": first_audio[-1] * 1000,
+        "calls": communicate_cls.calls - calls_before,
+        "cache": cache.summary() if cache else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 短语缓存对首个音频块延迟的影响（合成与播放均为本地替身）")
+    parser.add_argument("--rounds", type=int, default=3, help="全部短语播报的轮数")
+    parser.add_argument("--first-audio-ms", type=float, default=500.0, help="合成服务每段的首个音频块延迟")
+    parser.add_argument("--synth-speed", type=float, default=10.0)
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.remove()
+
+    cache_dir = tempfile.mkdtemp(prefix="xjrobot-tts-cache-")
+    prerender_dir = tempfile.mkdtemp(prefix="xjrobot-tts-cache-")
+    try:
+        results = {
+            "不使用缓存": run(args, cache_dir, use_cache=False),
+            "冷启动": run(args, cache_dir),
+            "预合成": run(args, prerender_dir, prerender=True),
+            "重启（磁盘）": run(args, prerender_dir),
+        }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.rmtree(prerender_dir, ignore_errors=True)
+
+    print(f"\n{len(PHRASES)} 条短语 × {args.rounds} 轮，合成服务首个音频块 {args.first_audio_ms:g}ms")
+    print(f"{'':12s} {'首个音频 p50(ms)':>16s} {'max(ms)':>8s} {'合成请求':>8s}  缓存")
+    for label, r in results.items():
+        cache = r["cache"]
+        detail = (f"内存命中 {cache['memory_hits']} 磁盘命中 {cache['disk_hits']} 未命中 {cache['misses']} 命中率 {cache['hit_rate']}"
+                  if cache else "-")
+        print(f"{label:12s} {r['p50']:16.1f} {r['max']:8.1f} {r['calls']:8d}  {detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+TTS 预合成测试：用 edge_tts 替身（每段首个音频块 --first-audio-ms，合成速度为实时的 --synth-speed 倍）
+播报一段长回复，分别在不同 lookahead 下统计首个音频块延迟、相邻分段之间的输出空档，
+并按音频时长模拟实时播放，统计播放中因音频没有及时到达出现的停顿
+
+用法:
+    python -m benchmarks.tts_pipeline --lookahead 1,2,3
+    python -m benchmarks.tts_pipeline --batch --synth-speed 4
+"""
+import argparse
+import time
+
+from benchmarks.fakes import AUDIO_BYTES_PER_MS, FakeCommunicate, fake_engine
+from logger import logger
+
+REPLY = ("好的，我来给你讲讲今天的天气情况。长沙今天多云转小雨，气温在十八到二十四度之间。"
+         "上午云比较多，体感还算舒服，适合出门走走。下午两点以后可能会下小雨，出门记得带把伞。"
+         "晚上气温会降到十八度左右，风也稍微大一点，最好加一件薄外套。"
+         "明天雨会停，气温回升到二十六度，空气质量也不错。如果你周末想去爬山，明天下午是个好时机。"
+         "另外最近早晚温差比较大，注意别着凉，多喝点热水。还有什么想了解的吗？")
+
+
+def record_audio(tts) -> list:
+    """
+    记录每个音频块放入 audio_queue 的时间与长度（音频块为 (bytes, 打断代数)，跳过每段文本的结束标记与停止标记 None）
+    包装已有队列的 put：播放线程已经阻塞在这个队列上，不能整个替换
+    """
+    records = []
+    put = tts.audio_queue.put
+
+    def _put(item, block=True, timeout=None):
+        if isinstance(item, tuple):
+            records.append((time.perf_counter(), len(item[0])))
+        put(item, block, timeout)
+
+    tts.audio_queue.put = _put
+    return records
+
+
+def simulate_playback(records, start):
+    """按音频时长实时播放：返回 (首个音频块时间, 播放停顿次数, 停顿总时长, 播完时间)，单位秒，相对 start"""
+    play_end, stalls, stalled = None, 0, 0.0
+    for t, size in records:
+        if play_end is not None and t > play_end:
+            stalls += 1
+            stalled += t - play_end
+        play_end = max(play_end or t, t) + size / AUDIO_BYTES_PER_MS / 1000
+    return records[0][0] - start, stalls, stalled, play_end - start
+
+
+def run(args, lookahead):
+    from utils.tts import CosyTTS
+    communicate_cls = FakeCommunicate.configure(first_audio_ms=args.first_audio_ms, ms_per_char=args.audio_ms_per_char,
+                                                synth_speed=args.synth_speed)
+    tts = CosyTTS(communicate_cls=communicate_cls, engine=fake_engine(0), lookahead=lookahead)
+    records = record_audio(tts)
+    start = time.perf_counter()
+    if args.batch:
+        tts.add_text(REPLY)
+    else:
+        # 模拟 Worker 流式回复：按 LLM 生成速度逐句送入
+        for sentence in [s + "。" for s in REPLY.split("。") if s]:
+            time.sleep(len(sentence) / args.chars_per_sec)
+            tts.add_text(sentence)
+    tts.wait_until_done()
+    first_audio, stalls, stalled, done = simulate_playback(records, start)
+    stats = tts.stats()
+    tts.close()
+    tts.engine.stop()
+    return first_audio, stats, stalls, stalled, done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 预合成对首个音频与分段空档的影响（合成与播放均为本地替身）")
+    parser.add_argument("--lookahead", default="1,2,3")
+    parser.add_argument("--first-audio-ms", type=float, default=500.0, help="每段建立连接到首个音频块的延迟")
+    parser.add_argument("--synth-speed", type=float, default=1.2, help="合成速度（实时的倍数）")
+    parser.add_argument("--audio-ms-per-char", type=float, default=200.0, help="每个字的音频时长")
+    parser.add_argument("--batch", action="store_true", help="整段回复一次送入（默认按 --chars-per-sec 逐句送入，模拟流式回复）")
+    parser.add_argument("--chars-per-sec", type=float, default=40.0, help="逐句送入时 LLM 的生成速度")
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.remove()
+
+    print(f"\n{len(REPLY)} 字回复，{'一次送入' if args.batch else '逐句送入'}，每段首个音频块 {args.first_audio_ms:g}ms，合成 {args.synth_speed:g}x 实时")
+    print(f"{'lookahead':>9s} {'首个音频(ms)':>12s} {'分段空档 n':>10s} {'p50/p95/max(ms)':>18s} {'播放停顿':>8s} {'停顿总计(ms)':>12s} {'播完(s)':>8s}")
+    for lookahead in [int(x) for x in args.lookahead.split(",")]:
+        first_audio, stats, stalls, stalled, done = run(args, lookahead)
+        gaps = f"{stats['gap_p50_ms']}/{stats['gap_p95_ms']}/{stats['gap_max_ms']}"
+        print(f"{lookahead:9d} {first_audio * 1000:12.0f} {stats['gap_n']:10d} {gaps:>18s} {stalls:8d} {stalled * 1000:12.0f} {done:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+端到端语音链路离线测试：ASR / LLM / TTS 全部使用本地替身（benchmarks.fakes），
+只测框架自身的调度与数据流开销
+
+每个并发通道对应一个独立的 AgentFramework（相当于一台机器人），循环执行：
+  ASR 回放（发送音频帧 -> is_speaking=false -> 收到转写）-> process_user_query -> 等待播放完成
+各阶段耗时来自 utils.tracing 的每轮记录（以 asr.end_of_speech 为 0 点），并统计被测进程的 CPU 时间
+（LLM / ASR 替身运行在子进程中，解码替身是独立进程，均不计入；音频引擎的混音与输出在被测进程中，计入）
+
+用法:
+    python -m benchmarks.voice_pipeline --concurrency 4 --utterances 40 --ttft-ms 80 --tokens-per-sec 60
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from websockets.sync.client import connect
+
+from benchmarks.fakes import UTTERANCES, FakeCommunicate, fake_engine, run_servers
+from logger import logger
+from utils.tracing import load_traces, tracer
+
+CONFIG_TEMPLATE = """
+[General]
+tts_voice = zh-CN-XiaoxiaoNeural
+trace = true
+
+[Endpoints]
+bench = {base_url}
+
+[Dispatcher]
+model_name = bench-dispatcher
+context_tokens = 3000
+prefix_stable = true
+description = 你是一个快速反应的对话决策中心。
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+context_tokens = 6000
+prefix_stable = true
+stream_reply = {stream_reply}
+tool_mode = {tool_mode}
+description = 用语言和用户交互的智能助手，能够做简单计算。
+tools = calculator
+"""
+
+# 每个音频帧 60ms，与 SpeechRecognizer 的 chunk_size=[5, 10, 5]、chunk_interval=10 一致
+FRAME_MS = 60
+FRAME_BYTES = 16000 * 2 * FRAME_MS // 1000
+
+
+def start_fakes(args):
+    """在子进程中启动 LLM / ASR 替身，返回 (进程, llm base_url, asr uri)"""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    llm_options = {"routes": {u["text"]: u["route"] for u in UTTERANCES}, "ttft_ms": args.ttft_ms,
+                   "tokens_per_sec": args.tokens_per_sec}
+    asr_options = {"transcripts": [u["text"] for u in UTTERANCES], "latency_ms": args.asr_latency_ms}
+    process = ctx.Process(target=run_servers, args=(llm_options, asr_options, ready), daemon=True)
+    process.start()
+    base_url, asr_uri = ready.get(timeout=30)
+    return process, base_url, asr_uri
+
+
+def recognize(websocket, index, speech_ms):
+    """按 SpeechRecognizer 的协议回放一句话，返回转写文本"""
+    websocket.send(json.dumps({
+        "mode": "2pass", "chunk_size": [5, 10, 5], "chunk_interval": 10, "encoder_chunk_look_back": 4,
+        "decoder_chunk_look_back": 0, "wav_name": f"utt-{index}", "is_speaking": True, "hotwords": "", "itn": True,
+    }))
+    tracer.mark("asr.speech_start")
+    frame = b"\0" * FRAME_BYTES
+    for _ in range(max(1, int(speech_ms // FRAME_MS))):
+        websocket.send(frame)
+    tracer.mark("asr.end_of_speech", reason="replay")
+    websocket.send(json.dumps({"is_speaking": False}))
+    while True:
+        meg = json.loads(websocket.recv(timeout=10))
+        if "text" in meg and meg.get("mode") in ["offline", "2pass-offline"]:
+            tracer.mark("asr.final_text", chars=len(meg["text"]), timeout=False)
+            return meg["text"]
+
+
+def run_lane(framework, asr_uri, jobs, args, warmup_turns, results):
+    """一个并发通道：取出话语序号，依次走完 ASR -> dispatcher/worker -> TTS 播放"""
+    with connect(asr_uri, subprotocols=["binary"]) as websocket:
+        done = 0
+        while True:
+            try:
+                index = jobs.get_nowait()
+            except queue.Empty:
+                return
+            turn_id = tracer.start_turn()
+            if done < args.warmup:
+                warmup_turns.add(turn_id)
+            start = time.perf_counter()
+            text = recognize(websocket, index, args.speech_ms)
+            framework.process_user_query(text)
+            results.append(time.perf_counter() - start)
+            done += 1
+
+
+def build_frameworks(args, base_url):
+    from agent_framework import AgentFramework
+    from utils.tts import CosyTTS
+    config_path = os.path.join(args.workdir, "bench_config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(CONFIG_TEMPLATE.format(base_url=base_url, stream_reply=str(not args.no_stream_reply).lower(),
+                                       tool_mode=args.tool_mode))
+    communicate_cls = FakeCommunicate.configure(first_audio_ms=args.tts_first_audio_ms, ms_per_char=args.audio_ms_per_char)
+    frameworks = []
+    for _ in range(args.concurrency):
+        tts = CosyTTS(communicate_cls=communicate_cls, engine=fake_engine(args.playback_rate))
+        frameworks.append(AgentFramework(config_path=config_path, tts_client=tts))
+    return frameworks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线语音链路性能测试（LLM / ASR / TTS 均为本地替身）")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发通道数，每个通道一个 AgentFramework")
+    parser.add_argument("--utterances", type=int, default=20, help="总话语数（不含预热）")
+    parser.add_argument("--warmup", type=int, default=1, help="每个通道的预热轮数，不计入统计")
+    parser.add_argument("--ttft-ms", type=float, default=80.0, help="LLM 替身首 token 延迟")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0, help="LLM 替身生成速度")
+    parser.add_argument("--asr-latency-ms", type=float, default=150.0, help="ASR 替身从 is_speaking=false 到返回转写的延迟")
+    parser.add_argument("--speech-ms", type=float, default=1200.0, help="每句话回放的音频时长（不按实时节奏发送）")
+    parser.add_argument("--tts-first-audio-ms", type=float, default=120.0, help="TTS 替身首个音频块延迟")
+    parser.add_argument("--audio-ms-per-char", type=float, default=50.0, help="TTS 替身每个字的音频时长")
+    parser.add_argument("--playback-rate", type=float, default=1.0, help="播放替身倍速，0 表示不等待播放时长")
+    parser.add_argument("--tool-mode", choices=["native", "text"], default="native")
+    parser.add_argument("--no-stream-reply", action="store_true", help="Worker 不流式播报最终回复")
+    parser.add_argument("--quiet", action="store_true", help="关闭日志输出（日志本身也是框架开销的一部分）")
+    parser.add_argument("--workdir", default=None, help="配置与 trace 文件目录，默认临时目录")
+    args = parser.parse_args()
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="xjrobot-bench-")
+    os.makedirs(args.workdir, exist_ok=True)
+
+    process, base_url, asr_uri = start_fakes(args)
+    if args.quiet:
+        logger.remove()
+    trace_path = os.path.join(args.workdir, "traces.jsonl")
+    tracer.configure(enabled=True, path=trace_path)
+    frameworks = build_frameworks(args, base_url)
+
+    jobs = queue.Queue()
+    for index in range(args.utterances + args.warmup * args.concurrency):
+        jobs.put(index)
+    warmup_turns, results = set(), []
+    wall_start = time.perf_counter()
+    cpu_start = os.times()
+    lanes = [threading.Thread(target=run_lane, args=(framework, asr_uri, jobs, args, warmup_turns, results), daemon=True)
+             for framework in frameworks]
+    for thread in lanes:
+        thread.start()
+    for thread in lanes:
+        thread.join()
+    cpu_end = os.times()
+    wall = time.perf_counter() - wall_start
+    cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    for framework in frameworks:
+        framework.close()
+    process.terminate()
+
+    records = [r for r in load_traces(trace_path) if r["turn_id"] not in warmup_turns]
+    print(f"\n并发 {args.concurrency}，统计 {len(records)} 轮（预热 {len(warmup_turns)} 轮不计），trace: {trace_path}")
+    print(f"{'阶段(相对 asr.end_of_speech)':32s} {'n':>5s} {'p50(ms)':>10s} {'p95(ms)':>10s}")
+    for stage, item in sorted(tracer.summary(records).items(), key=lambda kv: kv[1]["p50_ms"]):
+        print(f"{stage:32s} {item['count']:5d} {item['p50_ms']:10.1f} {item['p95_ms']:10.1f}")
+    # CPU 包含预热轮次，按所有执行过的轮次平均
+    executed = len(results) or 1
+    print(f"\n墙钟 {wall:.2f}s  吞吐 {len(results) / wall:.2f} 轮/s")
+    print(f"CPU {cpu:.2f}s（user {cpu_end.user - cpu_start.user:.2f}s / sys {cpu_end.system - cpu_start.system:.2f}s）"
+          f"  每轮 {cpu / executed * 1000:.1f} ms  平均占用 {cpu / wall * 100:.0f}% 单核")
+
+
+if __name__ == "__main__":
+    main()
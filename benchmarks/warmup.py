@@ -0,0 +1,115 @@
+"""
+模型预热测试：LLM 替身模拟 Ollama 的模型加载（未驻留时额外 --load-ms 延迟，空闲 --server-keep-alive 秒后卸载），
+分别在关闭 / 开启 [Warmup] 时，让用户每隔 --idle 秒说一句话，统计每轮的 dispatcher 首 token 延迟与单轮耗时，
+并输出预热管理器记录的加载 / 驻留时首 token 延迟
+
+用法:
+    python -m benchmarks.warmup --rounds 3 --idle 3 --load-ms 1500
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import UTTERANCES, run_servers
+from logger import logger
+from utils.tracing import tracer
+
+CONFIG_TEMPLATE = """
+[General]
+trace = false
+
+[Endpoints]
+bench = {base_url}
+
+[Dispatcher]
+model_name = bench-dispatcher
+context_tokens = 3000
+num_ctx = 4096
+description = 你是一个快速反应的对话决策中心。
+
+[Worker.Chat]
+agent_id = 0
+model_name = bench-worker
+context_tokens = 6000
+num_ctx = 8192
+tool_mode = native
+description = 用语言和用户交互的智能助手，能够做简单计算。
+tools = calculator
+
+[Warmup]
+enabled = {enabled}
+interval = {interval}
+keep_alive = {keep_alive}
+"""
+
+
+def start_fake(args):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    llm_options = {"routes": {u["text"]: u["route"] for u in UTTERANCES}, "ttft_ms": args.ttft_ms, "tokens_per_sec": args.tokens_per_sec,
+                   "load_ms": args.load_ms, "keep_alive_s": args.server_keep_alive}
+    process = ctx.Process(target=run_servers, args=(llm_options, {"transcripts": []}, ready), daemon=True)
+    process.start()
+    base_url, _ = ready.get(timeout=30)
+    return process, base_url
+
+
+def run(args, enabled):
+    from agent_framework import AgentFramework
+    fake, base_url = start_fake(args)
+    try:
+        config_path = os.path.join(tempfile.mkdtemp(prefix="xjrobot-warmup-"), "bench_config.ini")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(CONFIG_TEMPLATE.format(base_url=base_url, enabled=str(enabled).lower(), interval=args.interval,
+                                           keep_alive=args.keep_alive))
+        framework = AgentFramework(config_path=config_path)
+        # 非默认会话不播报语音，单轮耗时只包含 LLM 与工具
+        session = framework.get_session("bench")
+        ttfts, latencies = [], []
+        for turn in range(args.rounds):
+            # 用户空闲一段时间后再说话，期间模型可能已被服务端卸载
+            time.sleep(args.idle)
+            start = time.perf_counter()
+            framework.process_user_query(UTTERANCES[(turn * 2 + 1) % len(UTTERANCES)]["text"], session_id="bench")
+            latencies.append(time.perf_counter() - start)
+            ttfts.append(session.dispatcher_llm.last_ttft or 0.0)
+        stats = framework.warmup.stats() if framework.warmup else []
+        framework.close()
+        return ttfts, latencies, stats
+    finally:
+        fake.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型预热对空闲后首轮延迟的影响（LLM 为本地替身）")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--idle", type=float, default=3.0, help="每轮之前的空闲时间（秒）")
+    parser.add_argument("--load-ms", type=float, default=1500.0, help="替身模拟的模型加载耗时")
+    parser.add_argument("--server-keep-alive", type=float, default=2.0, help="请求未带 keep_alive 时替身保留模型的秒数")
+    parser.add_argument("--interval", type=float, default=1.0, help="[Warmup] interval")
+    parser.add_argument("--keep-alive", default="5s", help="[Warmup] keep_alive")
+    parser.add_argument("--ttft-ms", type=float, default=80.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--verbose", action="store_true", help="保留日志输出")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.remove()
+    tracer.configure(enabled=False)
+
+    print(f"\n模型加载 {args.load_ms:.0f}ms，服务端空闲 {args.server_keep_alive:g}s 卸载，每轮前空闲 {args.idle:g}s，共 {args.rounds} 轮")
+    print(f"{'':8s} {'dispatcher 首 token(ms)':>28s} {'单轮耗时(ms)':>28s}")
+    all_stats = []
+    for label, enabled in [("关闭预热", False), ("开启预热", True)]:
+        ttfts, latencies, stats = run(args, enabled)
+        all_stats += stats
+        print(f"{label:8s} {' '.join(f'{t * 1000:6.0f}' for t in ttfts):>28s} {' '.join(f'{t * 1000:6.0f}' for t in latencies):>28s}")
+    print("\n预热统计:")
+    for item in all_stats:
+        print(f"  {item['model']:18s} 预热 {item['warmups']} 次 跳过 {item['skipped']} 次  "
+              f"加载 ttft p50={item['load_ttft_p50_ms']}ms  驻留 ttft p50={item['warm_ttft_p50_ms']}ms  驻留={item['resident']}")
+
+
+if __name__ == "__main__":
+    main()
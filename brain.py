@@ -1,107 +1,543 @@
+import asyncio
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, BadRequestError
 from logger import logger
+from utils.context_window import ContextWindow, DEFAULT_TOKEN_BUDGET
+from llm_router import router, RETRYABLE_ERRORS, TTFT, TOTAL
 base_url = "http://47.108.93.204:11435/v1"
 # tool_base_url = "http://47.108.93.204:11435/v1"
 # tool_base_url = "http://47.108.93.204:18000/v1"
+
+class ClientPool:
+    """
+    按 base_url 共享的 OpenAI 客户端池，所有 LLM_Ollama 复用同一组 keep-alive 连接
+    同步客户端进程内共享；异步客户端按事件循环共享（httpx 的连接不能跨事件循环复用）
+    """
+    def __init__(self, max_connections=64, max_keepalive_connections=16, keepalive_expiry=120.0, timeout=120.0):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def get(self, base_url, api_key="ollama", max_retries=2) -> OpenAI:
+        """获取（必要时创建）同步客户端；max_retries 为客户端自身的重试次数"""
+        key = (base_url, api_key, max_retries)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    max_retries=max_retries,
+                    http_client=DefaultHttpxClient(limits=self.limits, timeout=self.timeout)
+                )
+                self._clients[key] = client
+                logger.info(f"创建共享 LLM 客户端: {base_url}")
+            return client
+
+    def get_async(self, base_url, api_key="ollama", max_retries=2) -> AsyncOpenAI:
+        """获取当前事件循环下的异步客户端，必须在协程中调用"""
+        loop = asyncio.get_running_loop()
+        key = (base_url, api_key, max_retries)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = AsyncOpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    max_retries=max_retries,
+                    http_client=DefaultAsyncHttpxClient(limits=self.limits, timeout=self.timeout)
+                )
+                clients[key] = client
+                logger.info(f"创建共享异步 LLM 客户端: {base_url}")
+            return client
+
+    async def aclose(self):
+        """关闭当前事件循环下的异步客户端（事件循环退出前调用）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {})
+        for client in clients.values():
+            await client.close()
+
+client_pool = ClientPool()
+
+def ollama_extra_body(keep_alive=None, num_ctx=None):
+    """Ollama 专有参数，通过 extra_body 随 OpenAI 兼容请求一起发送；num_ctx 不同时 Ollama 会重新加载模型"""
+    extra_body = {}
+    if keep_alive is not None:
+        extra_body["keep_alive"] = keep_alive
+    if num_ctx:
+        extra_body["options"] = {"num_ctx": num_ctx}
+    return extra_body or None
+
+def chat_completion(model, base_url=base_url, api_key="ollama", **kwargs):
+    """
+    无上下文的单次请求（如视觉工具调用 VLM），同样经 llm_router 选择端点、失败换端点
+    base_url 只在该模型没有配置端点时使用
+    """
+    retries = router.client_retries(model)
+    def send(endpoint):
+        return client_pool.get(endpoint.base_url, endpoint.api_key, retries).chat.completions.create(model=model, **kwargs)
+    _, response = router.request(model, send, default_base_url=base_url, default_api_key=api_key)
+    return response
+
+# 请求带 tools 时被服务端拒绝的 (端点 base_url, 模型)：带 tools 的请求不再发往这些端点，所有端点都拒绝后回退到文本协议
+_native_tools_unsupported = set()
+# 服务端表示不支持原生工具调用的错误信息（Ollama：does not support tools；vLLM：未开启 auto tool choice）
+_TOOLS_UNSUPPORTED_PATTERN = re.compile(r"does not support tools|tools? (?:is|are) not supported|enable-auto-tool-choice", re.IGNORECASE)
+
+
+def tools_unsupported_error(error: BadRequestError) -> bool:
+    """400 错误是否因为模型不支持 tools；上下文超长、消息格式错误等其他 400 不应让模型回退到文本协议"""
+    return bool(_TOOLS_UNSUPPORTED_PATTERN.search(f"{error} {getattr(error, 'body', '')}"))
+
 class LLM_Ollama:
-    def __init__(self, base_url=base_url, api_key="ollama", temperature=0.9, top_k=1, max_tokens=5012, model="qwen3:14b"):
+    def __init__(self, base_url=base_url, api_key="ollama", temperature=0.9, top_k=1, max_tokens=5012, model="qwen3:14b", context_tokens=DEFAULT_TOKEN_BUDGET,
+                 keep_alive=None, num_ctx=None, prefix_stable=False):
         """
         初始化本地对话助手，用户选择模型
+        客户端从 client_pool 中获取，同一 base_url 的所有实例共享连接池
+        配置了 [Endpoints] 时请求经 llm_router 在多个端点间路由，base_url 只在该模型没有配置端点时使用
+        context_tokens: 上下文 token 预算（含系统提示词），超出时压缩/淘汰最早的对话
+        keep_alive / num_ctx: 透传给 Ollama 的模型驻留时间与上下文长度
+        prefix_stable: 只追加不改写历史消息，保证请求前缀稳定以复用服务端 KV 缓存
         """
-        self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.base_url = base_url
+        self.api_key = api_key
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.model = model
+        self.context_tokens = context_tokens
+        self.prefix_stable = prefix_stable
+        self.extra_body = self._build_extra_body(keep_alive, num_ctx)
+        # 最近一次流式请求的首 token 延迟（秒）
+        self.last_ttft = None
+        # 最近一次请求的 prompt token 数：估算值与服务端返回值（服务端未返回时为 None）
+        self.last_prompt_tokens = 0
+        self.last_usage_prompt_tokens = None
+        # 最近一次请求返回的原生工具调用：[{"id", "name", "arguments"}]
+        self.last_tool_calls = []
+        # 最近一次请求是否因端点不支持 tools 参数被拒绝（调用方换端点重试或回退到文本协议）
+        self.tools_rejected = False
+        # 用户打断（barge-in）时由会话置位：流式请求立即关闭连接，已生成的部分照常写入上下文
+        self.cancel_event = None
         self.messages = [{"role": "system", "content": "你是一个有帮助的助手。"}]
 
-    def return_text(self, user_text, llm_model):
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    @property
+    def messages(self) -> ContextWindow:
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        # 兼容直接赋值列表的写法（如 llm.messages = []），统一包装为带预算的上下文
+        if isinstance(messages, ContextWindow):
+            self._messages = messages
+        else:
+            self._messages = ContextWindow(token_budget=self.context_tokens, messages=messages, prefix_stable=self.prefix_stable)
+
+    def _build_extra_body(self, keep_alive, num_ctx):
+        if num_ctx and self.context_tokens and self.context_tokens > num_ctx:
+            logger.warning(f'{self.model} 的 context_tokens({self.context_tokens}) 大于 num_ctx({num_ctx})，服务端会截断前缀导致缓存失效')
+        return ollama_extra_body(keep_alive, num_ctx)
+
+    def _send(self, llm_model, **kwargs):
+        """
+        经路由选择端点发起同步请求，失败时自动换端点
+        :return: (endpoint, 响应或流)；请求结束后需调用 router.release(endpoint, ...)
+        """
+        retries = router.client_retries(llm_model)
+        def send(endpoint):
+            with self._tools_rejection(endpoint, llm_model, kwargs):
+                return client_pool.get(endpoint.base_url, endpoint.api_key, retries).chat.completions.create(model=llm_model, **kwargs)
+        return router.request(llm_model, send, default_base_url=self.base_url, default_api_key=self.api_key, release=False,
+                              kind=TTFT if kwargs.get("stream") else TOTAL, exclude=self._tools_excluded(llm_model, kwargs))
+
+    async def _asend(self, llm_model, **kwargs):
+        """_send 的异步版本"""
+        retries = router.client_retries(llm_model)
+        async def send(endpoint):
+            with self._tools_rejection(endpoint, llm_model, kwargs):
+                return await client_pool.get_async(endpoint.base_url, endpoint.api_key, retries).chat.completions.create(model=llm_model, **kwargs)
+        return await router.arequest(llm_model, send, default_base_url=self.base_url, default_api_key=self.api_key, release=False,
+                                     kind=TTFT if kwargs.get("stream") else TOTAL, exclude=self._tools_excluded(llm_model, kwargs))
+
+    @staticmethod
+    def _release(endpoint, latency, error=None, kind=TTFT):
+        """请求结束后归还端点；latency 为 kind 种类的延迟样本，只有连接/服务端类错误计入端点失败"""
+        router.release(endpoint, latency, error=error if isinstance(error, RETRYABLE_ERRORS) else None, kind=kind)
+
+    @staticmethod
+    def user_message(user_text):
+        """构造发送给模型的用户消息（统一加上 /no_think 前缀）"""
+        return {"role": "user", "content": '/no_think\n'+user_text}
+
+    def _append_user(self, user_text):
+        self.messages.append(self.user_message(user_text))
+
+    def _prepare_request(self):
+        """
+        生成本次请求的消息列表（上下文预算已在入队时保证），并记录 prompt token 数
+        """
+        request_messages = self.messages.to_list()
+        self.last_prompt_tokens = self.messages.tokens
+        self.last_usage_prompt_tokens = None
+        logger.info(f'messages 长度 ：{len(request_messages)}，prompt tokens≈{self.last_prompt_tokens}/{self.messages.token_budget}')
+        logger.info(f'模型接收的输入: {request_messages[1:]}')
+        return request_messages
+
+    def _record_usage(self, usage):
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            self.last_usage_prompt_tokens = usage.prompt_tokens
+            logger.info(f'服务端统计 prompt tokens: {usage.prompt_tokens}（估算 {self.last_prompt_tokens}）')
+
+    def supports_native_tools(self, llm_model) -> bool:
+        """该模型是否支持原生 function calling：还有服务该模型的端点没有拒绝过 tools 参数即视为支持"""
+        return any((url, llm_model) not in _native_tools_unsupported for url in router.base_urls(llm_model, self.base_url))
+
+    @staticmethod
+    def _tools_excluded(llm_model, kwargs):
+        """带 tools 的请求不发往已拒绝过 tools 参数的端点"""
+        if not kwargs.get("tools"):
+            return ()
+        return [ep for ep in router.endpoints() if (ep.base_url, llm_model) in _native_tools_unsupported]
+
+    @staticmethod
+    @contextmanager
+    def _tools_rejection(endpoint, llm_model, kwargs):
+        """请求因端点不支持 tools 被拒绝时，按实际发往的端点记录"""
+        try:
+            yield
+        except BadRequestError as e:
+            if kwargs.get("tools") and tools_unsupported_error(e):
+                _native_tools_unsupported.add((endpoint.base_url, llm_model))
+                logger.warning(f'端点 {endpoint.name} 上的 {llm_model} 不支持原生工具调用: {e}')
+            raise
+
+    @staticmethod
+    def _tool_request_kwargs(tools):
+        return {"tools": tools} if tools else {}
+
+    @staticmethod
+    def _merge_tool_call_deltas(tool_calls, deltas):
+        """把流式返回的 tool_calls 增量按 index 拼接成完整调用"""
+        for delta in deltas or []:
+            index = delta.index if getattr(delta, "index", None) is not None else len(tool_calls)
+            while len(tool_calls) <= index:
+                tool_calls.append({"id": None, "name": "", "arguments": ""})
+            call = tool_calls[index]
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function:
+                if delta.function.name and not call["name"]:
+                    call["name"] = delta.function.name
+                if delta.function.arguments:
+                    call["arguments"] += delta.function.arguments
+
+    def _set_tool_calls(self, tool_calls):
+        """记录本轮的原生工具调用，补齐缺失的调用 id"""
+        self.last_tool_calls = [dict(call, id=call["id"] or f"call_{i}") for i, call in enumerate(tool_calls or []) if call["name"]]
+        return self.last_tool_calls
+
+    def _assistant_message(self, content):
+        msg = {"role": "assistant", "content": content}
+        if self.last_tool_calls:
+            msg["tool_calls"] = [
+                {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in self.last_tool_calls
+            ]
+        return msg
+
+    def commit_reply(self, assistant_reply, tool_calls=None):
+        """
+        非流式回复的后处理：去掉思考段、合并重复行，写入上下文
+        tool_calls: 原生工具调用，随助手消息一起写入上下文
+        """
+        self._set_tool_calls(tool_calls)
+        assistant_reply=assistant_reply.split('</think>')[-1].strip()
+        a = assistant_reply.split('\n')
+        if a[0]==a[-1]:
+            assistant_reply = a[0]
+        self.messages.append(self._assistant_message(assistant_reply))
+        return assistant_reply
+
+    def _commit_stream_reply(self, full_reply, tool_calls=None):
+        """流式回复结束后处理完整回复并更新上下文"""
+        self._set_tool_calls(tool_calls)
+        if '</think>' in full_reply:
+            think_end = full_reply.rfind('</think>')
+            full_reply = full_reply[think_end+len('</think>'):]
+        self.messages.append(self._assistant_message(full_reply))
+        return full_reply
+
+    @staticmethod
+    def _message_tool_calls(message):
+        """非流式响应中的原生工具调用"""
+        return [{"id": call.id, "name": call.function.name, "arguments": call.function.arguments or ""}
+                for call in (message.tool_calls or [])]
+
+    def return_text(self, user_text, llm_model, tools=None):
         """
         输入用户文本，返回助手回复文本，并更新上下文
+        tools: 原生 function calling 的工具描述，模型返回的调用记录在 last_tool_calls
         """
         if user_text != "":
-          user_text = '/no_think\n'+user_text
-          self.messages.append({"role": "user", "content": user_text})
+          self._append_user(user_text)
         # else:
         # # user_text = user_text
         #   user_text = '/no_think请你根据前一次工具结果继续完成用户的请求\n'+''
         #   self.messages.append({"role": "assistant", "content": user_text})
         # user_text = '/no_think\n'+user_text
         # self.messages.append({"role": "user", "content": user_text})
-        logger.info(f'messages 长度 ：{len(self.messages)}')
-        if len(self.messages) > 30:
-            # 保留第0条系统提示词，截取最近19条用户/助手对话
-            self.messages = [self.messages[0]] + self.messages[-29:]
-        logger.info(f'模型接收的输入: {self.messages[1:]}')
+        request_messages = self._prepare_request()
         try:
             dt = datetime.now()  # 取当前时间:2024-11-19 14:34:54 350897
             logger.info(f'请求时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
-            response = self.client.chat.completions.create(
-                model=llm_model,
-                messages=self.messages,
+            self.last_tool_calls = []
+            self.tools_rejected = False
+            start_time = time.perf_counter()
+            endpoint, response = self._send(
+                llm_model,
+                messages=request_messages,
                 temperature=self.temperature,
-                max_tokens=self.max_tokens
+                max_tokens=self.max_tokens,
+                extra_body=self.extra_body,
+                **self._tool_request_kwargs(tools)
             )
-            assistant_reply = response.choices[0].message.content.strip()
+            self._release(endpoint, time.perf_counter() - start_time, kind=TOTAL)
+            message = response.choices[0].message
+            assistant_reply = (message.content or "").strip()
+            self._record_usage(response.usage)
             dt = datetime.now()  # 取当前时间:2024-11-19 14:34:54 350897
             logger.info(f'回复生成结束时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
             # logger.info(f'回复内容: {assistant_reply}')
-            assistant_reply=assistant_reply.split('</think>')[-1].strip()
-            a = assistant_reply.split('\n')
-            if a[0]==a[-1]:
-                assistant_reply = a[0]
-            self.messages.append({"role": "assistant", "content": assistant_reply})
-            for i,msg in enumerate(self.messages):
-                if msg['role'] == 'assistant':
-                    if len(msg['content']) > 200 :
-                        self.messages[i]['content'] = msg['content'][:100]+'...'+msg['content'][-100:]
-            return assistant_reply
+            return self.commit_reply(assistant_reply, self._message_tool_calls(message))
+        except BadRequestError as e:
+            if not tools or not tools_unsupported_error(e):
+                return f"[错误] 请求失败：{e}"
+            self.tools_rejected = True
+            return ""
         except Exception as e:
             return f"[错误] 请求失败：{e}"
     
-    def stream_text(self, user_text, llm_model):
+    def stream_text(self, user_text, llm_model, tools=None):
         """
         输入用户文本，以流式方式返回助手回复文本，并更新上下文
+        user_text 为空时不追加用户消息（Worker 根据已有上下文继续生成）
+        tools: 原生 function calling 的工具描述，流结束后调用记录在 last_tool_calls
         """
-        user_text = '/no_think\n'+user_text
-        self.messages.append({"role": "user", "content": user_text})
-        logger.info(f'messages 长度 ：{len(self.messages)}')
-        
-        if len(self.messages) > 30:
-            # 保留第0条系统提示词，截取最近19条用户/助手对话
-            self.messages = [self.messages[0]] + self.messages[-29:]
-        logger.info(f'模型接收的输入: {self.messages[1:]}')
+        if user_text != "":
+            self._append_user(user_text)
+        request_messages = self._prepare_request()
         full_reply = ""
         try:
             dt = datetime.now()
             logger.info(f'流式请求时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
             
             # 使用stream=True参数获取流式响应
-            stream = self.client.chat.completions.create(
-                model=llm_model,
-                messages=self.messages,
+            self.last_ttft = None
+            self.last_tool_calls = []
+            self.tools_rejected = False
+            tool_calls = []
+            start_time = time.perf_counter()
+            endpoint, stream = self._send(
+                llm_model,
+                messages=request_messages,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
-                stream=True
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_body=self.extra_body,
+                **self._tool_request_kwargs(tools)
             )
             
             # 逐块生成响应
-            for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content is not None and chunk.choices[0].delta.content != '':
-                    content = chunk.choices[0].delta.content
-                    full_reply += content
-                    yield content
+            stream_error = None
+            try:
+                for chunk in stream:
+                    if self.cancelled:
+                        # 被打断：不再接收，未完成的工具调用丢弃
+                        stream.close()
+                        tool_calls = []
+                        logger.info("流式请求已被打断")
+                        break
+                    self._record_usage(getattr(chunk, "usage", None))
+                    if chunk.choices:
+                        self._merge_tool_call_deltas(tool_calls, chunk.choices[0].delta.tool_calls)
+                    if chunk.choices and chunk.choices[0].delta.content is not None and chunk.choices[0].delta.content != '':
+                        content = chunk.choices[0].delta.content
+                        if self.last_ttft is None:
+                            self.last_ttft = time.perf_counter() - start_time
+                            logger.info(f'首 token 延迟: {self.last_ttft*1000:.0f} ms')
+                        full_reply += content
+                        yield content
+            except Exception as e:
+                stream_error = e
+                raise
+            finally:
+                self._release(endpoint, self.last_ttft, stream_error)
             
             dt = datetime.now()
             logger.info(f'流式回复结束时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
             
             # 处理完整回复并更新上下文
-            if '</think>' in full_reply:
-                think_end = full_reply.rfind('</think>')
-                full_reply = full_reply[think_end+len('</think>'):]
-            
-            self.messages.append({"role": "assistant", "content": full_reply})
+            self._commit_stream_reply(full_reply, tool_calls)
             
+        except BadRequestError as e:
+            if not tools or not tools_unsupported_error(e):
+                yield f"[错误] 流式请求失败：{e}"
+                return
+            self.tools_rejected = True
+        except Exception as e:
+            error_message = f"[错误] 流式请求失败：{e}"
+            yield error_message
+
+    def complete(self, messages, llm_model, cancel_event=None):
+        """
+        无状态补全：用给定的消息列表请求一次回复，不读写 self.messages
+        以流式方式接收，cancel_event 被置位时立即关闭连接并返回 None（用于投机执行）
+        """
+        full_reply = ""
+        ttft = None
+        stream_error = None
+        start_time = time.perf_counter()
+        endpoint, stream = self._send(
+            llm_model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+            extra_body=self.extra_body
+        )
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start_time
+                    full_reply += chunk.choices[0].delta.content
+        except Exception as e:
+            stream_error = e
+            raise
+        finally:
+            stream.close()
+            self._release(endpoint, ttft, stream_error)
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        return full_reply.strip()
+
+    async def areturn_text(self, user_text, llm_model, tools=None):
+        """
+        return_text 的异步版本：不占用线程，等待期间事件循环可以处理其他会话
+        """
+        if user_text != "":
+            self._append_user(user_text)
+        request_messages = self._prepare_request()
+        try:
+            dt = datetime.now()
+            logger.info(f'异步请求时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
+            self.last_tool_calls = []
+            self.tools_rejected = False
+            start_time = time.perf_counter()
+            endpoint, response = await self._asend(
+                llm_model,
+                messages=request_messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                extra_body=self.extra_body,
+                **self._tool_request_kwargs(tools)
+            )
+            self._release(endpoint, time.perf_counter() - start_time, kind=TOTAL)
+            message = response.choices[0].message
+            assistant_reply = (message.content or "").strip()
+            self._record_usage(response.usage)
+            dt = datetime.now()
+            logger.info(f'异步回复生成结束时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
+            return self.commit_reply(assistant_reply, self._message_tool_calls(message))
+        except BadRequestError as e:
+            if not tools or not tools_unsupported_error(e):
+                return f"[错误] 请求失败：{e}"
+            self.tools_rejected = True
+            return ""
+        except Exception as e:
+            return f"[错误] 请求失败：{e}"
+
+    async def astream_text(self, user_text, llm_model, tools=None):
+        """
+        stream_text 的异步版本，返回异步生成器：async for chunk in llm.astream_text(...)
+        """
+        if user_text != "":
+            self._append_user(user_text)
+        request_messages = self._prepare_request()
+        full_reply = ""
+        try:
+            dt = datetime.now()
+            logger.info(f'异步流式请求时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
+            self.last_ttft = None
+            self.last_tool_calls = []
+            self.tools_rejected = False
+            tool_calls = []
+            start_time = time.perf_counter()
+            endpoint, stream = await self._asend(
+                llm_model,
+                messages=request_messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_body=self.extra_body,
+                **self._tool_request_kwargs(tools)
+            )
+            stream_error = None
+            try:
+                async for chunk in stream:
+                    if self.cancelled:
+                        await stream.close()
+                        tool_calls = []
+                        logger.info("流式请求已被打断")
+                        break
+                    self._record_usage(getattr(chunk, "usage", None))
+                    if chunk.choices:
+                        self._merge_tool_call_deltas(tool_calls, chunk.choices[0].delta.tool_calls)
+                    if chunk.choices and chunk.choices[0].delta.content is not None and chunk.choices[0].delta.content != '':
+                        content = chunk.choices[0].delta.content
+                        if self.last_ttft is None:
+                            self.last_ttft = time.perf_counter() - start_time
+                            logger.info(f'首 token 延迟: {self.last_ttft*1000:.0f} ms')
+                        full_reply += content
+                        yield content
+            except Exception as e:
+                stream_error = e
+                raise
+            finally:
+                self._release(endpoint, self.last_ttft, stream_error)
+
+            dt = datetime.now()
+            logger.info(f'异步流式回复结束时间: {dt.strftime("%Y-%m-%d %H:%M:%S %f")}')
+            self._commit_stream_reply(full_reply, tool_calls)
+
+        except BadRequestError as e:
+            if not tools or not tools_unsupported_error(e):
+                yield f"[错误] 流式请求失败：{e}"
+                return
+            self.tools_rejected = True
         except Exception as e:
             error_message = f"[错误] 流式请求失败：{e}"
             yield error_message
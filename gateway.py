@@ -0,0 +1,338 @@
+"""
+WebSocket 网关：把 AgentFramework 作为服务运行，机器人端只负责采音与播放
+
+协议（文本帧为 JSON，二进制帧为音频）:
+  客户端 -> 网关
+    {"type": "hello", "session_id": "robot-1", "audio_out": true}   连接后第一条消息；session_id 不传时自动分配
+    {"type": "text", "text": "今天天气怎么样"}                        文本轮次
+    {"type": "audio_start"} + 二进制 PCM 帧（16kHz 16bit 单声道）+ {"type": "audio_end"}
+                                                                      语音轮次，网关转发给 [Gateway] asr_uri 的 FunASR 服务
+  网关 -> 客户端
+    {"type": "ready", "session_id": ...}
+    {"type": "asr", "text": ...}                                      语音轮次的识别结果
+    {"type": "decision", "use_tool": 1, "agent_id": 0, "bypass": false}
+    {"type": "text", "source": "dispatcher" | "worker", "text": ...}  送入 TTS 的文本（过渡语 / Worker 回复），在这段文本开始合成时发出
+    二进制帧                                                           TTS 音频（mp3）：一条 text 之后、下一条 text 之前的音频都属于这条 text
+    {"type": "done", "audio_sync_mode": 0, "elapsed_ms": ...}         本轮结束（音频已全部发出）
+    {"type": "error", "message": ...}
+
+播放音频的工具（音乐、故事、健康课程）只能在本机扬声器上播放，远程会话中不执行，由 LLM 告诉用户不支持
+
+背压：音频按块发送，未发出的音频块超过 max_pending_audio 时暂停合成，本轮在音频全部发出后才结束；
+客户端积压的轮次超过 max_pending_turns 时网关暂停读取该连接
+
+用法:
+    python gateway.py --config config.ini --host 0.0.0.0 --port 8765
+"""
+import argparse
+import asyncio
+import configparser
+import json
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import edge_tts
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from agent_framework import DEFAULT_SESSION, AgentFramework
+from logger import logger
+from utils.text_splitter import TextSplitter
+
+
+class _ClientSink:
+    """
+    一个网关连接的输出：作为会话的 tts_client（add_text / wait_until_done）与事件回调，
+    把事件与合成的音频按顺序放入发送队列；text 事件与文本一起排队，轮到这段文本合成时才发出，
+    保证客户端收到的每段音频都紧跟在它对应的 text 之后
+    add_text / wait_until_done / on_event 可以在任意线程调用
+    播放音乐、故事、课程的工具在网关主机的扬声器上播放，客户端听不到，local_audio = False 让框架拒绝这类工具
+    """
+    local_audio = False
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, voice: str, audio_out: bool = True, communicate_cls=None,
+                 max_pending_audio: int = 32):
+        self.loop = loop
+        self.voice = voice
+        self.audio_out = audio_out
+        self.communicate_cls = communicate_cls or edge_tts.Communicate
+        self.splitter = TextSplitter()
+        # 发送队列：dict 为 JSON 事件，bytes 为音频块
+        self.out: asyncio.Queue = asyncio.Queue()
+        # 待合成队列：(文本, Future) 或 (text 事件, None)
+        self._texts: asyncio.Queue = asyncio.Queue()
+        # 已合成未发出的音频块数上限
+        self._audio_slots = asyncio.Semaphore(max_pending_audio)
+
+    def post(self, message: Dict):
+        # 统一经 call_soon_threadsafe 入队，保证事件、文本、音频的先后顺序
+        self.loop.call_soon_threadsafe(self.out.put_nowait, message)
+
+    def on_event(self, event: str, data: Dict):
+        message = {"type": event, **data}
+        if event == "text":
+            # Session.speak 先发 text 事件再 add_text：事件排在这段文本前面，前面的文本合成完才发出
+            self.loop.call_soon_threadsafe(self._texts.put_nowait, (message, None))
+        else:
+            self.post(message)
+
+    def add_text(self, text: str) -> Future:
+        """返回的 Future 在这段文本合成完、音频全部放入发送队列时结果为 True，连接断开时为 False"""
+        future = Future()
+        self.loop.call_soon_threadsafe(self._texts.put_nowait, (text, future))
+        return future
+
+    def wait_for(self, utterance: Future, timeout: Optional[float] = None) -> bool:
+        return utterance.result(timeout)
+
+    async def await_for(self, utterance: Future) -> bool:
+        return await asyncio.wrap_future(utterance)
+
+    def wait_until_done(self):
+        """等待已送入的文本全部合成并放入发送队列（不能在事件循环线程中调用）"""
+        asyncio.run_coroutine_threadsafe(self._texts.join(), self.loop).result()
+
+    def close(self):
+        """连接断开：丢弃未合成的文本，让等待中的 wait_until_done / wait_for 返回（合成任务已取消）"""
+        while not self._texts.empty():
+            _, future = self._texts.get_nowait()
+            self._texts.task_done()
+            if future is not None and not future.done():
+                future.set_result(False)
+
+    def sent(self, message):
+        """发送队列中的消息已发出"""
+        if isinstance(message, bytes):
+            self._audio_slots.release()
+
+    async def synth_loop(self):
+        while True:
+            text, future = await self._texts.get()
+            if future is None:
+                self.out.put_nowait(text)
+                self._texts.task_done()
+                continue
+            try:
+                if self.audio_out:
+                    for segment in self.splitter.split_text(text):
+                        if segment.strip():
+                            await self._synthesize(segment)
+            except Exception as e:
+                logger.error(f"网关 TTS 合成异常: {e}")
+            finally:
+                self._texts.task_done()
+                if not future.done():
+                    future.set_result(True)
+
+    async def _synthesize(self, text: str):
+        communicate = self.communicate_cls(text, self.voice)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                await self._audio_slots.acquire()
+                self.out.put_nowait(chunk["data"])
+
+
+class _AsrRelay:
+    """把客户端的音频帧转发给 FunASR 2pass 服务，说完后取回最终识别结果（协议同 utils.asr.SpeechRecognizer）"""
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.websocket = None
+
+    async def start(self, wav_name: str):
+        self.websocket = await connect(self.uri, subprotocols=["binary"])
+        await self.websocket.send(json.dumps({
+            "mode": "2pass", "chunk_size": [5, 10, 5], "chunk_interval": 10, "encoder_chunk_look_back": 4,
+            "decoder_chunk_look_back": 0, "wav_name": wav_name, "is_speaking": True, "hotwords": "", "itn": True,
+        }))
+
+    async def send(self, frame: bytes):
+        await self.websocket.send(frame)
+
+    async def finish(self, timeout: float = 10.0) -> str:
+        try:
+            await self.websocket.send(json.dumps({"is_speaking": False}))
+            async with asyncio.timeout(timeout):
+                async for message in self.websocket:
+                    meg = json.loads(message)
+                    if "text" in meg and (meg.get("mode") in ["offline", "2pass-offline"] or meg.get("is_final")):
+                        return meg["text"]
+            return ""
+        finally:
+            await self.websocket.close()
+
+
+class _NullTTS:
+    """不播放的 tts_client：网关进程本身没有扬声器"""
+    local_audio = False
+
+    def add_text(self, text: str) -> Future:
+        future = Future()
+        future.set_result(True)
+        return future
+
+    def wait_for(self, utterance: Future, timeout: Optional[float] = None) -> bool:
+        return True
+
+    async def await_for(self, utterance: Future) -> bool:
+        return True
+
+    def wait_until_done(self):
+        pass
+
+
+class Gateway:
+    """
+    WebSocket 网关：每个连接对应 AgentFramework 的一个会话，所有连接共用一个事件循环与框架实例
+    :param communicate_cls: 语音合成类，接口同 edge_tts.Communicate，默认 edge_tts（测试时可换成本地替身）
+    """
+    def __init__(self, framework: AgentFramework, asr_uri: Optional[str] = None, voice: str = "zh-CN-XiaoxiaoNeural",
+                 communicate_cls=None, max_pending_audio: int = 32, max_pending_turns: int = 4):
+        self.framework = framework
+        self.asr_uri = asr_uri
+        self.voice = voice
+        self.communicate_cls = communicate_cls
+        self.max_pending_audio = max_pending_audio
+        self.max_pending_turns = max_pending_turns
+        self._active = set()
+
+    @classmethod
+    def from_config(cls, config_path: str, **kwargs) -> "Gateway":
+        cfg = configparser.ConfigParser()
+        cfg.read(config_path, encoding="utf-8")
+        options = {
+            "asr_uri": cfg.get("Gateway", "asr_uri", fallback=None) or None,
+            "voice": cfg.get("General", "tts_voice", fallback="zh-CN-XiaoxiaoNeural"),
+            "max_pending_audio": cfg.getint("Gateway", "max_pending_audio", fallback=32),
+            "max_pending_turns": cfg.getint("Gateway", "max_pending_turns", fallback=4),
+        }
+        options.update(kwargs)
+        # 网关自己合成并下发音频，框架默认会话不需要本地播放
+        framework = AgentFramework(config_path=config_path, tts_client=_NullTTS())
+        return cls(framework, **options)
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 8765):
+        try:
+            async with serve(self.handle, host, port) as server:
+                logger.info(f"网关已启动: ws://{host}:{port}")
+                await server.serve_forever()
+        finally:
+            self.framework.close()
+
+    async def handle(self, websocket):
+        try:
+            hello = json.loads(await asyncio.wait_for(websocket.recv(), timeout=10))
+        except (asyncio.TimeoutError, ValueError, ConnectionClosed):
+            return
+        session_id = str(hello.get("session_id") or uuid.uuid4().hex[:12])
+        if session_id in self._active or session_id == DEFAULT_SESSION:
+            await websocket.send(json.dumps({"type": "error", "message": f"会话 {session_id} 已有连接或为保留名称"}, ensure_ascii=False))
+            return
+        self._active.add(session_id)
+        sink = _ClientSink(asyncio.get_running_loop(), self.voice, bool(hello.get("audio_out", True)), self.communicate_cls,
+                           self.max_pending_audio)
+        session = self.framework.get_session(session_id)
+        session.tts_client = sink
+        session.listener = sink.on_event
+        turns = asyncio.Queue(maxsize=self.max_pending_turns)
+        tasks = [asyncio.create_task(self._send_loop(websocket, sink)),
+                 asyncio.create_task(sink.synth_loop()),
+                 asyncio.create_task(self._turn_loop(session_id, turns, sink))]
+        logger.info(f"网关连接: {session_id} {websocket.remote_address}")
+        await websocket.send(json.dumps({"type": "ready", "session_id": session_id}))
+        try:
+            await self._read_loop(websocket, session_id, turns, sink)
+        except ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            sink.close()
+            if session.tts_client is sink:
+                session.tts_client = None
+                session.listener = None
+            self._active.discard(session_id)
+            logger.info(f"网关断开: {session_id}")
+
+    async def _read_loop(self, websocket, session_id: str, turns: asyncio.Queue, sink: _ClientSink):
+        relay: Optional[_AsrRelay] = None
+        utterance = 0
+        async for message in websocket:
+            if isinstance(message, bytes):
+                if relay:
+                    await relay.send(message)
+                continue
+            try:
+                msg = json.loads(message)
+            except ValueError:
+                continue
+            kind = msg.get("type")
+            if kind == "text" and msg.get("text"):
+                # 队列满时不再读取该连接，由 TCP 把背压传回客户端
+                await turns.put(msg["text"])
+            elif kind == "audio_start":
+                if not self.asr_uri:
+                    sink.post({"type": "error", "message": "网关未配置 asr_uri，不支持语音轮次"})
+                    continue
+                utterance += 1
+                relay = _AsrRelay(self.asr_uri)
+                try:
+                    await relay.start(f"{session_id}-{utterance}")
+                except Exception as e:
+                    relay = None
+                    sink.post({"type": "error", "message": f"连接 ASR 失败: {e}"})
+            elif kind == "audio_end" and relay:
+                try:
+                    text = await relay.finish()
+                except Exception as e:
+                    text = ""
+                    logger.error(f"网关 ASR 识别失败: {e}")
+                relay = None
+                sink.post({"type": "asr", "text": text})
+                if text.strip():
+                    await turns.put(text)
+
+    async def _turn_loop(self, session_id: str, turns: asyncio.Queue, sink: _ClientSink):
+        while True:
+            text = await turns.get()
+            start = time.perf_counter()
+            audio_sync_mode = 0
+            try:
+                audio_sync_mode = await self.framework.aprocess_user_query(text, session_id=session_id)
+            except Exception as e:
+                logger.error(f"[{session_id}] 网关处理请求失败: {e}")
+                sink.post({"type": "error", "message": str(e)})
+            sink.post({"type": "done", "audio_sync_mode": audio_sync_mode,
+                       "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+    @staticmethod
+    async def _send_loop(websocket, sink: _ClientSink):
+        while True:
+            message = await sink.out.get()
+            # send 在客户端读得慢时等待缓冲区排空，背压经音频块上限传回合成
+            if isinstance(message, bytes):
+                await websocket.send(message)
+            else:
+                await websocket.send(json.dumps(message, ensure_ascii=False))
+            sink.sent(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgentFramework WebSocket 网关")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config, encoding="utf-8")
+    host = args.host or cfg.get("Gateway", "host", fallback="0.0.0.0")
+    port = args.port or cfg.getint("Gateway", "port", fallback=8765)
+    gateway = Gateway.from_config(args.config)
+    asyncio.run(gateway.serve(host, port))
+
+
+if __name__ == "__main__":
+    main()
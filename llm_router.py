@@ -0,0 +1,316 @@
+import configparser
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from logger import logger
+
+# 换端点重试的错误：连接失败/超时、服务端 5xx、429 排队已满
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError, RateLimitError, httpx.TransportError)
+# 延迟样本的种类：流式请求的首 token 延迟与非流式请求的总耗时不可比，分别统计、分别用于打分
+TTFT = "ttft"
+TOTAL = "total"
+
+
+class Endpoint:
+    """一个 OpenAI 兼容的推理端点（如一台 Ollama 主机）及其运行统计"""
+    def __init__(self, name: str, base_url: str, api_key: str = "ollama", models: Optional[List[str]] = None, implicit: bool = False):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        # None 表示服务所有模型
+        self.models = set(models) if models else None
+        # 隐式端点：未配置路由时由调用方的 base_url 自动生成，只作兜底，不剔除
+        self.implicit = implicit
+        # 每种延迟（TTFT / TOTAL）各自的 EWMA 与近期样本
+        self.ewma: Dict[str, float] = {}
+        self.inflight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.samples: Dict[str, deque] = {TTFT: deque(maxlen=200), TOTAL: deque(maxlen=200)}
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def score(self, kind: str = TTFT) -> float:
+        """路由打分：同种请求的近期延迟 × (1 + 排队请求数)，越小越优先；尚无样本时为 0，优先试探"""
+        return self.ewma.get(kind, 0.0) * (1 + self.inflight)
+
+    def stats(self) -> Dict:
+        def pct(kind, p):
+            samples = sorted(self.samples[kind])
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)] * 1000) if samples else None
+        def ewma_ms(kind):
+            return round(self.ewma[kind] * 1000) if kind in self.ewma else None
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "ewma_ttft_ms": ewma_ms(TTFT),
+            "ttft_p50_ms": pct(TTFT, 0.5),
+            "ttft_p95_ms": pct(TTFT, 0.95),
+            "ewma_total_ms": ewma_ms(TOTAL),
+            "total_p50_ms": pct(TOTAL, 0.5),
+        }
+
+    def __repr__(self):
+        return f"Endpoint({self.name}, {self.base_url})"
+
+
+class LLMRouter:
+    """
+    多端点 LLM 路由：
+    - 每个模型可由多个端点提供，请求发往 近期延迟 × (1 + 排队数) 最小的健康端点；
+      流式请求按 TTFT、非流式请求按总耗时打分，两种样本分开统计
+    - 连接失败 / 5xx / 429 时自动换下一个端点重试；连续失败 max_failures 次的端点被剔除 eject_seconds 秒
+    - 后台线程定期请求 /models 做健康检查，剔除到期且检查通过的端点重新加入
+    未配置任何端点时，请求直接发往调用方自己的 base_url（隐式端点），行为与单机一致
+    """
+    def __init__(self, ewma_alpha=0.3, max_failures=2, eject_seconds=30.0, health_interval=10.0, health_timeout=3.0):
+        self.ewma_alpha = ewma_alpha
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._endpoints: List[Endpoint] = []
+        self._implicit: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stop_event = threading.Event()
+
+    def add_endpoint(self, name: str, base_url: str, api_key: str = "ollama", models: Optional[List[str]] = None) -> Endpoint:
+        endpoint = Endpoint(name, base_url, api_key, models)
+        with self._lock:
+            self._endpoints.append(endpoint)
+        logger.info(f"LLM 路由添加端点: {name} {endpoint.base_url} 模型: {', '.join(sorted(endpoint.models)) if endpoint.models else '全部'}")
+        self._start_health_check()
+        return endpoint
+
+    def load_config(self, cfg: configparser.ConfigParser):
+        """
+        从配置文件加载端点：
+        [Endpoints] 每行一个端点，格式为 名称 = base_url | 模型1, 模型2（不写模型表示服务所有模型）
+        [Router] 路由参数 max_failures / eject_seconds / health_interval
+        """
+        if cfg.has_section("Router"):
+            self.max_failures = cfg.getint("Router", "max_failures", fallback=self.max_failures)
+            self.eject_seconds = cfg.getfloat("Router", "eject_seconds", fallback=self.eject_seconds)
+            self.health_interval = cfg.getfloat("Router", "health_interval", fallback=self.health_interval)
+        if not cfg.has_section("Endpoints"):
+            return
+        with self._lock:
+            self._endpoints = []
+        for name, value in cfg.items("Endpoints", raw=True):
+            if name in cfg.defaults():
+                continue
+            url, _, models = value.partition("|")
+            self.add_endpoint(name, url.strip(), models=[m.strip() for m in models.split(",") if m.strip()] or None)
+
+    def client_retries(self, model: str) -> int:
+        """客户端自身的重试次数：有多个端点可切换时不在同一端点上重试，直接交给路由换端点"""
+        with self._lock:
+            count = sum(1 for ep in self._endpoints if ep.serves(model))
+        return 0 if count > 1 else 2
+
+    def endpoints(self) -> List[Endpoint]:
+        with self._lock:
+            return list(self._endpoints) + list(self._implicit.values())
+
+    def base_urls(self, model: str, default_base_url: Optional[str] = None) -> List[str]:
+        """可能服务该模型的端点地址：配置了端点时为这些端点，否则为调用方自己的 base_url"""
+        with self._lock:
+            urls = [ep.base_url for ep in self._endpoints if ep.serves(model)]
+        if not urls and default_base_url is not None:
+            urls = [default_base_url.rstrip("/")]
+        return urls
+
+    def acquire(self, model: str, default_base_url: Optional[str] = None, default_api_key: str = "ollama", exclude=(),
+                kind: str = TTFT) -> Optional[Endpoint]:
+        """
+        为一次请求选择端点并计入排队数；exclude 为本次请求已失败的端点，kind 为打分使用的延迟种类
+        :return: 选中的端点；没有可用端点时返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self._endpoints if ep.serves(model)]
+            if not candidates:
+                if default_base_url is None:
+                    return None
+                key = default_base_url.rstrip("/")
+                endpoint = self._implicit.get(key)
+                if endpoint is None:
+                    endpoint = Endpoint(key, key, default_api_key, implicit=True)
+                    self._implicit[key] = endpoint
+                candidates = [endpoint]
+            candidates = [ep for ep in candidates if ep not in exclude]
+            if not candidates:
+                return None
+            healthy = [ep for ep in candidates if ep.healthy or ep.ejected_until <= now]
+            # 全部被剔除时退而求其次，选最早到期的端点，而不是直接失败
+            pool = healthy or sorted(candidates, key=lambda ep: ep.ejected_until)[:1]
+            endpoint = min(pool, key=lambda ep: (ep.score(kind), ep.inflight))
+            endpoint.inflight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Optional[Endpoint], latency: Optional[float] = None, error: Optional[BaseException] = None,
+                kind: str = TTFT):
+        """
+        请求结束：更新排队数与延迟统计
+        latency: 延迟样本（秒），None 表示没有样本；kind 为样本种类（TTFT：流式首 token 延迟，TOTAL：非流式总耗时）
+        error: 可重试类错误计入失败次数，连续失败达到阈值后剔除端点
+        """
+        if endpoint is None:
+            return
+        with self._lock:
+            endpoint.inflight = max(endpoint.inflight - 1, 0)
+            if error is not None:
+                self._record_failure(endpoint, error)
+                return
+            endpoint.consecutive_failures = 0
+            if latency is not None:
+                endpoint.samples[kind].append(latency)
+                if kind not in endpoint.ewma:
+                    endpoint.ewma[kind] = latency
+                else:
+                    endpoint.ewma[kind] += self.ewma_alpha * (latency - endpoint.ewma[kind])
+
+    def _record_failure(self, endpoint: Endpoint, error):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.implicit or endpoint.consecutive_failures < self.max_failures:
+            return
+        if endpoint.healthy:
+            endpoint.ejections += 1
+            logger.warning(f"LLM 端点 {endpoint.name} 连续失败 {endpoint.consecutive_failures} 次，剔除 {self.eject_seconds:.0f}s: {error}")
+        endpoint.healthy = False
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def _next(self, model, tried, default_base_url, default_api_key, error, kind):
+        endpoint = self.acquire(model, default_base_url, default_api_key, exclude=tried, kind=kind)
+        if endpoint is None and error is not None:
+            raise error
+        return endpoint
+
+    def request(self, model: str, send: Callable[[Endpoint], object], default_base_url: Optional[str] = None, default_api_key: str = "ollama", release: bool = True,
+                kind: str = TOTAL, exclude=()):
+        """
+        按路由发送一次请求，可重试的错误换下一个端点，直到所有候选端点都试过
+        send(endpoint) 实际发起请求并返回结果
+        release=True 时以总耗时作为 TOTAL 样本自动结束请求；否则调用方读完响应后自行调用 release，
+        kind 为选择端点时打分使用的延迟种类（流式请求传 TTFT），exclude 为本次请求不考虑的端点
+        :return: (endpoint, send 的返回值)
+        """
+        tried = list(exclude)
+        error = None
+        while True:
+            endpoint = self._next(model, tried, default_base_url, default_api_key, error, kind)
+            if endpoint is None:
+                raise RuntimeError(f"模型 {model} 没有可用的 LLM 端点")
+            start = time.perf_counter()
+            try:
+                result = send(endpoint)
+            except RETRYABLE_ERRORS as e:
+                self.release(endpoint, error=e)
+                logger.warning(f"LLM 端点 {endpoint.name} 请求失败，尝试下一个端点: {e}")
+                tried.append(endpoint)
+                error = e
+                continue
+            except BaseException:
+                self.release(endpoint)
+                raise
+            if release:
+                self.release(endpoint, time.perf_counter() - start, kind=TOTAL)
+            return endpoint, result
+
+    async def arequest(self, model: str, send, default_base_url: Optional[str] = None, default_api_key: str = "ollama", release: bool = True,
+                       kind: str = TOTAL, exclude=()):
+        """request 的异步版本，send(endpoint) 返回 awaitable"""
+        tried = list(exclude)
+        error = None
+        while True:
+            endpoint = self._next(model, tried, default_base_url, default_api_key, error, kind)
+            if endpoint is None:
+                raise RuntimeError(f"模型 {model} 没有可用的 LLM 端点")
+            start = time.perf_counter()
+            try:
+                result = await send(endpoint)
+            except RETRYABLE_ERRORS as e:
+                self.release(endpoint, error=e)
+                logger.warning(f"LLM 端点 {endpoint.name} 请求失败，尝试下一个端点: {e}")
+                tried.append(endpoint)
+                error = e
+                continue
+            except BaseException:
+                self.release(endpoint)
+                raise
+            if release:
+                self.release(endpoint, time.perf_counter() - start, kind=TOTAL)
+            return endpoint, result
+
+    def _start_health_check(self):
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True, name="llm-router-health")
+        self._health_thread.start()
+
+    def _probe(self, endpoint: Endpoint) -> bool:
+        try:
+            response = httpx.get(f"{endpoint.base_url}/models", timeout=self.health_timeout,
+                                 headers={"Authorization": f"Bearer {endpoint.api_key}"})
+            return response.status_code < 500
+        except httpx.HTTPError:
+            return False
+
+    def check_health(self):
+        """检查一轮所有配置的端点：失败计入连续失败次数，已剔除且到期的端点检查通过后重新加入"""
+        now = time.monotonic()
+        with self._lock:
+            endpoints = list(self._endpoints)
+        for endpoint in endpoints:
+            if not endpoint.healthy and endpoint.ejected_until > now:
+                continue
+            ok = self._probe(endpoint)
+            with self._lock:
+                if ok:
+                    endpoint.consecutive_failures = 0
+                    if not endpoint.healthy:
+                        endpoint.healthy = True
+                        logger.info(f"LLM 端点 {endpoint.name} 健康检查通过，重新加入路由")
+                else:
+                    self._record_failure(endpoint, "健康检查失败")
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"LLM 端点健康检查异常: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self) -> List[Dict]:
+        """各端点的请求数、失败数、剔除次数与 TTFT / 总耗时统计"""
+        with self._lock:
+            return [ep.stats() for ep in list(self._endpoints) + list(self._implicit.values())]
+
+    def log_stats(self):
+        for item in self.stats():
+            logger.info(f"LLM 端点统计: {item}")
+
+
+# 全局路由实例：brain.LLM_Ollama 与视觉工具共用
+router = LLMRouter()
@@ -1,3 +1,6 @@
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from agent_framework import AgentFramework
 # import json
 from logger import logger
@@ -19,6 +22,62 @@ try:
 except Exception:
     pass
 audio_sync_mode = 0
+
+
+def _music_playing():
+    # 只在播放过音乐（已导入音频模块）时检查
+    audio = sys.modules.get("utils.audio")
+    return audio is not None and audio.audio_player.is_playing
+
+
+def run_with_barge_in():
+    """
+    用户打断（barge-in）：每轮在后台线程处理，主线程继续监听麦克风；
+    播报或播放音乐期间检测到用户开始说话时立即打断，识别结果作为新的一轮
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turn")
+    turn = None
+
+    def busy():
+        return (turn is not None and not turn.done()) or agent.tts_client.speaking or _music_playing()
+
+    def on_speech_start():
+        if busy():
+            agent.interrupt()
+
+    audio_input.on_speech_start = on_speech_start
+    audio_input.playback_active = lambda: agent.tts_client.speaking or _music_playing()
+    audio_input.barge_in_ratio = agent.barge_in["threshold_ratio"]
+    audio_input.min_speech_ms = agent.barge_in["min_speech_ms"]
+    while True:
+        logger.info("\n--- 等待指令 ---")
+        # 每次监听使用独立的上下文，识别出的 trace 轮次随请求交给处理线程，不会被下一次监听丢弃
+        ctx = contextvars.copy_context()
+        user_query = ctx.run(audio_input.start)
+        if not user_query or user_query.strip() == "":
+            if turn is None or turn.done():
+                agent.tts_client.add_text("我没有听清楚，麻烦您再说一次")
+            logger.warning("未检测到语音或识别失败，请重试。")
+            continue
+        logger.info(f"识别到的内容: {user_query}")
+        if turn is not None and not turn.done():
+            # 说话开始时已经打断，这里等上一轮收尾（通常只需几十毫秒）
+            agent.interrupt()
+            turn.exception()
+        turn = executor.submit(ctx.run, agent.process_user_query, user_query)
+        turn.add_done_callback(_log_turn)
+
+
+def _log_turn(turn):
+    try:
+        logger.info(f"audio_sync_mode: {turn.result()}")
+    except Exception as e:
+        logger.error(f"处理出错: {e}")
+
+
+if agent.barge_in:
+    run_with_barge_in()
+
 while True:
     logger.info("\n--- 等待指令 ---")
     user_query = audio_input.start()
@@ -170,11 +170,272 @@
 # if __name__ != '__main__':
 #     current_dir = os.path.dirname(__file__)
 #     _tool_registry.load_tools_from_directory(current_dir)
+import asyncio
+import contextvars
+import importlib
 import inspect
 import json
 import os
 import sys
-from typing import Callable, Dict, List, Any, Optional
+import threading
+import time
+import types
+import typing
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
+from logger import logger
+from utils.context_window import estimate_tokens
+from utils.tool_manifest import eval_annotation, load_manifest
+
+# @tool 未指定 timeout 时的默认超时（秒）
+DEFAULT_TOOL_TIMEOUT = 20.0
+
+
+class ToolTimeoutError(TimeoutError):
+    """工具调用超过自身超时或本轮截止时间，已通知工具取消"""
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"工具 {name} 超过 {timeout:.1f} 秒未返回，已取消")
+        self.name = name
+        self.timeout = timeout
+
+    def to_result(self) -> Dict[str, Any]:
+        """结构化的超时结果，交给 LLM 向用户说明"""
+        return {"status": "timeout", "tool": self.name, "timeout_s": round(self.timeout, 1),
+                "message": f"{self.name} 在 {round(self.timeout, 1):g} 秒内没有完成，已取消"}
+
+
+class ToolCancelledError(Exception):
+    """工具调用被调用方取消（如用户打断），等待方不再等待工具返回"""
+    def __init__(self, name: str):
+        super().__init__(f"工具 {name} 已被取消")
+        self.name = name
+
+    def to_result(self) -> Dict[str, Any]:
+        return {"status": "cancelled", "tool": self.name, "message": f"{self.name} 已被用户打断取消"}
+
+
+class _ToolCall:
+    """
+    一次工具调用的时限与取消事件，通过 contextvar 提供给工具函数
+    工具函数在调用方的线程（Worker 的工具线程池）中执行，等待方用 wait / await_done 等它结束；
+    超过时限时设置取消事件并抛出 ToolTimeoutError，被 cancel 时抛出 ToolCancelledError，都不再等待（工具线程随后自行结束）
+    timeout: 工具自身的超时，从开始执行（start）时计时；deadline: 本批工具的截止时间（time.monotonic() 时间戳），开始执行前也生效
+    scope: 调用方的标识（如会话的打断事件），cancel_tool_calls(scope) 按它取消仍在执行的调用
+    """
+    def __init__(self, name: str, timeout: Optional[float] = None, deadline: Optional[float] = None, scope: Any = None):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.scope = scope
+        self.cancel_event = threading.Event()
+        self.created = time.monotonic()
+        self.started: Optional[float] = None
+        self.finished = False
+        self.cancelled = False
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def end(self) -> Optional[float]:
+        """当前的截止时间：开始执行后为 min(开始时间 + timeout, deadline)，开始之前为 deadline"""
+        end = self.started + self.timeout if self.started is not None and self.timeout is not None else None
+        if self.deadline is not None:
+            end = self.deadline if end is None else min(end, self.deadline)
+        return end
+
+    @property
+    def elapsed(self) -> float:
+        """开始执行以来（尚未开始时为创建以来）的秒数"""
+        return time.monotonic() - (self.started if self.started is not None else self.created)
+
+    def start(self) -> bool:
+        """工具开始执行；已取消或已过截止时间时返回 False，工具不再执行"""
+        with self._cond:
+            if self.cancel_event.is_set() or (self.deadline is not None and self.deadline <= time.monotonic()):
+                self.cancel_event.set()
+                return False
+            self.started = time.monotonic()
+        self._notify()
+        return True
+
+    def cancel(self):
+        """取消调用：工具通过 tool_cancelled() 感知，等待方立即返回"""
+        with self._cond:
+            self.cancelled = True
+            self.cancel_event.set()
+        self._notify()
+
+    def finish(self):
+        """工具函数（或代替它的处理）已经返回，可以重复调用"""
+        with self._cond:
+            if self.finished:
+                return
+            self.finished = True
+        with _inflight_lock:
+            _inflight_calls.discard(self)
+        self._notify()
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def _poll(self) -> Tuple[bool, Optional[float]]:
+        """返回 (是否已结束, 最多还要等待的秒数)；已取消时抛出 ToolCancelledError，超过时限时设置取消事件并抛出 ToolTimeoutError"""
+        if self.finished:
+            return True, None
+        if self.cancelled:
+            raise ToolCancelledError(self.name)
+        end = self.end
+        if end is None:
+            return False, None
+        left = end - time.monotonic()
+        if left <= 0:
+            self.cancel_event.set()
+            raise ToolTimeoutError(self.name, self.elapsed)
+        return False, left
+
+    def wait(self):
+        """阻塞等待工具结束"""
+        with self._cond:
+            while True:
+                done, timeout = self._poll()
+                if done:
+                    return
+                self._cond.wait(timeout)
+
+    async def await_done(self):
+        """wait 的异步版本，等待期间不占用线程"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        listener = lambda: loop.call_soon_threadsafe(changed.set)
+        with self._cond:
+            self._listeners.append(listener)
+        try:
+            while True:
+                with self._cond:
+                    done, timeout = self._poll()
+                if done:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+        finally:
+            with self._cond:
+                self._listeners.remove(listener)
+
+
+_current_call: contextvars.ContextVar = contextvars.ContextVar("tool_call", default=None)
+# 工具函数尚未返回的调用（超时后仍在后台执行的也在内），供 cancel_tool_calls 使用
+_inflight_calls = set()
+_inflight_lock = threading.Lock()
+
+
+def cancel_tool_calls(scope: Any) -> int:
+    """
+    取消 scope 下尚未结束的工具调用（如用户打断时）：等待这些调用的一方立即返回，工具通过 tool_cancelled() 感知
+    :return: 被取消的调用数
+    """
+    with _inflight_lock:
+        calls = [call for call in _inflight_calls if call.scope is scope]
+    for call in calls:
+        call.cancel()
+    return len(calls)
+
+
+def tool_cancelled() -> bool:
+    """
+    供工具函数轮询：本次调用已超时或被打断取消时返回 True，工具应尽快结束（如终止子进程、停止重试），
+    有副作用的工具（播放、朗读）在开始前检查
+    """
+    call = _current_call.get()
+    return call is not None and call.cancel_event.is_set()
+
+
+def tool_time_left(default: Optional[float] = None) -> Optional[float]:
+    """
+    本次调用剩余的可用时间（秒），可直接作为 requests / subprocess 的 timeout
+    :param default: 工具原本使用的超时，返回值不超过它；不在受限的工具调用中时原样返回
+    """
+    call = _current_call.get()
+    end = call.end if call is not None else None
+    if end is None:
+        return default
+    left = max(end - time.monotonic(), 0.01)
+    return min(left, default) if default is not None else left
+
+# Python 类型注解 -> JSON Schema 类型
+_JSON_SCHEMA_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    tuple: "array",
+    dict: "object",
+}
+
+def _annotation_to_schema(annotation) -> Dict[str, Any]:
+    """把参数的类型注解转换为 JSON Schema；未注解的参数按字符串处理，无法识别的类型不限定类型"""
+    if annotation is inspect.Parameter.empty:
+        return {"type": "string"}
+    origin = typing.get_origin(annotation)
+    if origin is Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        types = {_JSON_SCHEMA_TYPES.get(typing.get_origin(a) or a) for a in args}
+        if types and types <= {"integer", "number"}:
+            return {"type": "number" if "number" in types else "integer"}
+        if len(args) == 1:
+            return _annotation_to_schema(args[0])
+        return {}
+    json_type = _JSON_SCHEMA_TYPES.get(origin or annotation)
+    return {"type": json_type} if json_type else {}
+
+def _docstring_arg_descriptions(doc: Optional[str]) -> Dict[str, str]:
+    """从 Google 风格 docstring 的 Args 段落中提取参数说明"""
+    descriptions = {}
+    in_args = False
+    for line in (doc or "").splitlines():
+        stripped = line.strip()
+        if stripped in ("Args:", "参数:", "参数："):
+            in_args = True
+            continue
+        if in_args:
+            if not stripped or stripped.endswith(":"):
+                if descriptions:
+                    break
+                continue
+            name, sep, desc = stripped.partition(":")
+            if sep and name.strip().isidentifier():
+                descriptions[name.strip()] = desc.strip()
+    return descriptions
+
+def _short_type_name(annotation) -> str:
+    """参数注解的简短写法：str、int|float、list[str]，不带 <class ...> 与 typing. 前缀"""
+    if annotation is type(None):
+        return "None"
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is Union or origin is types.UnionType:
+        return "|".join(_short_type_name(a) for a in args)
+    if origin is typing.Literal:
+        return "|".join(repr(a) for a in args)
+    if origin is not None:
+        name = getattr(origin, "__name__", None) or str(origin).replace("typing.", "")
+        return f"{name}[{', '.join(_short_type_name(a) for a in args)}]" if args else name
+    if isinstance(annotation, type):
+        return annotation.__name__
+    return str(annotation).replace("typing.", "")
+
+def _prompt_description(description: str) -> str:
+    """工具说明去掉缩进与空行，并去掉最后一行“回复要求”（回复要求随工具结果另行附带）"""
+    lines = [line.strip() for line in description.strip().split("\n") if line.strip()]
+    if len(lines) > 1 and lines[-1].startswith("回复要求"):
+        lines = lines[:-1]
+    return "\n".join(lines)
 
 class ToolRegistry:
     """
@@ -183,15 +444,49 @@ class ToolRegistry:
     def __init__(self):
         self._tools: Dict[str, Dict[str, Any]] = {}
         self._tools_simple: Dict[str, Dict[str, Any]] = {}
+        self._tool_schemas: Dict[str, Dict[str, Any]] = {}
+        # 紧凑工具说明：每个工具一段，以及按模块筛选拼好的整段（工具有变动时失效）
+        self._tool_prompts: Dict[str, str] = {}
+        self._rendered_prompts: Dict[tuple, str] = {}
         self._tool_modules: Dict[str, str] = {}  # 记录工具所属模块
+        self._import_lock = threading.Lock()
+        # 按需加载的模块：模块名 -> 首次调用时导入的耗时（秒），尚未导入时为 None
+        self.lazy_modules: Dict[str, Optional[float]] = {}
         self.system_tts = None
 
-    def register(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None, audioSyncMode: Optional[int] = None):
+    def register(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None, audioSyncMode: Optional[int] = None,
+                 timeout: Optional[float] = None, models: Optional[List[str]] = None):
         """
         注册一个工具函数
+        timeout: 单次调用的超时（秒），None 使用 DEFAULT_TOOL_TIMEOUT，0 表示不限制
+        models: 工具内部调用的模型（如视觉工具的 VLM），由 utils.warmup 一并预热
         """
-        tool_name = name or func.__name__
-        sig = inspect.signature(func)
+        self._add(name or func.__name__, func, func.__module__, inspect.signature(func), func.__doc__,
+                  description, audioSyncMode, timeout, models)
+        return func
+
+    def register_manifest(self, module_name: str, entry: Dict[str, Any]):
+        """
+        按工具清单（utils.tool_manifest）登记模块中的工具，不导入模块；函数在第一次调用时导入模块后取得
+        已经真正注册过的同名工具不受影响
+        """
+        for item in entry["tools"]:
+            tool_name = item["name"] or item["function"]
+            if tool_name in self._tools:
+                continue
+            parameters = [
+                inspect.Parameter(p["name"], getattr(inspect.Parameter, p["kind"]),
+                                  default=p["default"] if p["has_default"] else inspect.Parameter.empty,
+                                  annotation=eval_annotation(p["annotation"]) if p["annotation"] else inspect.Parameter.empty)
+                for p in item["parameters"]
+            ]
+            return_annotation = eval_annotation(item["return_annotation"]) if item["return_annotation"] else inspect.Signature.empty
+            self._add(tool_name, None, module_name, inspect.Signature(parameters, return_annotation=return_annotation), item["doc"],
+                      item["description"], item["audioSyncMode"], item["timeout"], item["models"])
+        self.lazy_modules.setdefault(module_name, None)
+
+    def _add(self, tool_name: str, func: Optional[Callable], module_name: str, sig: inspect.Signature, doc: Optional[str],
+             description: Optional[str], audioSyncMode: Optional[int], timeout: Optional[float], models: Optional[List[str]]):
         params = []
         
         for param_name, param in sig.parameters.items():
@@ -203,29 +498,65 @@ class ToolRegistry:
             params.append(param_info)
 
         return_type = str(sig.return_annotation) if sig.return_annotation != inspect.Signature.empty else "Any"
-        
-        # 获取函数所属的模块名称
-        module_name = func.__module__
 
         tool_info = {
             "name": tool_name,
-            "description": description or func.__doc__ or "No description provided",
+            "description": description or doc or "No description provided",
             "parameters": params,
             "return_type": return_type,
             "function": func,
             "module": module_name,
             "audioSyncMode": audioSyncMode if audioSyncMode is not None else 0,
+            "timeout": DEFAULT_TOOL_TIMEOUT if timeout is None else timeout,
+            "models": list(models or []),
+            "signature": sig,
+            "doc": doc,
         }
         tool_simple_info = {
             "name": tool_name,
-            "description": description.split("\n")[0] or func.__doc__ or "No description provided",
+            "description": description.split("\n")[0] or doc or "No description provided",
         }
         
         self._tools[tool_name] = tool_info
         self._tools_simple[tool_name] = tool_simple_info
         self._tool_modules[tool_name] = module_name
-        
+        self._tool_schemas.pop(tool_name, None)
+        self._tool_prompts.pop(tool_name, None)
+        self._rendered_prompts.clear()
+
+    def resolve(self, name: str) -> Callable:
+        """
+        取得工具函数：按清单登记、尚未导入的模块在这里导入（模块中的 @tool 会用真实函数重新注册）
+        导入失败时抛出 RuntimeError，由调用方作为工具错误处理
+        """
+        tool = self.get_tool(name)
+        if not tool:
+            raise ValueError(f"Tool '{name}' not found")
+        if tool["function"] is not None:
+            return tool["function"]
+        module_name = tool["module"]
+        with self._import_lock:
+            if self._tools[name]["function"] is None:
+                start = time.perf_counter()
+                try:
+                    importlib.import_module(module_name)
+                except Exception as e:
+                    raise RuntimeError(f"加载工具模块 {module_name} 失败: {e}") from e
+                self.lazy_modules[module_name] = time.perf_counter() - start
+                logger.info(f"已按需加载工具模块: {module_name}（{self.lazy_modules[module_name] * 1000:.0f} ms）")
+        func = self._tools[name]["function"]
+        if func is None:
+            raise RuntimeError(f"工具模块 {module_name} 中没有注册工具 {name}")
         return func
+
+    def preload(self, module_names: Optional[List[str]] = None):
+        """立即导入按需加载的工具模块（不传时导入全部），失败的模块记录原因后跳过"""
+        for tool in self.list_tools(module_names=module_names):
+            if tool["function"] is None:
+                try:
+                    self.resolve(tool["name"])
+                except Exception as e:
+                    logger.error(e)
     
     def get_system_tts(self):
         return self.system_tts
@@ -292,14 +623,139 @@ class ToolRegistry:
                 
         return filtered_tools
 
-    def call_tool(self, name: str, *args, **kwargs) -> Any:
+    def build_tool_schema(self, name: str) -> Optional[Dict[str, Any]]:
         """
-        调用指定名称的工具函数
+        根据注册时收集的函数签名生成 OpenAI 风格的 function calling 描述（结果缓存）
+        描述取工具说明中除最后一行“回复要求”以外的部分，回复要求在工具结果中另行附带
         """
+        schema = self._tool_schemas.get(name)
+        if schema is not None:
+            return schema
         tool = self.get_tool(name)
         if not tool:
-            raise ValueError(f"Tool '{name}' not found")
-        return tool["function"](*args, **kwargs)
+            return None
+        arg_docs = _docstring_arg_descriptions(tool["doc"])
+        properties = {}
+        required = []
+        for param_name, param in tool["signature"].parameters.items():
+            if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+                continue
+            prop = _annotation_to_schema(param.annotation)
+            if param_name in arg_docs:
+                prop["description"] = arg_docs[param_name]
+            properties[param_name] = prop
+            if param.default is inspect.Parameter.empty:
+                required.append(param_name)
+        schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": _prompt_description(tool["description"]),
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+        self._tool_schemas[name] = schema
+        return schema
+
+    def list_tool_schemas(self, module_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        列出工具的 function calling 描述，可直接作为 chat.completions 的 tools 参数
+        :param module_names: 可选，指定文件名/模块名列表进行筛选
+        """
+        return [self.build_tool_schema(tool["name"]) for tool in self.list_tools(module_names=module_names)]
+
+    def build_tool_prompt(self, name: str) -> Optional[str]:
+        """
+        一个工具在文本协议提示词中的紧凑说明（结果缓存），形如：
+        - get_weather(location=None): 获取指定地点的天气信息...
+        参数使用简短类型名，说明按行去掉缩进，回复要求不写入提示词；不含返回类型与模块名
+        """
+        prompt = self._tool_prompts.get(name)
+        if prompt is not None:
+            return prompt
+        tool = self.get_tool(name)
+        if not tool:
+            return None
+        params = []
+        for param_name, param in tool["signature"].parameters.items():
+            if param.kind is inspect.Parameter.VAR_POSITIONAL:
+                param_name = f"*{param_name}"
+            elif param.kind is inspect.Parameter.VAR_KEYWORD:
+                param_name = f"**{param_name}"
+            text = param_name
+            if param.annotation is not inspect.Parameter.empty:
+                text += f": {_short_type_name(param.annotation)}"
+            if param.default is not inspect.Parameter.empty:
+                text += f" = {param.default!r}" if param.annotation is not inspect.Parameter.empty else f"={param.default!r}"
+            params.append(text)
+        description = _prompt_description(tool["description"]).replace("\n", "\n  ")
+        prompt = f"- {name}({', '.join(params)}): {description}"
+        self._tool_prompts[name] = prompt
+        return prompt
+
+    def render_tools_prompt(self, module_names: Optional[List[str]] = None) -> str:
+        """
+        文本协议下写入系统提示词的工具说明，每个工具一段（见 build_tool_prompt）；
+        同一组模块的结果缓存，多个 Agent / 会话共用
+        """
+        key = tuple(module_names) if module_names else ()
+        rendered = self._rendered_prompts.get(key)
+        if rendered is None:
+            rendered = "\n".join(self.build_tool_prompt(tool["name"]) for tool in self.list_tools(module_names=module_names))
+            self._rendered_prompts[key] = rendered
+        return rendered
+
+    def prompt_cost(self, module_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        每个工具的说明在每次请求中占用的 prompt token 数（估算，见 utils.context_window.estimate_tokens）：
+        text 为紧凑说明，native 为 function calling 描述的 JSON，service 为 expose_as_service 的原始写法
+        """
+        service = {tool["name"]: tool for tool in self.expose_as_service(module_names=module_names)["tools"]}
+        return [{
+            "name": tool["name"],
+            "module": tool["module"],
+            "text": estimate_tokens(self.build_tool_prompt(tool["name"])),
+            "native": estimate_tokens(json.dumps(self.build_tool_schema(tool["name"]), ensure_ascii=False)),
+            "service": estimate_tokens(str(service[tool["name"]])),
+        } for tool in self.list_tools(module_names=module_names)]
+
+    def prepare_call(self, name: str, deadline: Optional[float] = None, scope: Any = None) -> _ToolCall:
+        """
+        创建一次工具调用（尚未执行）：时限为 min(工具 timeout, deadline)，创建后即可被 cancel_tool_calls 取消
+        :param deadline: 本批截止时间（time.monotonic() 时间戳），None 表示只受工具自身 timeout 限制
+        :param scope: 调用方标识，cancel_tool_calls(scope) 可取消本次调用
+        """
+        tool = self.get_tool(name)
+        call = _ToolCall(name, (tool.get("timeout") or None) if tool else None, deadline, scope)
+        with _inflight_lock:
+            _inflight_calls.add(call)
+        return call
+
+    def call_tool(self, name: str, *args, tool_call: Optional[_ToolCall] = None, deadline: Optional[float] = None, scope: Any = None, **kwargs) -> Any:
+        """
+        调用指定名称的工具函数，在当前线程中执行
+        时限由等待方执行：在线程池中调用本函数，另一端用 tool_call.wait() / await_done() 等待，超时后不再等待并通知工具取消
+        :param tool_call: prepare_call 创建的调用；不传时按 deadline / scope 新建，工具可以查询时限，但本函数不强制超时
+        已取消的调用不再执行，抛出 ToolCancelledError；已过截止时间的抛出 ToolTimeoutError
+        """
+        call = tool_call or self.prepare_call(name, deadline, scope)
+        try:
+            tool = self.get_tool(name)
+            if not tool:
+                raise ValueError(f"Tool '{name}' not found")
+            # 按需加载的模块在开始计时之前导入，导入耗时不占用工具自身的 timeout
+            func = self.resolve(name)
+            if not call.start():
+                if call.cancelled:
+                    raise ToolCancelledError(name)
+                raise ToolTimeoutError(name, call.elapsed)
+            token = _current_call.set(call)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_call.reset(token)
+        finally:
+            call.finish()
 
     def expose_as_service(self, module_names: Optional[List[str]] = None) -> Dict[str, Any]:
         """
@@ -323,33 +779,47 @@ class ToolRegistry:
         }
         return service_info
     
-    def load_tools_from_directory(self, directory: str):
+    def load_tools_from_directory(self, directory: str, lazy: bool = True):
         """
         从指定目录加载所有工具模块
+        lazy=True 时按工具清单（tools/tool_manifest.json，源码变化时自动更新）登记工具，模块在第一次调用时才导入；
+        清单无法静态解析的模块照常立即导入
         """
         if directory not in sys.path:
             sys.path.insert(0, directory)
-        
+
+        manifest = load_manifest(directory) if lazy else {}
+        lazy_names = []
         for filename in os.listdir(directory):
             if filename.endswith('.py') and filename != '__init__.py':
                 module_name = filename[:-3]
+                entry = manifest.get(module_name)
+                if entry is not None and not entry["eager"]:
+                    self.register_manifest(module_name, entry)
+                    lazy_names.append(module_name)
+                    continue
                 try:
                     module = __import__(module_name)
                     print(f"已加载工具模块: {module_name}") # Optional: 保持静默或打印
                 except Exception as e:
                     print(f"加载工具模块 {module_name} 失败: {e}")
+        if lazy_names:
+            logger.info(f"已登记工具模块（首次调用时加载）: {', '.join(sorted(lazy_names))}")
 
 
 # 全局工具注册实例
 _tool_registry = ToolRegistry()
 
 
-def tool(name: Optional[str] = None, description: Optional[str] = None, audioSyncMode: Optional[int] = None):
+def tool(name: Optional[str] = None, description: Optional[str] = None, audioSyncMode: Optional[int] = None, timeout: Optional[float] = None,
+         models: Optional[List[str]] = None):
     """
     工具装饰器
+    timeout: 单次调用的超时（秒），None 使用 DEFAULT_TOOL_TIMEOUT，0 表示不限制
+    models: 工具内部调用的模型名列表，启动时与各 Agent 的模型一起预热
     """
     def decorator(func: Callable) -> Callable:
-        _tool_registry.register(func, name=name, description=description, audioSyncMode=audioSyncMode)
+        _tool_registry.register(func, name=name, description=description, audioSyncMode=audioSyncMode, timeout=timeout, models=models)
         return func
     return decorator
 
@@ -375,8 +845,52 @@ def list_all_tools_simple(module_names: Optional[List[str]] = None) -> List[Dict
     """
     return _tool_registry.list_tools_simple(module_names=module_names)
 
-def call_tool_by_name(name: str, *args, **kwargs) -> Any:
-    return _tool_registry.call_tool(name, *args, **kwargs)
+def list_tool_schemas(module_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    列出工具的 function calling 描述（OpenAI tools 格式）
+    :param module_names: 列表，包含想要筛选的模块名或文件名
+    """
+    return _tool_registry.list_tool_schemas(module_names=module_names)
+
+def list_tool_models(module_names: Optional[List[str]] = None) -> List[str]:
+    """
+    列出工具声明的模型（@tool(models=...)），去重并保持顺序
+    :param module_names: 列表，包含想要筛选的模块名或文件名
+    """
+    models = []
+    for info in _tool_registry.list_tools(module_names=module_names):
+        for model in info.get("models", []):
+            if model not in models:
+                models.append(model)
+    return models
+
+def preload_tools(module_names: Optional[List[str]] = None):
+    """
+    立即导入按需加载的工具模块
+    :param module_names: 列表，包含想要预先导入的模块名或文件名；不传时导入全部
+    """
+    _tool_registry.preload(module_names=module_names)
+
+def render_tools_prompt(module_names: Optional[List[str]] = None) -> str:
+    """
+    文本协议下写入系统提示词的紧凑工具说明（缓存）
+    :param module_names: 列表，包含模块名或文件名
+    """
+    return _tool_registry.render_tools_prompt(module_names=module_names)
+
+def tool_prompt_cost(module_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    每个工具的说明占用的 prompt token 数（text / native / service 三种写法），见 ToolRegistry.prompt_cost
+    :param module_names: 列表，包含模块名或文件名
+    """
+    return _tool_registry.prompt_cost(module_names=module_names)
+
+def call_tool_by_name(name: str, *args, tool_call: Optional[_ToolCall] = None, deadline: Optional[float] = None, scope: Any = None, **kwargs) -> Any:
+    return _tool_registry.call_tool(name, *args, tool_call=tool_call, deadline=deadline, scope=scope, **kwargs)
+
+def prepare_tool_call(name: str, deadline: Optional[float] = None, scope: Any = None) -> _ToolCall:
+    """创建一次工具调用，交给 call_tool_by_name(tool_call=...) 执行，调用方用 wait / await_done 等待并执行时限"""
+    return _tool_registry.prepare_call(name, deadline=deadline, scope=scope)
 
 def get_tool_output_description(name: str) -> Optional[str]:
     """
@@ -421,13 +935,25 @@ __all__ = [
     'get_tool_info',
     'list_all_tools',
     'call_tool_by_name',
+    'prepare_tool_call',
     'expose_tools_as_service',
+    'list_tool_schemas',
+    'render_tools_prompt',
+    'tool_prompt_cost',
     'list_all_tools_simple',
+    'list_tool_models',
+    'preload_tools',
     'get_tool_output_description',
     'get_tool_audio_sync_mode',
     'get_system_tts',
     'set_system_tts',
-    'get_tool_audio_sync_mode'
+    'get_tool_audio_sync_mode',
+    'ToolTimeoutError',
+    'ToolCancelledError',
+    'DEFAULT_TOOL_TIMEOUT',
+    'tool_cancelled',
+    'tool_time_left',
+    'cancel_tool_calls',
 ]
 
 if __name__ != '__main__':
@@ -1,6 +1,6 @@
 import requests
 from bs4 import BeautifulSoup
-from tools import tool
+from tools import tool, tool_time_left
 from logger import logger
 
 # 天气代码 https://dev.qweather.com/docs/resource/icons/#weather-icons
@@ -81,7 +81,7 @@ def fetch_city_info(location, api_key, api_host):
     获取城市信息
     """
     url = f"https://{api_host}/geo/v2/city/lookup?key={api_key}&location={location}&lang=zh"
-    response = requests.get(url, headers=HEADERS).json()
+    response = requests.get(url, headers=HEADERS, timeout=tool_time_left(10)).json()
     if response.get("error") is not None:
         logger.error(
             f"获取天气失败，原因：{response.get('error', {}).get('detail')}"
@@ -93,7 +93,7 @@ def fetch_weather_page(url):
     """
     获取天气页面
     """
-    response = requests.get(url, headers=HEADERS)
+    response = requests.get(url, headers=HEADERS, timeout=tool_time_left(10))
     return BeautifulSoup(response.text, "html.parser") if response.ok else None
 
 def parse_weather_info(soup):
@@ -131,7 +131,7 @@ class Action_Healthy:
 action_healthy = Action_Healthy()
 
 from utils.audio import audio_player
-from tools import tool
+from tools import tool, tool_cancelled
 @tool(name="healthy_course", description="""本程序的功能是健康课程讲座。根据课程名称或内容进行播讲。如客户类似表达了“我想听心理健康课程”或“请播放心理健康课程”的意思，可使用本程序。
 输入：课程名称，课程内容。例如，课程名称：仅从对话内容中提取，如“老年人营养早餐的搭配”；课程内容：从对话中提取，如“营养早餐应包含哪些食物，...。”。注：如果从对话中提取不出课程名称或课程内容，相应填写字符串'none'。
 回复要求：如果本函数返回的结果是''，即空字符，则回复''；如果本函数返回的结果不为空，则按照本函数返回的结果要求由大模型生成回复内容""",audioSyncMode=2)
@@ -141,6 +141,9 @@ def healthy_course(healthy_name, healthy_content):
     if '.wav' in answer:
         try:
             answer = action_healthy.wav_path + answer
+            # 调用已超时或被用户打断时不再开始播放
+            if tool_cancelled():
+                return "", 1
             audio_player.play(answer)
             return "", 0
         except Exception as e:
@@ -2,7 +2,7 @@ import requests
 import urllib.parse
 import re
 from logger import logger
-from tools import tool
+from tools import tool, tool_cancelled, tool_time_left
 from utils.audio import audio_player
 
 @tool(name="search_song_then_play", description="""一步完成搜索歌曲并播放的功能，根据歌曲名称搜索并直接播放
@@ -20,7 +20,7 @@ def search_song_then_play(song_name: str, singer_name: str = None) -> str:
         search_url = f"https://api.vkeys.cn/music/tencent/search/song?keyword={encoded_song_name}"
         logger.info(f"正在搜索 URL: {search_url}")
         
-        search_response = requests.get(search_url, timeout=15)
+        search_response = requests.get(search_url, timeout=tool_time_left(15))
         search_response.raise_for_status()
         search_data = search_response.json()
 
@@ -52,7 +52,7 @@ def search_song_then_play(song_name: str, singer_name: str = None) -> str:
         # get_url_api = f"https://api.vkeys.cn/music/tencent/song/link?mid={song_mid}"
         logger.info(f"正在获取播放链接 URL: {get_url_api}")
 
-        url_response = requests.get(get_url_api, timeout=15)
+        url_response = requests.get(get_url_api, timeout=tool_time_left(15))
         # logger.info(f"获取播放链接响应状态码: {url_response.status_code} {url_response.text}")
         url_response.raise_for_status()
         url_data = url_response.json()
@@ -67,6 +67,11 @@ def search_song_then_play(song_name: str, singer_name: str = None) -> str:
         
         logger.info(f"成功获取歌曲 '{final_song_name}' 的播放链接")
         
+        # 调用已超时或被用户打断（LLM 已收到取消结果）时不再开始播放
+        if tool_cancelled():
+            logger.info(f"搜索歌曲 '{final_song_name}' 的调用已取消，不播放")
+            return f"已取消播放歌曲 '{final_song_name}'"
+
         # 播放歌曲
         try:
             audio_player.play(song_url)
@@ -108,7 +113,7 @@ def call_baidu_ai_search(search_query: str):
     logger.info(f"Sending to Baidu API with content: {search_query}")
     
     try:
-        response = requests.post(BAIDU_API_URL, headers=headers, json=data)
+        response = requests.post(BAIDU_API_URL, headers=headers, json=data, timeout=tool_time_left(15))
         
         if response.status_code == 200:
             response_json = response.json()
@@ -222,7 +227,7 @@ def get_songs_by_singer(singer_name: str, page: int = 1) -> str:
         song_list_url = f"https://api.vkeys.cn/music/tencent/search/song?keyword={singer_name}&page={page}"
         logger.info(f"正在获取歌手歌曲列表 URL: {song_list_url}")
         
-        song_list_response = requests.get(song_list_url, timeout=15)
+        song_list_response = requests.get(song_list_url, timeout=tool_time_left(15))
         song_list_response.raise_for_status()
         song_list_data = song_list_response.json()
 
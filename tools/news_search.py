@@ -1,7 +1,7 @@
 import json
 import requests
 import re
-from tools import tool
+from tools import tool, tool_time_left
 from logger import logger
 import datetime
 # 全局变量和常量定义
@@ -71,7 +71,7 @@ def qianfan_ai_search(api_key, keyword, top_k=10, time_filter="month", target_si
             url=api_url,
             headers=headers,
             data=json.dumps(request_body),
-            timeout=15
+            timeout=tool_time_left(15)
         )
         response.raise_for_status()
 
@@ -169,7 +169,7 @@ def get_paper_news():
         headers = {"User-Agent": "Mozilla/5.0"}
         
         logger.info(f"正在获取新闻，API URL: {api_url}")
-        response = requests.get(api_url, headers=headers, timeout=10)
+        response = requests.get(api_url, headers=headers, timeout=tool_time_left(10))
         response.raise_for_status()
         
         data = response.json()
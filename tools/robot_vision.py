@@ -3,14 +3,12 @@ import io
 import base64
 import subprocess
 from PIL import Image
-from openai import OpenAI
-from tools import tool
+from brain import chat_completion
+from tools import tool, tool_time_left
 
 # --- 1. 全局配置 ---
-VLM_CLIENT = OpenAI(
-    base_url="http://47.108.93.204:11435/v1",
-    api_key="ollama"
-)
+# 默认 VLM 地址；config.ini 的 [Endpoints] 中为该模型配置了端点时按路由选择
+VLM_BASE_URL = "http://47.108.93.204:11435/v1"
 VLM_MODEL_NAME = "qwen3-vl:8b"
 
 # --- 2. 辅助函数：图像处理 ---
@@ -95,7 +93,7 @@ def call_ros_bridge_to_get_image():
             text=True
         )
 
-        stdout, stderr = process.communicate(timeout=15)
+        stdout, stderr = process.communicate(timeout=tool_time_left(15))
 
         if process.returncode == 0:
             # 再次确认文件是否真的生成了
@@ -118,7 +116,7 @@ def call_ros_bridge_to_get_image():
 
 # --- 4. MCP Tools 定义 ---
 
-@tool(name='visual_perception', description='''视觉感知工具。
+@tool(name='visual_perception', timeout=40, models=[VLM_MODEL_NAME], description='''视觉感知工具。
                                         功能：控制机器人拍摄一张当前环境的照片，并使用视觉大模型(VLM)进行分析。
                                         输入参数 query：你想知道关于图片的什么信息？例如“描述这张图片”、“前方有什么障碍物”、“这里有人吗”。
                                         返回结果：视觉模型对当前环境的自然语言描述。''')
@@ -135,8 +133,9 @@ def visual_perception(query: str) -> str:
 
     # 3. 识别
     try:
-        response = VLM_CLIENT.chat.completions.create(
-            model=VLM_MODEL_NAME,
+        response = chat_completion(
+            VLM_MODEL_NAME,
+            base_url=VLM_BASE_URL,
             messages=[
                 {"role": "system", "content": "你是一个负责机器人视觉感知的助手，你需要准确、客观地描述你看到的图像内容。"},
                 {
@@ -1,13 +1,11 @@
 from tools import tool
 import cv2
 import base64
-from openai import OpenAI
+from brain import chat_completion
 
-# 初始化OpenAI客户端
-client = OpenAI(
-    base_url="http://47.108.93.204:11435/v1",
-    api_key="ollama"
-)
+# 默认 VLM 地址；config.ini 的 [Endpoints] 中为该模型配置了端点时按路由选择
+VLM_BASE_URL = "http://47.108.93.204:11435/v1"
+VLM_MODEL_NAME = "qwen3-vl:8b"
 
 # 辅助函数：将图像文件转换为base64编码
 def image_to_base64(image_path):
@@ -37,7 +35,7 @@ def capture_photo():
     
     return photo_path
 
-@tool(name='robot_vision', description='''机器人视觉功能，用于调取摄像头拍摄图片，并返回对图片的描述。
+@tool(name='robot_vision', timeout=40, models=[VLM_MODEL_NAME], description='''机器人视觉功能，用于调取摄像头拍摄图片，并返回对图片的描述。
                                   回复要求：回复需要根据用户的提问及视觉描述，自然拟人；如果失败按照报错进行解释性回复''')
 def robot_vision() -> str:
     """机器人视觉功能，调取摄像头拍摄图片并返回描述"""
@@ -52,8 +50,9 @@ def robot_vision() -> str:
         base64_image = image_to_base64(photo_path)
         
         # 调用qwen3vl模型进行图像描述
-        response = client.chat.completions.create(
-            model="qwen3-vl:8b",
+        response = chat_completion(
+            VLM_MODEL_NAME,
+            base_url=VLM_BASE_URL,
             messages=[
                 {"role": "system", "content": "你是一个有帮助的助手，擅长理解图像内容。"},
                 {
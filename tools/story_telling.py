@@ -133,7 +133,7 @@ class Action_Story:
 action_story = Action_Story()
 
 from utils.audio import audio_player
-from tools import tool
+from tools import tool, tool_cancelled
 @tool(name="story_telling", description="""本程序的功能是讲故事，根据故事名称或内容进行播讲。如客户类似表达了“我想听空城计的故事”或“我想听空城计”的意思，可使用本程序。
 输入：故事名称，故事内容。例如，故事名称：仅从对话内容中提取（不要自己设想、猜测），如“桃园三结义”；故事内容：从对话中提取，如“三个男人结为异性兄弟，并肩作战。”。注：如果从对话中提取不出故事名称或故事内容，相应填写字符串'none'。
 回复要求：如果本函数返回的结果是''，即空字符，则回复''；如果本函数返回的结果不为空，则按照本函数返回的结果要求由大模型生成回复内容""",audioSyncMode=2) 
@@ -144,6 +144,9 @@ def story_telling(story_name, story_content):
     if '.wav' in answer:
         try:
             answer = action_story.wav_path + answer
+            # 调用已超时或被用户打断时不再开始播放
+            if tool_cancelled():
+                return "", 1
             audio_player.play(answer)
             return "", 0
         except Exception as e:
@@ -12,6 +12,7 @@ import threading
 from collections import deque
 import concurrent.futures
 from logger import logger
+from utils.tracing import tracer
 # from loguru import logger
 try:
     from utils.turn_detector import TurnDetector
@@ -47,6 +48,13 @@ class SpeechRecognizer:
         self.final_result_timeout = 2.0
 
         self.rms_list = []
+
+        # 用户打断（barge-in）：播放期间麦克风照常监听，连续 min_speech_ms 有声时调用 on_speech_start
+        # playback_active() 为真（正在播报/播放音乐）时静音阈值乘以 barge_in_ratio，避免扬声器的回声触发打断
+        self.on_speech_start = None
+        self.playback_active = None
+        self.barge_in_ratio = 3.0
+        self.min_speech_ms = 240
         
         threading.Thread(target=self._conn_keepalive, daemon=True).start()
         while not self.websocket:
@@ -84,7 +92,10 @@ class SpeechRecognizer:
         sum_squares = sum(s**2 for s in shorts)
         rms = math.sqrt(sum_squares / count)
         self.rms_list.append(rms)
-        return rms < self.silence_threshold
+        threshold = self.silence_threshold
+        if self.playback_active is not None and self.playback_active():
+            threshold *= self.barge_in_ratio
+        return rms < threshold
     
     def _record_microphone(self, start=0):
         FORMAT = pyaudio.paInt16
@@ -126,6 +137,11 @@ class SpeechRecognizer:
         model_check_interval = 0.3
         prediction_future = None
         complete_count = 0  # 连续 complete 次数计数
+        end_reason = None
+        # 连续有声的帧数，达到 onset_frames 时判定用户开始说话（每次监听只通知一次）
+        voiced_frames = 0
+        onset_frames = max(1, math.ceil(self.min_speech_ms / 1000 / chunk_duration))
+        onset_fired = False
         cnt = 0
         while self.websocket:
             cnt += 1
@@ -154,6 +170,7 @@ class SpeechRecognizer:
                             complete_count += 1
                             if complete_count >= 2:
                                 logger.info("End of speech detected (2 consecutive complete).")
+                                end_reason = "turn_detector"
                                 self.running = False
                                 break
                         else:
@@ -164,9 +181,20 @@ class SpeechRecognizer:
                     finally:
                         prediction_future = None
                 # logger.info(f"is_silent: {is_silent}, has_spoken: {has_spoken}")
+                voiced_frames = 0 if is_silent else voiced_frames + 1
+                if voiced_frames >= onset_frames and not onset_fired and start != 1:
+                    onset_fired = True
+                    tracer.mark("asr.speech_onset")
+                    if self.on_speech_start is not None:
+                        try:
+                            self.on_speech_start()
+                        except Exception as e:
+                            logger.error(f"打断回调异常: {e}")
                 if not is_silent:
                     if not has_spoken:
                         self.final_text = ''
+                        if start != 1:
+                            tracer.mark("asr.speech_start")
                     has_spoken = True
                     silence_start_time = None 
                     complete_count = 0  # 重新开始说话，重置计数
@@ -181,6 +209,7 @@ class SpeechRecognizer:
 
                         if silence_duration > self.max_silence_seconds:
                             logger.info("End of speech detected (Max Silence Timeout).")
+                            end_reason = "max_silence"
                             self.running = False
                             break
                         
@@ -209,11 +238,15 @@ class SpeechRecognizer:
         logger.info(f"Sending final flush signal to server... {self.running}")
         if start==1:
             return
+        if has_spoken:
+            tracer.mark("asr.end_of_speech", reason=end_reason)
         self.websocket.send(json.dumps({"is_speaking": False}))
         # time.sleep(0.01)  
         # 2. 等待最终结果 (带超时)
-        if not self.result_event.wait(timeout=self.final_result_timeout):
+        got_result = self.result_event.wait(timeout=self.final_result_timeout)
+        if not got_result:
             logger.warning(f"Timeout waiting for final result after {self.final_result_timeout}s")
+        tracer.mark("asr.final_text", chars=len(self.final_text), timeout=not got_result)
         
         logger.info(f"Recording stopped, final_text: '{self.final_text}'")
 
@@ -239,6 +272,8 @@ class SpeechRecognizer:
 
     def start(self):
         self.final_text = ''
+        # 每次监听开始一个新的 trace 轮次，由 process_user_query 在播放完毕后结束
+        tracer.start_turn()
         self._record_microphone()
         # while True:
         #     time.sleep(0.01)
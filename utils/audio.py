@@ -1,29 +1,34 @@
 import zipfile
 import os
 import time
-import threading
 import requests
 import sys
 import shutil
+import threading
+from concurrent.futures import Future, InvalidStateError
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 from logger import logger
-import subprocess
+from utils.audio_engine import get_engine
 import platform
 import tarfile
 class FlacStreamPlayer:
     """
     在线解析 FLAC 链接，边下边播
-    使用 ffmpeg 解码并播放
+    下载的数据块写入音频引擎（utils.audio_engine）中常驻的 "music" 音源，由其中的 ffmpeg 解码、混音输出；
+    每首歌写完后换上预先启动的备用解码器（容器格式要求每首歌单独解码），换歌与打断不重建音源、不等进程启动；
+    本地 WAV（故事、课程音频）在进程内读取，不启动任何进程
     """
     linux_download_url = 'https://xget.xi-xu.me/gh/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-linux64-gpl.tar.xz'
     windows_download_url = 'https://xget.xi-xu.me/gh/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl-shared.zip'
     def __init__(self, buffer_size: int = 1024 * 64):
         self.buffer_size = buffer_size
-        self.stop_event = threading.Event()
-        self.stop_event.set()
-        self.ffmpeg_proc = None
+        # 当前播放的 Future：播完为 True，被停止为 False
+        self.done = None
+        # 常驻的音乐音源（首次播放时打开）与停止当前播放的方法
+        self.music = None
+        self._stop = None
 
         # 根据操作系统设置ffmpeg路径
         system = platform.system().lower()
@@ -73,94 +78,83 @@ class FlacStreamPlayer:
         os.remove(tar_path)
         logger.info(f"✅ 已成功下载并解压 ffmpeg 到 {ffmpeg_dir}")
 
-    def _play_worker(self, source):
-        """播放线程：从队列读取数据并直接喂给 ffplay 实现真正的边下边播"""
-        self.stop_event.clear()
-        # 启动 ffplay 子进程，直接从 stdin 读取 FLAC 数据流
-        self.ffmpeg_proc = subprocess.Popen([
-            'ffplay', 
-            '-i', 'pipe:0',
-            '-autoexit',
-            '-nodisp',
-            '-loglevel', 'quiet'
-        ], stdin=subprocess.PIPE, bufsize=0)
-        try:
-            # 流式写入数据
-            for chunk in self.create_stream_generator(source, self.buffer_size):
-                if not self.is_playing:
-                    break
-                self.ffmpeg_proc.stdin.write(chunk)
-                self.ffmpeg_proc.stdin.flush()
-            
-            # 完成写入
-            self.ffmpeg_proc.stdin.close()
-            
-            # 等待播放完成
-            if self.is_playing:
-                self.ffmpeg_proc.wait()
-                logger.info("播放完成")
-                # 播放完成后播放提示音
-                # self.play_file('./assets/music_done.wav')
-                # done_proc = subprocess.Popen([
-                #     'ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet',
-                #     './assets/music_done.wav'
-                # ])
-                # done_proc.wait()
-        except Exception as e:
-            logger.error(f"播放出错: {e}")
-            self.safe_stop()
     def play_file(self, file_path: str):
-        """播放本地文件"""
-        done_proc = subprocess.Popen([
-                    'ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet',
-                    file_path
-                ])
-        done_proc.wait()
+        """播放本地文件，阻塞到播完"""
+        get_engine().play("file", file_path).done.result()
 
     def play(self, source: str, join=False):
         """开始边下边播（非阻塞模式）"""
-        # 首先停止当前播放（如果有）
-        if self.safe_stop():
-            time.sleep(1)
-        if join:
-            self._play_worker(source)
+        # 首先停止当前播放（如果有）：只清空待播音频、换上备用解码器，不需要等待旧进程退出
+        self.safe_stop()
+        engine = get_engine()
+        if source.lower().endswith('.wav') and os.path.exists(source):
+            # 本地 WAV 在进程内读取，不经解码进程
+            stream = engine.play("story", source)
+            self.done, self._stop = stream.done, stream.stop
         else:
-            threading.Thread(target=self._play_worker, args=(source,), daemon=True).start()
+            if self.music is None:
+                self.music = engine.open_stream("music", fmt=None)
+            self.done, self._stop = Future(), self.music.clear
+            threading.Thread(target=self._feed_music, args=(self.create_stream_generator(source, self.buffer_size), self.done),
+                             daemon=True, name="audio-feed-music").start()
+        self.done.add_done_callback(self._on_done)
+        if join:
+            self.done.result()
         return
-        
+
+    def _feed_music(self, chunks, done):
+        """把一首歌写入音乐音源，写完后结束这一段；这一段播完（或被停止）时 done 完成"""
+        generation = self.music.generation
+        try:
+            for chunk in chunks:
+                if done.done() or self.music.generation != generation:
+                    return
+                self.music.write(chunk, generation)
+        except Exception as e:
+            logger.error(f"[music] 读取音源出错: {e}")
+        self.music.end_segment(generation).add_done_callback(lambda segment: self._resolve(done, segment.result()))
+
+    @staticmethod
+    def _resolve(done, result):
+        try:
+            done.set_result(result)
+        except InvalidStateError:
+            # 已被 safe_stop() 置为 False
+            pass
+
+    @staticmethod
+    def _on_done(done):
+        # 被停止时结果为 False
+        if done.result():
+            logger.info("播放完成")
+
     @property
     def is_playing(self):
-        return not self.stop_event.is_set()
+        return self.done is not None and not self.done.done()
 
     def safe_stop(self):
         """停止播放和下载"""
-        # 设置停止事件
         if not self.is_playing:
             logger.info("当前未在播放音乐，无需停止")
             return False
 
         logger.info("停止播放音乐...")
-        self.stop_event.set()
-
-        # 安全终止ffmpeg进程
-        if self.ffmpeg_proc:
-            try:
-                if self.ffmpeg_proc.poll() is None:
-                    self.ffmpeg_proc.terminate()
-                    # 添加超时，避免永久阻塞
-                    try:
-                        self.ffmpeg_proc.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        logger.warning("ffmpeg进程终止超时")
-            except Exception as e:
-                logger.error(f"终止ffmpeg进程时出错: {e}")
-            finally:
-                # 确保清除进程引用
-                self.ffmpeg_proc = None
-        # 清除正在播放音乐的标志位
+        # 清空待播音频并换上备用解码器，下载线程随后退出
+        self._stop()
+        self._resolve(self.done, False)
         logger.info("音乐播放已停止，资源已清理")
         return True
 
+    def interrupt(self) -> float:
+        """用户打断（barge-in）时立即静音，返回耗时（秒）"""
+        start = time.perf_counter()
+        if not self.is_playing:
+            return 0.0
+        self._stop()
+        self._resolve(self.done, False)
+        logger.info("音乐播放已被打断")
+        return time.perf_counter() - start
+
     def create_stream_generator(self, source, chunk_size=8192):
         """创建统一的流式生成器"""
         if isinstance(source, str) and source.startswith(('http://', 'https://')):
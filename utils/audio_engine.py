@@ -0,0 +1,699 @@
+import configparser
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional, Union
+
+import numpy as np
+
+from logger import logger
+
+# MPEG 音频第三层的码率表（kbps）：MPEG1 与 MPEG2/2.5
+_L3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+class Mp3FrameCounter:
+    """
+    按帧头统计 MP3 码流解码后的采样数（换算为引擎采样率下的帧数），帧可以跨数据块
+    只识别第三层（edge-tts 输出的格式），其余数据不计数，由 AudioStream 的空闲判定兜底
+    """
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self._buf = b""
+        self._skip = 0
+
+    def feed(self, data: bytes) -> float:
+        buf = self._buf + data
+        frames = 0.0
+        i = 0
+        while True:
+            if self._skip:
+                step = min(self._skip, len(buf) - i)
+                i += step
+                self._skip -= step
+                if self._skip:
+                    break
+            if len(buf) - i < 10:
+                break
+            if buf[i:i + 3] == b"ID3":
+                # ID3v2 标签：同步安全整数记录的长度，再加 10 字节头
+                size = (buf[i + 6] & 0x7F) << 21 | (buf[i + 7] & 0x7F) << 14 | (buf[i + 8] & 0x7F) << 7 | (buf[i + 9] & 0x7F)
+                self._skip = size + 10
+                continue
+            b1, b2 = buf[i + 1], buf[i + 2]
+            version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+            bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+            if buf[i] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+                i += 1
+                continue
+            rate = _SAMPLE_RATES[version][rate_index]
+            bitrate = _L3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+            samples = 1152 if version == 3 else 576
+            length = samples // 8 * bitrate // rate + ((b2 >> 1) & 1)
+            if len(buf) - i < length:
+                break
+            frames += samples * self.sample_rate / rate
+            i += length
+        self._buf = buf[i:]
+        return frames
+
+
+class LinearCounter:
+    """每字节对应固定帧数的码流（如 PCM 或测试替身）"""
+    def __init__(self, frames_per_byte: float):
+        self.frames_per_byte = frames_per_byte
+
+    def feed(self, data: bytes) -> float:
+        return len(data) * self.frames_per_byte
+
+
+def ffmpeg_path() -> str:
+    """优先使用 PATH 中的 ffmpeg，其次是 utils.audio 下载到 assets/ffmpeg/<系统> 的版本"""
+    local = os.path.join("assets", "ffmpeg", platform.system().lower())
+    return shutil.which("ffmpeg") or shutil.which("ffmpeg", path=local) or "ffmpeg"
+
+
+def ffmpeg_decoder_cmd(fmt: Optional[str], sample_rate: int, channels: int) -> List[str]:
+    """解码为引擎格式（s16le）的 ffmpeg 命令；fmt 已知时跳过格式探测，每帧解码后立即输出"""
+    cmd = [ffmpeg_path(), "-hide_banner", "-loglevel", "quiet"]
+    if fmt:
+        cmd += ["-probesize", "32", "-analyzeduration", "0", "-fflags", "nobuffer", "-f", fmt]
+    return cmd + ["-i", "pipe:0", "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-flush_packets", "1", "pipe:1"]
+
+
+class PcmRing:
+    """定长 PCM 环形缓冲（int16，帧 × 声道）：写满时阻塞写入方，clear() 后旧代数的写入直接丢弃"""
+    def __init__(self, capacity: int, channels: int):
+        self.capacity = capacity
+        self._buf = np.zeros((capacity, channels), dtype=np.int16)
+        self._start = 0
+        self._size = 0
+        self.generation = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._size
+
+    def write(self, frames: np.ndarray, generation: int) -> int:
+        written = 0
+        with self._cond:
+            while written < len(frames):
+                while self._size == self.capacity and not self._closed and generation == self.generation:
+                    self._cond.wait()
+                if self._closed or generation != self.generation:
+                    break
+                n = min(len(frames) - written, self.capacity - self._size)
+                end = (self._start + self._size) % self.capacity
+                first = min(n, self.capacity - end)
+                self._buf[end:end + first] = frames[written:written + first]
+                self._buf[:n - first] = frames[written + first:written + n]
+                self._size += n
+                written += n
+        return written
+
+    def read(self, n: int) -> np.ndarray:
+        with self._cond:
+            n = min(n, self._size)
+            if n == 0:
+                return self._buf[:0]
+            first = min(n, self.capacity - self._start)
+            out = self._buf[self._start:self._start + first]
+            out = np.concatenate((out, self._buf[:n - first])) if first < n else out.copy()
+            self._start = (self._start + n) % self.capacity
+            self._size -= n
+            self._cond.notify_all()
+            return out
+
+    def clear(self) -> int:
+        """丢弃缓冲中的音频，返回新的代数"""
+        with self._cond:
+            self._start = self._size = 0
+            self.generation += 1
+            self._cond.notify_all()
+            return self.generation
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class AudioStream:
+    """
+    引擎中的一路音源：编码数据写入常驻解码进程（fmt="pcm" 时直接写入），解码出的 PCM 进入环形缓冲，由混音器按播放进度取走
+    - mark()：返回 Future，写入到目前为止的音频实际播放完（按取走的采样位置，加上声卡输出延迟）时结果为 True，被 clear() 丢弃时为 False
+    - clear()：丢弃缓冲与解码器中的音频（用户打断），换上预先启动的备用解码器
+    - end_segment()：常驻音源中的一段（如一首歌）写完，返回这一段播完时完成的 Future，后续写入由新的解码器接收
+    - end_input()：有限长的音源写完，播完后 done 完成，引擎移除这一路
+    """
+    def __init__(self, engine: "AudioEngine", name: str, fmt: Optional[str] = "mp3", gain: float = 1.0, ducking: bool = False,
+                 spare_decoder: bool = False):
+        self.engine = engine
+        self.name = name
+        self.fmt = fmt
+        self.gain = gain
+        # 发声时压低其他音源（如 TTS 播报时压低音乐）
+        self.ducking = ducking
+        self.ring = PcmRing(engine.ring_frames, engine.channels)
+        self._counter = self._new_counter()
+        self._lock = threading.Lock()
+        self._marks = []
+        # 已写入的音频折算的帧数（码流未知时为 None）与已播放的帧数
+        self.expected: Optional[float] = 0.0 if self._counter else None
+        self.played = 0
+        self.underruns = 0
+        # 本代数写入环形缓冲的帧数（按解码结果统计，用于一段音源的结束位置）
+        self.written = 0
+        self._last_activity = time.monotonic()
+        self._proc = None
+        # 常驻音源预先启动一个备用解码器，clear() 与换段时直接换上，不在打断路径上启动进程
+        self.spare_decoder = spare_decoder
+        self._spare = None
+        # 仍在运行的解码器（当前的与正在输出上一段尾部的）及其读取线程；换段时写入结束的解码器对应的 Future
+        self._procs = set()
+        self._reader = None
+        self._segments = {}
+        self._input_closed = False
+        self._decoded_all = False
+        self.stopped = False
+        self.done = Future()
+        if fmt != "pcm":
+            self._start_decoder()
+
+    def _new_counter(self):
+        if self.fmt == "pcm":
+            return LinearCounter(1 / self.engine.frame_bytes)
+        return self.engine.counter_factory(self.fmt) if self.fmt else None
+
+    @property
+    def generation(self) -> int:
+        return self.ring.generation
+
+    @property
+    def active(self) -> bool:
+        """还有待播放的音频或未完成的 mark"""
+        return len(self.ring) > 0 or bool(self._marks)
+
+    def _spawn_decoder(self):
+        try:
+            return subprocess.Popen(self.engine.decoder_cmd(self.fmt, self.engine.sample_rate, self.engine.channels),
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        except OSError as e:
+            # 未安装 ffmpeg 等：这一路静音，写入的数据直接丢弃
+            logger.error(f"[{self.name}] 解码进程无法启动，音频将被丢弃: {e}")
+            return None
+
+    def _start_decoder(self):
+        """换上备用解码器（没有时当场启动），读取线程排在上一个解码器之后写入环形缓冲；调用方持有 self._lock 或在构造中"""
+        proc, self._spare = self._spare, None
+        if proc is None or proc.poll() is not None:
+            proc = self._spawn_decoder()
+        self._proc = proc
+        if proc is None:
+            return
+        self._procs.add(proc)
+        self._reader = threading.Thread(target=self._read_decoder, args=(proc, self.ring.generation, self._reader), daemon=True,
+                                        name=f"audio-{self.name}")
+        self._reader.start()
+        if self.spare_decoder:
+            threading.Thread(target=self._prepare_spare, daemon=True, name=f"audio-{self.name}-spare").start()
+
+    def _prepare_spare(self):
+        proc = self._spawn_decoder()
+        if proc is None:
+            return
+        with self._lock:
+            if self._spare is None and not self.stopped and not self._input_closed:
+                self._spare, proc = proc, None
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+
+    def _read_decoder(self, proc, generation: int, previous: Optional[threading.Thread]):
+        if previous is not None:
+            # 上一个解码器输出完上一段的尾部后再写入，保证顺序
+            previous.join()
+        frame_bytes = self.engine.frame_bytes
+        pending = b""
+        while True:
+            try:
+                data = proc.stdout.read(65536)
+            except (OSError, ValueError):
+                break
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            self._last_activity = time.monotonic()
+            frames = np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, self.engine.channels)
+            written = self.ring.write(frames, generation)
+            with self._lock:
+                if generation == self.ring.generation:
+                    self.written += written
+            if written < len(frames):
+                break
+        with self._lock:
+            self._procs.discard(proc)
+            segment = self._segments.pop(proc, None)
+            if generation != self.ring.generation:
+                return
+            if segment is not None:
+                # 一段音源解码完：播放到目前写入的位置时这一段播完
+                self._marks.append((self.written, segment))
+            elif self._input_closed and proc is self._proc:
+                self._decoded_all = True
+
+    def write(self, data: bytes, generation: Optional[int] = None):
+        """写入编码数据（或 PCM）；generation 与当前代数不同（已被 clear()）时丢弃"""
+        if not data or self.stopped:
+            return
+        with self._lock:
+            if generation is not None and generation != self.ring.generation:
+                return
+            generation = self.ring.generation
+            proc = self._proc
+            if proc is None and self.fmt != "pcm":
+                # 解码进程没有启动：不计入待播放的音频，mark 立即完成
+                return
+            self._last_activity = time.monotonic()
+            if self._counter is not None:
+                self.expected += self._counter.feed(data)
+        if self.fmt == "pcm":
+            frames = np.frombuffer(data[:len(data) - len(data) % self.engine.frame_bytes], dtype=np.int16)
+            written = self.ring.write(frames.reshape(-1, self.engine.channels), generation)
+            with self._lock:
+                if generation == self.ring.generation:
+                    self.written += written
+            return
+        try:
+            # 无缓冲的管道写入可能只写入一部分
+            view = memoryview(data)
+            while view:
+                view = view[proc.stdin.write(view):]
+        except (BrokenPipeError, OSError, ValueError):
+            # clear() 终止了旧的解码器，这块数据本来就要丢弃
+            if generation == self.ring.generation and not self.stopped:
+                logger.warning(f"[{self.name}] 解码进程意外退出，重新启动")
+                with self._lock:
+                    self._start_decoder()
+
+    def mark(self, generation: Optional[int] = None) -> Future:
+        """写入到目前为止的音频播完时结果为 True；generation 与当前代数不同（已被 clear()）时直接为 False"""
+        future = Future()
+        with self._lock:
+            position = self.expected
+            if generation is not None and generation != self.ring.generation:
+                future.set_result(False)
+            elif position is not None and position - self.played <= self.engine.tolerance_frames and len(self.ring) == 0:
+                future.set_result(True)
+            else:
+                self._marks.append((position, future))
+        return future
+
+    def end_segment(self, generation: Optional[int] = None) -> Future:
+        """
+        常驻音源中的一段（如一首歌）写完：当前解码器读到输入结束后输出这一段的剩余音频并退出，之后的写入交给备用解码器
+        返回的 Future 在这一段播完时为 True，被 clear() 丢弃（或 generation 已过期）时为 False
+        """
+        future = Future()
+        with self._lock:
+            proc = self._proc
+            if self.stopped or (generation is not None and generation != self.ring.generation):
+                future.set_result(False)
+                return future
+            if self.fmt == "pcm" or proc is None:
+                # 不经解码器（或解码器没有启动，数据已丢弃）：写入的音频都已在缓冲中
+                self._marks.append((self.written, future))
+                return future
+            self._segments[proc] = future
+            self._start_decoder()
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        return future
+
+    def end_input(self):
+        """音源写完：解码器读到输入结束后输出剩余音频并退出"""
+        with self._lock:
+            self._input_closed = True
+            proc, spare, self._spare = self._proc, self._spare, None
+        if spare is not None:
+            self._kill(spare)
+        if proc is None:
+            self._decoded_all = True
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _kill(proc):
+        proc.kill()
+        proc.wait()
+
+    def clear(self):
+        """丢弃所有未播放的音频（下一个混音块起静音），未完成的 mark 结果为 False，换上备用解码器"""
+        with self._lock:
+            self.ring.clear()
+            marks, self._marks = self._marks, []
+            marks += [(None, future) for future in self._segments.values()]
+            self._segments.clear()
+            self.expected = 0.0 if self._counter else None
+            self.played = 0
+            self.written = 0
+            if self._counter is not None:
+                self._counter = self._new_counter()
+            procs = list(self._procs)
+            for proc in procs:
+                proc.kill()
+            if self._proc is not None and not self.stopped and not self._input_closed:
+                self._start_decoder()
+        for _, future in marks:
+            if not future.done():
+                future.set_result(False)
+        for proc in procs:
+            proc.wait()
+
+    def stop(self):
+        """停止并移除这一路"""
+        self.stopped = True
+        self.clear()
+        with self._lock:
+            spare, self._spare = self._spare, None
+        if spare is not None:
+            self._kill(spare)
+        self.ring.close()
+        self.engine.remove(self)
+        if not self.done.done():
+            self.done.set_result(False)
+
+    def pull(self, n: int):
+        """混音器取出至多 n 帧，返回 (音频, 已播放到的 mark)"""
+        frames = self.ring.read(n)
+        reached = []
+        with self._lock:
+            self.played += len(frames)
+            if len(frames) < n and self.expected is not None and self.expected - self.played > self.engine.tolerance_frames:
+                # 写入的音频还没解码出来：播放出现空档
+                self.underruns += 1
+            if not self._marks:
+                pass
+            elif len(self.ring) == 0 and (self._decoded_all or time.monotonic() - self._last_activity > self.engine.idle_s):
+                # 缓冲已空且解码器不再输出：写入的音频都已播放（兜底码流帧数与解码结果不一致的情况）
+                reached, self._marks = self._marks, []
+            else:
+                while self._marks and self._marks[0][0] is not None and self._marks[0][0] - self.played <= self.engine.tolerance_frames:
+                    reached.append(self._marks.pop(0))
+        return frames, [future for _, future in reached]
+
+    @property
+    def finished(self) -> bool:
+        return self._decoded_all and len(self.ring) == 0
+
+
+class PyAudioSink:
+    """声卡输出：PyAudio 回调模式，整个会话只打开一次设备，没有音源时输出静音"""
+    def __init__(self, device_index: Optional[int] = None):
+        self.device_index = device_index
+        self.latency = 0.0
+        self._pa = None
+        self._stream = None
+
+    def start(self, engine: "AudioEngine"):
+        import pyaudio
+        self._pa = pyaudio.PyAudio()
+
+        def callback(in_data, frame_count, time_info, status):
+            return engine.mix(frame_count), pyaudio.paContinue
+
+        self._stream = self._pa.open(format=pyaudio.paInt16, channels=engine.channels, rate=engine.sample_rate, output=True,
+                                     frames_per_buffer=engine.block_frames, output_device_index=self.device_index,
+                                     stream_callback=callback)
+        self.latency = self._stream.get_output_latency()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._pa.terminate()
+
+
+class ClockSink:
+    """
+    不接声卡的输出：按实时的 speed 倍速从混音器取数据并丢弃（没有 PyAudio 的环境与离线测试）
+    speed=0 时有音频就尽快取完
+    """
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+        self.latency = 0.0
+        self._running = False
+
+    def start(self, engine: "AudioEngine"):
+        self._running = True
+        threading.Thread(target=self._run, args=(engine,), daemon=True, name="audio-clock").start()
+
+    def _run(self, engine: "AudioEngine"):
+        block = engine.block_frames / engine.sample_rate
+        next_time = time.monotonic()
+        while self._running:
+            engine.mix(engine.block_frames)
+            if self.speed <= 0:
+                if not engine.last_block_audible:
+                    time.sleep(0.002)
+                continue
+            next_time += block / self.speed
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.5:
+                next_time = time.monotonic()
+
+    def stop(self):
+        self._running = False
+
+
+class AudioEngine:
+    """
+    进程内常驻的音频输出：整个会话占用一个输出设备，各音源（TTS、音乐、故事音频）作为 AudioStream 接入，
+    混音器按块从各路环形缓冲取 PCM 相加输出；播放完成由输出端实际取走的采样位置通知
+    """
+    def __init__(self, sample_rate: int = 44100, channels: int = 2, block_ms: int = 20, buffer_ms: int = 3000, duck: float = 0.3,
+                 idle_ms: float = 150.0, sink=None, decoder_cmd: Callable = ffmpeg_decoder_cmd, counter_factory: Optional[Callable] = None):
+        """
+        :param buffer_ms: 每路解码后缓冲的时长，写满时反压到解码器与写入方
+        :param duck: 有 ducking 音源发声时其他音源的音量倍数
+        :param idle_ms: 缓冲为空且解码器这么久没有输出时，视为已写入的音频播放完（码流帧数统计不准时兜底）
+        :param sink: 输出端，默认 PyAudioSink，没有 PyAudio 时退回 ClockSink（不出声）
+        :param decoder_cmd: (fmt, sample_rate, channels) -> 解码进程命令
+        :param counter_factory: fmt -> 码流帧数统计器，默认 mp3 按帧头统计
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_bytes = channels * 2
+        self.block_frames = sample_rate * block_ms // 1000
+        self.ring_frames = sample_rate * buffer_ms // 1000
+        self.duck = duck
+        self.idle_s = idle_ms / 1000
+        # 码流帧数与解码结果（重采样滤波器延迟等）的容差：10ms
+        self.tolerance_frames = sample_rate // 100
+        self.decoder_cmd = decoder_cmd
+        self.counter_factory = counter_factory or (lambda fmt: Mp3FrameCounter(sample_rate) if fmt == "mp3" else None)
+        self.sink = sink
+        self.last_block_audible = False
+        self.blocks = 0
+        self._silence = bytes(self.block_frames * self.frame_bytes)
+        self._streams: List[AudioStream] = []
+        self._lock = threading.Lock()
+        self._completions = queue.Queue()
+        self._started = False
+
+    @classmethod
+    def from_config(cls, cfg: configparser.ConfigParser) -> "AudioEngine":
+        if not cfg.has_section("Audio"):
+            return cls()
+        device = cfg.get("Audio", "device", fallback="").strip()
+        return cls(sample_rate=cfg.getint("Audio", "sample_rate", fallback=44100),
+                   channels=cfg.getint("Audio", "channels", fallback=2),
+                   block_ms=cfg.getint("Audio", "block_ms", fallback=20),
+                   buffer_ms=cfg.getint("Audio", "buffer_ms", fallback=3000),
+                   duck=cfg.getfloat("Audio", "duck", fallback=0.3),
+                   sink=PyAudioSink(int(device)) if device else None)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if self.sink is None:
+            try:
+                import pyaudio  # noqa: F401
+                self.sink = PyAudioSink()
+            except ImportError:
+                logger.error("未安装 PyAudio，音频不会输出到声卡（播放进度按实时计算）")
+                self.sink = ClockSink()
+        threading.Thread(target=self._complete_worker, daemon=True, name="audio-complete").start()
+        self.sink.start(self)
+        logger.info(f"音频引擎已启动: {self.sample_rate}Hz x{self.channels}，输出延迟 {self.sink.latency * 1000:.0f}ms")
+
+    def stop(self):
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream.stop()
+        if self.sink is not None:
+            self.sink.stop()
+        self._completions.put(None)
+
+    def open_stream(self, name: str, fmt: Optional[str] = "mp3", gain: float = 1.0, ducking: bool = False,
+                    spare_decoder: bool = True) -> AudioStream:
+        """打开一路常驻音源（如 TTS、音乐），数据随时写入；spare_decoder 时预先启动备用解码器，打断与换段不等进程启动"""
+        stream = AudioStream(self, name, fmt, gain, ducking, spare_decoder)
+        with self._lock:
+            self._streams.append(stream)
+        self.start()
+        return stream
+
+    def play(self, name: str, source: Union[str, Iterable[bytes]], fmt: Optional[str] = None, gain: float = 1.0) -> AudioStream:
+        """
+        播放有限长的音源：本地 WAV 文件在进程内读取，其他（文件路径或数据块迭代器，如边下边播的歌曲）经解码进程；
+        后台线程写入，返回的 AudioStream.done 在播完（True）或被停止（False）时完成
+        """
+        if isinstance(source, str) and source.lower().endswith(".wav") and os.path.exists(source):
+            stream = self.open_stream(name, fmt="pcm", gain=gain, spare_decoder=False)
+            feed = self._wav_chunks(source)
+        else:
+            stream = self.open_stream(name, fmt=fmt, gain=gain, spare_decoder=False)
+            feed = self._file_chunks(source) if isinstance(source, str) else source
+        threading.Thread(target=self._feed, args=(stream, feed), daemon=True, name=f"audio-feed-{name}").start()
+        return stream
+
+    @staticmethod
+    def _feed(stream: AudioStream, chunks: Iterable[bytes]):
+        try:
+            for chunk in chunks:
+                if stream.stopped:
+                    return
+                stream.write(chunk)
+        except Exception as e:
+            logger.error(f"[{stream.name}] 读取音源出错: {e}")
+        stream.end_input()
+
+    @staticmethod
+    def _file_chunks(path: str, chunk_size: int = 65536):
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _wav_chunks(self, path: str, chunk_ms: int = 200):
+        """读取 16 位 WAV 并换算为引擎的声道数与采样率（线性插值，相邻数据块之间保留一个采样衔接）"""
+        with wave.open(path, "rb") as f:
+            if f.getsampwidth() != 2:
+                raise ValueError(f"只支持 16 位 WAV: {path}")
+            rate, channels = f.getframerate(), f.getnchannels()
+            ratio = rate / self.sample_rate
+            # 上一块的最后一个采样及其在整个文件中的序号；下一个输出采样的序号
+            carry, carry_index, out_index = None, 0, 0
+            while True:
+                data = f.readframes(rate * chunk_ms // 1000)
+                if not data:
+                    break
+                pcm = np.frombuffer(data, dtype=np.int16).reshape(-1, channels).astype(np.float32)
+                if channels != self.channels:
+                    pcm = np.repeat(pcm.mean(axis=1, keepdims=True), self.channels, axis=1)
+                if rate != self.sample_rate:
+                    start = carry_index
+                    if carry is not None:
+                        pcm = np.vstack((carry, pcm))
+                    last = start + len(pcm) - 1
+                    end = int(last / ratio) + 1
+                    points = np.arange(out_index, end) * ratio - start
+                    carry, carry_index, out_index = pcm[-1:], last, end
+                    pcm = np.stack([np.interp(points, np.arange(len(pcm)), pcm[:, c]) for c in range(self.channels)], axis=1)
+                yield pcm.astype(np.int16).tobytes()
+
+    def remove(self, stream: AudioStream):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def mix(self, n: int) -> bytes:
+        """输出端每次取 n 帧：各路相加（有 ducking 音源发声时其他音源按 duck 压低），返回 int16 字节"""
+        with self._lock:
+            streams = list(self._streams)
+        duck = self.duck if any(s.ducking and len(s.ring) for s in streams) else 1.0
+        out = None
+        for stream in streams:
+            frames, reached = stream.pull(n)
+            if reached:
+                self._completions.put((time.monotonic() + self.sink.latency, reached))
+            if len(frames):
+                if out is None:
+                    out = np.zeros((n, self.channels), dtype=np.float32)
+                out[:len(frames)] += frames * (stream.gain * (1.0 if stream.ducking else duck))
+            if stream.finished:
+                self.remove(stream)
+                self._completions.put((time.monotonic() + self.sink.latency, [stream.done]))
+        self.blocks += 1
+        self.last_block_audible = out is not None
+        if out is None:
+            return self._silence if n == self.block_frames else bytes(n * self.frame_bytes)
+        return np.clip(out, -32768, 32767).astype(np.int16).tobytes()
+
+    def _complete_worker(self):
+        """在输出延迟之后（采样真正从扬声器播出时）完成 mark，回调不在混音线程中执行"""
+        while True:
+            item = self._completions.get()
+            if item is None:
+                break
+            due, futures = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            for future in futures:
+                if not future.done():
+                    future.set_result(True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            streams = list(self._streams)
+        return {"streams": [s.name for s in streams], "underruns": {s.name: s.underruns for s in streams}, "blocks": self.blocks,
+                "latency_ms": round(self.sink.latency * 1000, 1) if self.sink else None}
+
+
+_engine: Optional[AudioEngine] = None
+_engine_lock = threading.Lock()
+
+
+def configure_engine(cfg: configparser.ConfigParser) -> AudioEngine:
+    """按 [Audio] 创建进程共用的音频引擎（已创建时直接返回）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AudioEngine.from_config(cfg)
+        return _engine
+
+
+def get_engine() -> AudioEngine:
+    """进程共用的音频引擎，未配置时使用默认参数"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AudioEngine()
+        return _engine
@@ -0,0 +1,255 @@
+import threading
+from collections import deque
+
+DEFAULT_TOKEN_BUDGET = 6000
+# 每条消息的角色、分隔符等固定开销（粗略值）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 滚动摘要附加在系统提示词之后的引导语
+SUMMARY_HEADER = "\n\n以下是之前对话的摘要：\n"
+
+
+def estimate_tokens(text) -> int:
+    """
+    粗略估算文本的 token 数：中日韩字符及全角符号约 1 字 1 token，其余字符约 4 个 1 token
+    不追求精确，只用于预算控制和统计
+    """
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        # 多模态消息：只统计其中的文本部分
+        return sum(estimate_tokens(part.get("text", "")) for part in text if isinstance(part, dict))
+    wide = 0
+    for ch in text:
+        if ord(ch) >= 0x2E80:
+            wide += 1
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+
+def estimate_message_tokens(msg) -> int:
+    tokens = estimate_tokens(msg.get("content")) + MESSAGE_OVERHEAD_TOKENS
+    # 原生工具调用：函数名和参数同样占用 prompt
+    for call in msg.get("tool_calls") or []:
+        function = call.get("function", {})
+        tokens += estimate_tokens(function.get("name")) + estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+class ContextWindow:
+    """
+    带 token 预算的对话上下文，替代按条数截断 + 每次请求重扫所有助手消息的做法：
+    - 第一条 system 消息固定保留，不参与淘汰
+    - 每条消息只在入队时估算一次 token 数，总数增量维护
+    - 超出预算时只处理最早的一条：过长先压缩为首尾各 N 字，仍超出则淘汰，
+      每条消息最多压缩一次、出队一次，均摊 O(1)
+    prefix_stable 模式下只追加、不改写已有消息：超出预算时不压缩，而是一次性淘汰到
+    low_watermark 比例以下，使请求前缀在多轮之间保持字节级不变，服务端 KV 缓存可以复用
+    带 tool_calls 的助手消息与紧随其后的 tool 结果消息作为一组，一起淘汰，避免留下孤立的工具结果
+    可以挂一段滚动摘要（见 utils.summarizer）：请求时附加在系统提示词之后，apply_summary 用新摘要替换已折叠的最早几组消息
+    对外表现得像 list（append / 下标 / 切片 / 迭代 / len），可以直接替换 LLM_Ollama.messages
+    """
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, compact_chars=100, messages=None, prefix_stable=False, low_watermark=0.6):
+        self.token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+        self.compact_chars = compact_chars
+        self.prefix_stable = prefix_stable
+        self.low_watermark = low_watermark
+        self._lock = threading.RLock()
+        self._system = None
+        self._system_tokens = 0
+        self._summary = ""
+        self._summary_tokens = 0
+        self._turns = deque()
+        self._turn_tokens = deque()
+        self._head_compacted = False
+        self._tokens = 0
+        self.evicted_count = 0
+        self.compacted_count = 0
+        self.summarized_count = 0
+        for msg in messages or []:
+            self.append(msg)
+
+    @property
+    def tokens(self) -> int:
+        """当前上下文（含系统提示词）的估算 token 数，即下一次请求的 prompt token 数"""
+        return self._system_tokens + self._summary_tokens + self._tokens
+
+    @property
+    def turn_tokens(self) -> int:
+        """对话部分（不含系统提示词与摘要）的估算 token 数"""
+        return self._tokens
+
+    @property
+    def system(self):
+        return self._system
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def append(self, msg):
+        with self._lock:
+            if msg.get("role") == "system" and self._system is None and not self._turns:
+                self._system = msg
+                self._system_tokens = estimate_message_tokens(msg)
+            else:
+                tokens = estimate_message_tokens(msg)
+                self._turns.append(msg)
+                self._turn_tokens.append(tokens)
+                self._tokens += tokens
+            self._enforce_budget()
+
+    def extend(self, msgs):
+        for msg in msgs:
+            self.append(msg)
+
+    def clear(self):
+        with self._lock:
+            self._system = None
+            self._system_tokens = 0
+            self._summary = ""
+            self._summary_tokens = 0
+            self._turns.clear()
+            self._turn_tokens.clear()
+            self._head_compacted = False
+            self._tokens = 0
+
+    def _compact(self, msg):
+        """把过长的非用户消息压缩为首尾各 compact_chars 个字符，返回新消息；无需压缩时返回 None"""
+        content = msg.get("content")
+        limit = self.compact_chars
+        if msg.get("role") == "user" or not isinstance(content, str) or len(content) <= 2 * limit:
+            return None
+        compacted = dict(msg)
+        compacted["content"] = content[:limit] + '...' + content[-limit:]
+        return compacted
+
+    def _head_group_size(self) -> int:
+        """最早一组消息的条数：助手消息及其后的 tool 结果消息"""
+        size = 1
+        while size < len(self._turns) and self._turns[size].get("role") == "tool":
+            size += 1
+        return size
+
+    def _evict_head(self):
+        for _ in range(self._head_group_size()):
+            self._turns.popleft()
+            self._tokens -= self._turn_tokens.popleft()
+            self.evicted_count += 1
+        self._head_compacted = False
+
+    def _enforce_budget(self):
+        if self.prefix_stable:
+            self._evict_batch()
+            return
+        # 至少保留最新的一组消息，保证本轮请求有内容
+        while self.tokens > self.token_budget and len(self._turns) > self._head_group_size():
+            if not self._head_compacted:
+                self._head_compacted = True
+                compacted = self._compact(self._turns[0])
+                if compacted is not None:
+                    new_tokens = estimate_message_tokens(compacted)
+                    self._tokens += new_tokens - self._turn_tokens[0]
+                    self._turns[0] = compacted
+                    self._turn_tokens[0] = new_tokens
+                    self.compacted_count += 1
+                    continue
+            self._evict_head()
+
+    def _evict_batch(self):
+        """前缀稳定模式：超出预算时一次淘汰到低水位，之后若干轮内前缀不再变化"""
+        if self.tokens <= self.token_budget:
+            return
+        target = self.token_budget * self.low_watermark
+        while self.tokens > target and len(self._turns) > self._head_group_size():
+            self._evict_head()
+
+    def fold_candidates(self, keep_tokens: int) -> list:
+        """
+        返回应折叠进摘要的最早若干组消息，使剩余对话不超过 keep_tokens；至少保留最新的一组
+        返回的是消息对象本身（不复制），交给 apply_summary 按对象识别
+        """
+        with self._lock:
+            count, tokens = 0, self._tokens
+            while tokens > keep_tokens:
+                size = 1
+                while count + size < len(self._turns) and self._turns[count + size].get("role") == "tool":
+                    size += 1
+                if count + size >= len(self._turns):
+                    break
+                tokens -= sum(self._turn_tokens[i] for i in range(count, count + size))
+                count += size
+            return [self._turns[i] for i in range(count)]
+
+    def apply_summary(self, summary: str, folded) -> int:
+        """
+        设置新的滚动摘要，并移除 folded（fold_candidates 的返回值）中仍留在队首的消息
+        生成摘要期间新追加的消息不受影响；已被预算淘汰或压缩改写的消息按位置一并移除
+        :return: 移除的消息条数
+        """
+        with self._lock:
+            ids = {id(msg) for msg in folded}
+            last = -1
+            for i in range(min(len(folded), len(self._turns))):
+                if id(self._turns[i]) in ids:
+                    last = i
+            for _ in range(last + 1):
+                self._turns.popleft()
+                self._tokens -= self._turn_tokens.popleft()
+            # 折叠按组进行，队首不会留下孤立的 tool 结果；保险起见仍清理一次
+            while self._turns and self._turns[0].get("role") == "tool":
+                self._turns.popleft()
+                self._tokens -= self._turn_tokens.popleft()
+                last += 1
+            self._head_compacted = False
+            self._set_summary(summary)
+            self.summarized_count += last + 1
+            self._enforce_budget()
+            return last + 1
+
+    def _set_summary(self, summary: str):
+        self._summary = summary or ""
+        self._summary_tokens = estimate_tokens(SUMMARY_HEADER + self._summary) if self._summary else 0
+
+    def _head(self) -> list:
+        """请求中的系统消息：有摘要时附加在系统提示词之后（只影响导出，messages[0] 仍是原系统提示词）"""
+        if not self._summary:
+            return [self._system] if self._system is not None else []
+        if self._system is None:
+            return [{"role": "system", "content": SUMMARY_HEADER.lstrip() + self._summary}]
+        return [dict(self._system, content=self._system["content"] + SUMMARY_HEADER + self._summary)]
+
+    def preview_append(self, msgs):
+        """返回追加 msgs 之后的请求消息列表（同样执行预算控制），不修改当前上下文"""
+        window = ContextWindow(token_budget=self.token_budget, compact_chars=self.compact_chars,
+                               prefix_stable=self.prefix_stable, low_watermark=self.low_watermark)
+        with self._lock:
+            if self._system is not None:
+                window.append(self._system)
+            window._set_summary(self._summary)
+            window.extend(list(self._turns) + list(msgs))
+        return window.to_list()
+
+    def to_list(self):
+        """导出为请求用的消息列表"""
+        with self._lock:
+            return self._head() + list(self._turns)
+
+    def __len__(self):
+        return len(self._turns) + (1 if self._system is not None else 0)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        with self._lock:
+            if self._system is not None:
+                if index == 0:
+                    return self._system
+                if index > 0:
+                    index -= 1
+            return self._turns[index]
+
+    def __repr__(self):
+        return repr(self.to_list())
@@ -0,0 +1,115 @@
+from typing import Iterable, List, Optional, Tuple
+
+# 前缀中每个字段的最大长度，超过即认为 dispatcher 没有按格式输出
+MAX_FIELD_CHARS = 16
+# use_tool 只能为 0（闲聊）或 1（需要工具）
+USE_TOOL_VALUES = ('0', '1')
+
+
+def _find_colon(text: str, start: int) -> int:
+    """text[start:] 中第一个半角或全角冒号的位置，没有时返回 -1"""
+    ascii_pos = text.find(':', start)
+    wide_pos = text.find('：', start, ascii_pos if ascii_pos >= 0 else len(text))
+    return wide_pos if wide_pos >= 0 else ascii_pos
+
+
+class DispatchDecision:
+    def __init__(self, use_tool: int, agent_id: int):
+        self.use_tool = use_tool
+        self.agent_id = agent_id
+
+    def __iter__(self):
+        return iter((self.use_tool, self.agent_id))
+
+    def __eq__(self, other):
+        return isinstance(other, DispatchDecision) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"DispatchDecision(use_tool={self.use_tool}, agent_id={self.agent_id})"
+
+
+class DispatchParser:
+    """
+    增量解析 dispatcher 流式输出的 use_tool:agent_id:回复文本 前缀
+    每次 feed 只扫描新到达的 chunk（O(chunk)），第二个冒号到达时立即给出决策，之后的文本原样透传；
+    前缀可以被任意切分在多个 chunk 中，兼容全角冒号、字段两侧空白、use_tool 字面量，
+    以及前面多出一段非数字内容（如 “决策:1:0:...”，只跳过一次）
+    use_tool 必须为 0 或 1，agent_id 必须在 agent_ids 中（None 表示不限），避免把 “10:30:00” 之类的回复当成决策
+    不符合格式时放弃解析，已缓存的原文作为回复文本交还调用方
+    """
+    def __init__(self, agent_ids: Optional[Iterable[int]] = None):
+        self.agent_ids = set(agent_ids) if agent_ids is not None else None
+        self._fields: List[str] = []
+        self._field: List[str] = []
+        self._field_len = 0
+        self._held: List[str] = []
+        self._skipped = False
+        self.decision: Optional[DispatchDecision] = None
+        # 前缀已结束（解析出决策或放弃解析）
+        self.done = False
+
+    def feed(self, chunk: str) -> Tuple[Optional[DispatchDecision], str]:
+        """
+        送入一段新文本
+        :return: (本次新解析出的决策或 None, 本次可以交给 TTS 的回复文本)
+        """
+        if self.done:
+            return None, chunk
+        pos = 0
+        while True:
+            colon = _find_colon(chunk, pos)
+            end = len(chunk) if colon < 0 else colon
+            self._field_len += end - pos
+            if self._field_len > MAX_FIELD_CHARS:
+                return None, self._give_up() + chunk
+            self._field.append(chunk[pos:end])
+            if colon < 0:
+                self._held.append(chunk)
+                return None, ""
+            pos = colon + 1
+            value = ''.join(self._field).strip()
+            self._field, self._field_len = [], 0
+            if value == 'use_tool' and not self._fields:
+                value = '1'
+            # isdecimal：isdigit 会接受 “²” 等 int() 无法解析的字符
+            if not value.isdecimal():
+                # 允许跳过一段前导内容，之后的字段必须是数字
+                if self._fields or self._skipped:
+                    return None, self._give_up() + chunk
+                self._skipped = True
+                continue
+            if not self._valid_field(value):
+                return None, self._give_up() + chunk
+            self._fields.append(value)
+            if len(self._fields) == 2:
+                self.done = True
+                self._held = []
+                self.decision = DispatchDecision(int(self._fields[0]), int(self._fields[1]))
+                return self.decision, chunk[pos:]
+
+    def _valid_field(self, value: str) -> bool:
+        if not self._fields:
+            return value in USE_TOOL_VALUES
+        return self.agent_ids is None or int(value) in self.agent_ids
+
+    def close(self) -> str:
+        """输出结束时调用：返回仍缓存在前缀中的原文（未解析出决策时作为回复文本）"""
+        return "" if self.done else self._give_up()
+
+    def _give_up(self) -> str:
+        self.done = True
+        held = ''.join(self._held)
+        self._held = []
+        return held
+
+
+def parse_decision(text: str, agent_ids: Optional[Iterable[int]] = None) -> Optional[Tuple[int, int, str]]:
+    """
+    一次性解析完整文本
+    :return: (use_tool, agent_id, 回复文本)；不符合格式时返回 None
+    """
+    parser = DispatchParser(agent_ids)
+    decision, rest = parser.feed(text)
+    if decision is None:
+        return None
+    return decision.use_tool, decision.agent_id, rest
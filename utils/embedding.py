@@ -1,4 +1,5 @@
 import requests
+import numpy as np
 # url = 'http://172.21.102.154:5100/embed'
 # url = 'http://172.30.3.7:5100/embed'
 url = 'http://47.108.93.204:5100/embed'
@@ -44,6 +45,15 @@ class Embedding_Text:
                 emb.append([float(item) for item in text_split])
         return emb
 
+    def embed(self, sentences, timeout=None):
+        """
+        批量计算归一化句向量，不打印调试信息
+        :return: float32 矩阵，每行对应一个句子
+        """
+        res = requests.post(url, json={"sentences": list(sentences), "normalize": True}, timeout=timeout)
+        res.raise_for_status()
+        return np.asarray(res.json()["embeddings"], dtype=np.float32)
+
 '''
 embedding_text = Embedding_Text()
 emb = embedding_text.return_embedding('您好！')
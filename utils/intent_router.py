@@ -0,0 +1,207 @@
+import configparser
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from logger import logger
+
+
+class Intent:
+    """
+    一类意图：若干标注样例句 + 目标 Worker + 固定过渡语
+    agent_id 为 None 的意图（如闲聊）只用于拉开与其他意图的区分度，命中时仍交给 dispatcher
+    """
+    def __init__(self, name: str, examples: List[str], agent_id: Optional[int] = None, transition: str = ""):
+        self.name = name
+        self.examples = examples
+        self.agent_id = agent_id
+        self.transition = transition
+
+
+class IntentMatch:
+    def __init__(self, intent: Intent, score: float, margin: float, confident: bool):
+        self.intent = intent
+        self.score = score
+        self.margin = margin
+        # 是否跳过 dispatcher 直接调度
+        self.confident = confident
+
+    @property
+    def agent_id(self):
+        return self.intent.agent_id
+
+    @property
+    def transition(self):
+        return self.intent.transition
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent.name}, score={self.score:.3f}, margin={self.margin:.3f}, confident={self.confident})"
+
+
+class IntentRouter:
+    """
+    基于句向量的意图快速通道：
+    - 所有意图的样例句预先计算归一化句向量，按意图连续存放为一个矩阵
+    - 查询时一次矩阵乘得到与所有样例的余弦相似度，取每个意图的最大值
+    - 最优意图得分 >= threshold 且领先第二名 >= margin 时认为高置信，直接调度对应 Worker
+    embed(sentences, timeout=...) 返回句向量矩阵，默认使用 utils.embedding 的句向量服务；
+    句向量服务不可用或超时时返回 None，由 dispatcher LLM 正常决策
+    """
+    def __init__(self, intents: List[Intent], embed: Optional[Callable] = None, threshold: float = 0.86, margin: float = 0.04,
+                 timeout: float = 0.3, retry_interval: float = 60.0):
+        if embed is None:
+            from utils.embedding import Embedding_Text
+            embed = Embedding_Text().embed
+        self.intents = intents
+        self.embed = embed
+        self.threshold = threshold
+        self.margin = margin
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.matrix: Optional[np.ndarray] = None
+        self._starts: Optional[np.ndarray] = None
+        self._last_build_attempt = 0.0
+        self._lock = threading.Lock()
+        self.stats = IntentRouterStats()
+
+    @classmethod
+    def from_config(cls, cfg: configparser.ConfigParser, embed: Optional[Callable] = None) -> Optional["IntentRouter"]:
+        """
+        从配置文件创建：[IntentRouter] 为路由参数，每个 [Intent.名称] 段落为一类意图
+        （agent_id / transition / examples，examples 以 | 分隔）；未启用或没有意图时返回 None
+        """
+        if not cfg.has_section("IntentRouter") or not cfg.getboolean("IntentRouter", "enabled", fallback=False):
+            return None
+        intents = []
+        for section in cfg.sections():
+            if not section.startswith("Intent."):
+                continue
+            examples = [e.strip() for e in cfg.get(section, "examples", fallback="").split("|") if e.strip()]
+            if not examples:
+                continue
+            agent_id = cfg.getint(section, "agent_id") if cfg.has_option(section, "agent_id") else None
+            intents.append(Intent(section.split(".", 1)[1], examples, agent_id, cfg.get(section, "transition", fallback="")))
+        if not intents:
+            return None
+        return cls(intents, embed,
+                   threshold=cfg.getfloat("IntentRouter", "threshold", fallback=0.86),
+                   margin=cfg.getfloat("IntentRouter", "margin", fallback=0.04),
+                   timeout=cfg.getfloat("IntentRouter", "timeout", fallback=0.3))
+
+    def build(self, blocking: bool = True) -> bool:
+        """
+        计算所有样例句的句向量矩阵；失败时 retry_interval 秒后在下一次查询时重试
+        blocking=False 时如果其他线程正在计算则直接返回 False，不阻塞查询
+        """
+        if self.matrix is not None:
+            return True
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if self.matrix is not None:
+                return True
+            now = time.monotonic()
+            if self._last_build_attempt and now - self._last_build_attempt < self.retry_interval:
+                return False
+            self._last_build_attempt = now
+            examples = [example for intent in self.intents for example in intent.examples]
+            try:
+                matrix = np.asarray(self.embed(examples, timeout=10), dtype=np.float32)
+            except Exception as e:
+                logger.warning(f"意图样例句向量计算失败，{self.retry_interval:.0f}s 后重试: {e}")
+                return False
+            # 服务端已归一化，这里再归一化一次，保证点积即余弦相似度
+            self._starts = np.cumsum([0] + [len(intent.examples) for intent in self.intents[:-1]])
+            self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            logger.info(f"意图快速通道已就绪: {len(self.intents)} 类意图，{len(examples)} 条样例")
+            return True
+        finally:
+            self._lock.release()
+
+    def build_async(self):
+        """后台预先计算样例矩阵，避免第一次查询时等待"""
+        threading.Thread(target=self.build, daemon=True, name="intent-router-build").start()
+
+    def classify(self, query: str) -> Optional[IntentMatch]:
+        """
+        计算查询与各意图的相似度
+        :return: 最接近的意图（confident 表示可以跳过 dispatcher）；句向量不可用时返回 None
+        """
+        if not query or not self.build(blocking=False):
+            return None
+        try:
+            vector = np.asarray(self.embed([query], timeout=self.timeout), dtype=np.float32)[0]
+        except Exception as e:
+            logger.warning(f"查询句向量计算失败，交给 dispatcher: {e}")
+            return None
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        # 每个意图取其样例中的最高相似度
+        scores = np.maximum.reduceat(self.matrix @ vector, self._starts)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(order) > 1 else -1.0
+        intent = self.intents[order[0]]
+        confident = intent.agent_id is not None and best >= self.threshold and best - second >= self.margin
+        return IntentMatch(intent, best, best - second, confident)
+
+    def route(self, query: str) -> Optional[IntentMatch]:
+        """高置信时返回匹配结果，否则返回 None"""
+        match = self.classify(query)
+        return match if match and match.confident else None
+
+    def evaluate(self, samples: List[Dict]) -> Dict:
+        """
+        离线评估：samples 为 [{"text": 查询, "agent_id": dispatcher 应调度的 Worker（闲聊为 None）}]
+        :return: 跳过率与被跳过查询的准确率
+        """
+        self.build()
+        bypassed = correct = 0
+        for sample in samples:
+            match = self.route(sample["text"])
+            if match:
+                bypassed += 1
+                correct += int(match.agent_id == sample.get("agent_id"))
+        return {
+            "samples": len(samples),
+            "bypassed": bypassed,
+            "bypass_rate": round(bypassed / len(samples), 3) if samples else 0.0,
+            "accuracy": round(correct / bypassed, 3) if bypassed else None,
+        }
+
+
+class IntentRouterStats:
+    """
+    线上统计：
+    - bypass_rate：跳过 dispatcher 的请求占比
+    - agreement：未跳过的请求中，最接近的意图与 dispatcher 实际决策一致的比例（估计快速通道的准确率，用于调整阈值）
+    """
+    def __init__(self):
+        self.total = 0
+        self.bypassed = 0
+        self.compared = 0
+        self.agreed = 0
+        self._lock = threading.Lock()
+
+    def record_bypass(self):
+        with self._lock:
+            self.total += 1
+            self.bypassed += 1
+
+    def record_fallback(self, match: Optional[IntentMatch], use_tool: Optional[int], agent_id: Optional[int]):
+        """dispatcher 做出决策后记录；use_tool 为 None 表示未解析出决策"""
+        with self._lock:
+            self.total += 1
+            if match is None or use_tool is None:
+                return
+            self.compared += 1
+            decided = agent_id if use_tool else None
+            self.agreed += int(match.agent_id == decided)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "bypassed": self.bypassed,
+                "bypass_rate": round(self.bypassed / self.total, 3) if self.total else 0.0,
+                "agreement": round(self.agreed / self.compared, 3) if self.compared else None,
+            }
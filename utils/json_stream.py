@@ -0,0 +1,70 @@
+import json
+from typing import Dict, List
+
+
+class JsonObjectScanner:
+    """
+    增量扫描文本流中的顶层 JSON 对象
+    每次 feed 只处理新到达的字符（O(chunk)），正确处理字符串中的括号与转义、
+    任意层嵌套（如 params 中的对象），一段文本中可以包含多个对象
+    """
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buf: List[str] = []
+        self.objects: List[Dict] = []
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        送入一段新文本
+        :return: 本次新闭合并成功解析的 JSON 对象列表
+        """
+        closed = []
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._buf = ['{']
+                continue
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads(''.join(self._buf))
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        closed.append(obj)
+                    self._buf = []
+        self.objects.extend(closed)
+        return closed
+
+    def close(self) -> str:
+        """
+        输出结束时调用：返回未闭合对象中缓存的原文（从未配对的 “{” 开始），作为普通文本交还调用方，并重置状态
+        """
+        held = ''.join(self._buf) if self._depth > 0 else ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buf = []
+        return held
+
+    @property
+    def pending(self) -> bool:
+        """是否有尚未闭合的对象"""
+        return self._depth > 0
@@ -0,0 +1,130 @@
+import threading
+import time
+from typing import Dict, Optional
+from logger import logger
+
+# 预测结果中表示“闲聊、不需要 Worker”的键
+NO_WORKER = -1
+
+
+class WorkerPrior:
+    """
+    基于历史决策的 Worker 先验：统计 dispatcher 过去的调度结果（带指数衰减，更关注最近几轮），
+    预测本轮最可能被调度的 agent_id
+    """
+    def __init__(self, decay: float = 0.9, alpha: float = 0.5):
+        self.decay = decay
+        self.alpha = alpha
+        self.counts: Dict[int, float] = {}
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    def observe(self, use_tool: int, agent_id: int):
+        key = agent_id if use_tool else NO_WORKER
+        with self._lock:
+            for k in self.counts:
+                self.counts[k] *= self.decay
+            self.counts[key] = self.counts.get(key, 0.0) + 1.0
+            self.observations += 1
+
+    def predict(self):
+        """
+        :return: (agent_id, 概率)；没有历史或最可能的是闲聊时返回 (None, 概率)
+        """
+        with self._lock:
+            if not self.counts:
+                return None, 0.0
+            total = sum(self.counts.values()) + self.alpha * len(self.counts)
+            key, count = max(self.counts.items(), key=lambda item: item[1])
+            prob = (count + self.alpha) / total
+        return (None if key == NO_WORKER else key), prob
+
+
+class SpeculativeRun:
+    """
+    一次投机执行：在后台线程中用预测的 Worker 预先生成第一轮回复，
+    dispatcher 决策后由框架决定 commit（复用结果）或 cancel（中止生成并丢弃）
+    """
+    def __init__(self, worker, request_messages):
+        self.worker = worker
+        self.agent_id = worker.id
+        self.request_messages = request_messages
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self.response: Optional[str] = None
+        self.start_time = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.response = self.worker.llm.complete(self.request_messages, self.worker.model_name, cancel_event=self.cancel_event)
+        except Exception as e:
+            logger.error(f"投机执行异常: {e}")
+            self.response = None
+        finally:
+            self.end_time = time.perf_counter()
+            self.done_event.set()
+
+    def matches(self, agent_id: int, request_messages) -> bool:
+        """dispatcher 的决策与投机时的 Worker 及其上下文完全一致时才能复用结果"""
+        return agent_id == self.agent_id and request_messages == self.request_messages
+
+    def result(self) -> Optional[str]:
+        """等待投机生成结束并返回原始回复；被取消或失败时返回 None"""
+        self.done_event.wait()
+        return self.response
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class SpeculationStats:
+    """投机执行统计：命中率与节省的延迟"""
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record_hit(self, run: SpeculativeRun, decision_time: float):
+        # 节省的时间 = 投机生成在 dispatcher 决策前已经跑过的时长
+        head_start = min(decision_time, run.end_time or decision_time) - run.start_time
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+            self.saved_seconds += max(head_start, 0.0)
+        logger.info(f"投机执行命中: agent {run.agent_id}，提前 {head_start*1000:.0f} ms 开始生成")
+
+    def record_miss(self, run: SpeculativeRun, reason: str):
+        wasted = (run.end_time or time.perf_counter()) - run.start_time
+        with self._lock:
+            self.attempts += 1
+            self.misses += 1
+            self.wasted_seconds += wasted
+        logger.info(f"投机执行未命中({reason}): agent {run.agent_id}，已取消")
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hit_rate, 3),
+                "saved_ms_total": round(self.saved_seconds * 1000),
+                "saved_ms_avg": round(self.saved_seconds * 1000 / self.hits) if self.hits else 0,
+                "wasted_ms_total": round(self.wasted_seconds * 1000),
+            }
@@ -0,0 +1,123 @@
+import configparser
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from logger import logger
+from utils.dispatch_parser import parse_decision
+
+SUMMARY_PROMPT = """你负责压缩一段人与语音助手的对话历史。
+把【已有摘要】和【新的对话记录】合并成一段新的摘要：保留用户的称呼、偏好、提到的事实、尚未完成的请求和重要的工具结果，省略寒暄和过渡语。
+只输出摘要正文，不要分点，不超过 {max_chars} 字。"""
+
+ROLE_NAMES = {"user": "用户", "assistant": "助手", "tool": "工具结果"}
+
+
+class ConversationSummarizer:
+    """
+    后台对话摘要：某个上下文的对话部分超过预算的 trigger 比例时，把最早的若干组消息连同旧摘要交给模型，
+    生成新的滚动摘要替换它们，只保留预算 keep 比例以内的最近对话
+    - 在一轮结束（语音播放完）后调度，在单独的线程池中请求模型，不占用当前轮次
+    - 同一会话开始新一轮时取消该会话尚未完成的摘要（yield_to_turn），下一轮结束后重新调度；
+      摘要模型部署在单独的端点、不与对话争用推理资源时可以关闭 yield_to_turns
+    - 摘要写回时只移除仍在队首的已折叠消息，期间新追加的消息不受影响；上下文的硬预算淘汰仍作为兜底
+    :param model: 生成摘要的模型，不配置时使用该上下文自己的模型
+    """
+    def __init__(self, model: Optional[str] = None, trigger: float = 0.7, keep: float = 0.3, max_chars: int = 300,
+                 message_chars: int = 200, yield_to_turns: bool = True, workers: int = 1):
+        self.model = model
+        self.trigger = trigger
+        self.keep = keep
+        self.max_chars = max_chars
+        # 每条消息写入摘要请求时的最大字符数（如很长的工具结果）
+        self.message_chars = message_chars
+        self.yield_to_turns = yield_to_turns
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="summarizer")
+        # id(ContextWindow) -> 取消事件，同一上下文同时只有一个摘要任务
+        self._pending: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"scheduled": 0, "applied": 0, "cancelled": 0, "failed": 0}
+
+    @classmethod
+    def from_config(cls, cfg: configparser.ConfigParser) -> Optional["ConversationSummarizer"]:
+        """从 [Summary] 段落创建；未启用时返回 None"""
+        if not cfg.has_section("Summary") or not cfg.getboolean("Summary", "enabled", fallback=False):
+            return None
+        return cls(model=cfg.get("Summary", "model_name", fallback="") or None,
+                   trigger=cfg.getfloat("Summary", "trigger", fallback=0.7),
+                   keep=cfg.getfloat("Summary", "keep", fallback=0.3),
+                   max_chars=cfg.getint("Summary", "max_chars", fallback=300),
+                   message_chars=cfg.getint("Summary", "message_chars", fallback=200),
+                   yield_to_turns=cfg.getboolean("Summary", "yield_to_turns", fallback=True))
+
+    def maybe_schedule(self, llm, llm_model: str) -> bool:
+        """
+        llm（LLM_Ollama）的对话部分超过触发比例时提交一次后台摘要，不阻塞调用方
+        :return: 是否提交了摘要任务
+        """
+        window = llm.messages
+        available = window.token_budget - window.tokens + window.turn_tokens
+        if window.turn_tokens <= available * self.trigger:
+            return False
+        folded = window.fold_candidates(int(available * self.keep))
+        if not folded:
+            return False
+        with self._lock:
+            if id(window) in self._pending:
+                return False
+            cancel_event = threading.Event()
+            self._pending[id(window)] = cancel_event
+            self.stats["scheduled"] += 1
+        self._executor.submit(self._run, llm, window, folded, self.model or llm_model, cancel_event)
+        return True
+
+    def yield_to_turn(self, *llms):
+        """新一轮开始：取消这些上下文尚未完成的摘要请求，把推理资源让给当前轮次"""
+        if not self.yield_to_turns:
+            return
+        with self._lock:
+            for llm in llms:
+                cancel_event = self._pending.get(id(llm.messages))
+                if cancel_event is not None:
+                    cancel_event.set()
+
+    def _run(self, llm, window, folded: List[Dict], llm_model: str, cancel_event: threading.Event):
+        try:
+            messages = [{"role": "system", "content": SUMMARY_PROMPT.format(max_chars=self.max_chars)},
+                        {"role": "user", "content": "/no_think\n" + self._render(window.summary, folded)}]
+            summary = llm.complete(messages, llm_model, cancel_event=cancel_event)
+            if summary is None or cancel_event.is_set():
+                self.stats["cancelled"] += 1
+                return
+            summary = summary.split('</think>')[-1].strip()[:self.max_chars]
+            # 期间上下文被整体替换（如重建系统提示词）时放弃本次结果
+            if not summary or llm.messages is not window:
+                self.stats["cancelled"] += 1
+                return
+            removed = window.apply_summary(summary, folded)
+            self.stats["applied"] += 1
+            logger.info(f"对话摘要: 折叠 {removed} 条消息，上下文 ≈{window.tokens}/{window.token_budget} tokens")
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"对话摘要失败: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(id(window), None)
+
+    def _render(self, summary: str, folded: List[Dict]) -> str:
+        lines = []
+        for msg in folded:
+            content = msg.get("content") or ""
+            if not isinstance(content, str):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            content = content.replace("/no_think\n", "").strip()
+            if msg.get("role") == "assistant":
+                # dispatcher 的回复带有 use_tool:agent_id: 前缀
+                decision = parse_decision(content)
+                if decision:
+                    content = decision[2].strip()
+            if len(content) > self.message_chars:
+                content = content[:self.message_chars] + "..."
+            if content:
+                lines.append(f"{ROLE_NAMES.get(msg.get('role'), msg.get('role'))}: {content}")
+        return f"【已有摘要】\n{summary or '无'}\n\n【新的对话记录】\n" + "\n".join(lines)
@@ -0,0 +1,190 @@
+"""
+工具清单：用 AST 解析 tools/ 下各模块中 @tool 修饰的函数（名称、描述、参数签名、docstring 等），
+不导入模块即可生成工具提示词与 function calling 描述；结果按模块源码的 sha1 缓存在 tools/tool_manifest.json
+
+无法静态解析的模块（装饰器参数不是字面量或模块级常量、调用 register_tool、注解无法求值等）标记为 eager，
+仍在启动时导入
+
+用法（重新生成清单并输出各模块的解析结果）:
+    python -m utils.tool_manifest
+"""
+import ast
+import hashlib
+import json
+import os
+import typing
+from typing import Any, Dict, List, Optional
+
+MANIFEST_FILE = "tool_manifest.json"
+MANIFEST_VERSION = 1
+# @tool 的位置参数顺序
+TOOL_ARGS = ["name", "description", "audioSyncMode", "timeout", "models"]
+# 参数注解求值时可用的名称：内置类型与 typing
+ANNOTATION_NAMESPACE = {name: getattr(typing, name) for name in typing.__all__}
+ANNOTATION_NAMESPACE["typing"] = typing
+# 可以原样写入 JSON 的默认值类型
+_JSON_SCALARS = (type(None), bool, int, float, str)
+
+
+class _Unresolvable(Exception):
+    pass
+
+
+def eval_annotation(source: Optional[str]):
+    """把清单中的注解源码还原为注解对象（与导入模块后 inspect.signature 得到的相同）"""
+    return eval(source, dict(ANNOTATION_NAMESPACE)) if source else None
+
+
+def _value(node: ast.AST, constants: Dict[str, Any]):
+    """装饰器参数的值：字面量、模块级常量，或由它们组成的列表"""
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_value(elt, constants) for elt in node.elts]
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise _Unresolvable(ast.unparse(node))
+
+
+def _is_tool_decorator(node: ast.AST) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    return (isinstance(func, ast.Name) and func.id == "tool") or (isinstance(func, ast.Attribute) and func.attr == "tool")
+
+
+def _parameters(func: ast.FunctionDef, constants: Dict[str, Any]) -> List[Dict]:
+    args = func.args
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    entries = []
+
+    def add(arg: ast.arg, kind: str, default: Optional[ast.AST]):
+        entry = {"name": arg.arg, "kind": kind, "annotation": ast.unparse(arg.annotation) if arg.annotation else None,
+                 "has_default": default is not None}
+        if entry["annotation"]:
+            try:
+                eval_annotation(entry["annotation"])
+            except Exception:
+                raise _Unresolvable(entry["annotation"])
+        if default is not None:
+            value = _value(default, constants)
+            if not isinstance(value, _JSON_SCALARS):
+                raise _Unresolvable(ast.unparse(default))
+            entry["default"] = value
+        entries.append(entry)
+
+    for i, arg in enumerate(positional):
+        add(arg, "POSITIONAL_ONLY" if i < len(args.posonlyargs) else "POSITIONAL_OR_KEYWORD", defaults[i])
+    if args.vararg:
+        add(args.vararg, "VAR_POSITIONAL", None)
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        add(arg, "KEYWORD_ONLY", default)
+    if args.kwarg:
+        add(args.kwarg, "VAR_KEYWORD", None)
+    return entries
+
+
+def scan_module(source: bytes) -> Dict:
+    """
+    解析一个工具模块的源码
+    :return: {"sha1", "eager", "reason", "tools": [...]}，eager 为 True 时启动时照常导入
+    """
+    entry = {"sha1": hashlib.sha1(source).hexdigest(), "eager": False, "reason": None, "tools": []}
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        entry.update(eager=True, reason=f"语法错误: {e}")
+        return entry
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                constants[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "register_tool":
+            entry.update(eager=True, reason="调用了 register_tool")
+            return entry
+    try:
+        for node in tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            for decorator in node.decorator_list:
+                if not _is_tool_decorator(decorator):
+                    continue
+                options = {key: None for key in TOOL_ARGS}
+                for key, arg in zip(TOOL_ARGS, decorator.args):
+                    options[key] = _value(arg, constants)
+                for keyword in decorator.keywords:
+                    if keyword.arg not in options:
+                        raise _Unresolvable(f"未知参数 {keyword.arg}")
+                    options[keyword.arg] = _value(keyword.value, constants)
+                entry["tools"].append({
+                    "function": node.name,
+                    **options,
+                    "parameters": _parameters(node, constants),
+                    "return_annotation": ast.unparse(node.returns) if node.returns else None,
+                    "doc": ast.get_docstring(node, clean=False),
+                })
+                if node.returns:
+                    eval_annotation(entry["tools"][-1]["return_annotation"])
+    except Exception as e:
+        entry.update(eager=True, reason=f"无法静态解析: {e}", tools=[])
+    return entry
+
+
+def tool_module_files(directory: str) -> Dict[str, str]:
+    """工具目录下的模块名 -> 文件路径（与 ToolRegistry.load_tools_from_directory 的规则相同）"""
+    return {filename[:-3]: os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+            if filename.endswith('.py') and filename != '__init__.py'}
+
+
+def load_manifest(directory: str, write: bool = True) -> Dict[str, Dict]:
+    """
+    读取工具清单，源码有变化（sha1 不一致）或新增的模块重新解析；有更新且 write=True 时写回清单文件
+    :return: 模块名 -> 模块条目
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    cached = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            cached = data.get("modules", {})
+    except (OSError, ValueError):
+        pass
+    modules, changed = {}, False
+    for module_name, file_path in tool_module_files(directory).items():
+        with open(file_path, "rb") as f:
+            source = f.read()
+        entry = cached.get(module_name)
+        if entry is None or entry.get("sha1") != hashlib.sha1(source).hexdigest():
+            entry = scan_module(source)
+            changed = True
+        modules[module_name] = entry
+    if write and (changed or set(cached) != set(modules)):
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "modules": modules}, f, ensure_ascii=False, indent=1)
+        except OSError:
+            pass
+    return modules
+
+
+def main():
+    directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+    path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+    modules = load_manifest(directory)
+    for module_name, entry in modules.items():
+        names = ", ".join(t["name"] or t["function"] for t in entry["tools"])
+        print(f"{module_name:20s} {'eager（' + entry['reason'] + '）' if entry['eager'] else '按需加载'}  {names}")
+    print(f"\n已写入 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from logger import logger
+
+DEFAULT_TRACE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logger', 'logs', 'traces.jsonl')
+# 统计各阶段耗时的基准事件：有用户说话结束时间时以它为 0 点，否则以轮次开始为 0 点
+ANCHOR_EVENT = "asr.end_of_speech"
+
+# 当前协程/线程所属的轮次；新线程不会继承，此时退回到最近开始的轮次
+_current_turn = contextvars.ContextVar("trace_turn_id", default=None)
+
+
+class _Turn:
+    def __init__(self, turn_id: str):
+        self.turn_id = turn_id
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.events: List[Dict] = []
+        self.spans: List[Dict] = []
+        self.lock = threading.Lock()
+
+    def offset_ms(self, t: float) -> float:
+        return round((t - self.start) * 1000, 1)
+
+    def record(self) -> Dict:
+        with self.lock:
+            return {
+                "turn_id": self.turn_id,
+                "start": self.wall_start,
+                "duration_ms": self.offset_ms(time.perf_counter()),
+                "events": list(self.events),
+                "spans": list(self.spans),
+            }
+
+
+class Tracer:
+    """
+    按轮次记录一次交互从麦克风到最后一个音频采样的各阶段耗时：
+    - mark(name)：记录时间点（相对轮次开始的毫秒数）
+    - span(name)：记录一段操作的开始时间与耗时
+    - end_turn()：把本轮记录追加写入 JSONL，并保留最近若干轮用于 summary() 统计 p50/p95
+    轮次 id 通过 contextvar 在协程间传递；其他线程中没有 contextvar 时使用最近开始的轮次，
+    也可以显式传入 turn_id（如 TTS 线程按文本入队时所属的轮次记录）
+    """
+    def __init__(self, path: str = DEFAULT_TRACE_PATH, enabled: bool = True, history: int = 1000):
+        self.path = path
+        self.enabled = enabled
+        self._turns: Dict[str, _Turn] = {}
+        self._latest_turn_id: Optional[str] = None
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, path: Optional[str] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if path:
+            self.path = path
+
+    def start_turn(self, turn_id: Optional[str] = None) -> Optional[str]:
+        if not self.enabled:
+            return None
+        turn_id = turn_id or uuid.uuid4().hex[:12]
+        with self._lock:
+            # 同一上下文中上一轮未结束（如 ASR 没有识别到内容）时直接丢弃
+            self._turns.pop(_current_turn.get(), None)
+            self._turns[turn_id] = _Turn(turn_id)
+            self._latest_turn_id = turn_id
+        _current_turn.set(turn_id)
+        return turn_id
+
+    def current_turn_id(self) -> Optional[str]:
+        turn_id = _current_turn.get()
+        with self._lock:
+            if turn_id in self._turns:
+                return turn_id
+            return self._latest_turn_id
+
+    def ensure_turn(self) -> Optional[str]:
+        """
+        当前上下文没有进行中的轮次时开始一个新轮次（如不经过 ASR、直接调用 process_user_query）
+        只看 contextvar，不退回到最近的轮次，避免并发会话共用同一轮
+        """
+        turn_id = _current_turn.get()
+        with self._lock:
+            if turn_id in self._turns:
+                return turn_id
+        return self.start_turn()
+
+    def _get(self, turn_id: Optional[str]) -> Optional[_Turn]:
+        if not self.enabled:
+            return None
+        turn_id = turn_id or self.current_turn_id()
+        with self._lock:
+            return self._turns.get(turn_id)
+
+    def mark(self, name: str, turn_id: Optional[str] = None, once: bool = False, **attrs):
+        """记录一个时间点；once=True 时同一轮只记录第一次（如首个音频块）"""
+        turn = self._get(turn_id)
+        if turn is None:
+            return
+        now = time.perf_counter()
+        with turn.lock:
+            if once and any(event["name"] == name for event in turn.events):
+                return
+            turn.events.append({"name": name, "t_ms": turn.offset_ms(now), **attrs})
+
+    @contextmanager
+    def span(self, name: str, turn_id: Optional[str] = None, **attrs):
+        """记录一段操作的耗时，异常时附带 error 字段后继续抛出"""
+        turn = self._get(turn_id)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if turn is not None:
+                end = time.perf_counter()
+                item = {"name": name, "t_ms": turn.offset_ms(start), "duration_ms": round((end - start) * 1000, 1), **attrs}
+                if error:
+                    item["error"] = error
+                with turn.lock:
+                    turn.spans.append(item)
+
+    def end_turn(self, turn_id: Optional[str] = None) -> Optional[Dict]:
+        """结束轮次并写入 JSONL，返回本轮记录"""
+        if not self.enabled:
+            return None
+        turn_id = turn_id or self.current_turn_id()
+        with self._lock:
+            turn = self._turns.pop(turn_id, None)
+            if self._latest_turn_id == turn_id:
+                self._latest_turn_id = None
+        if _current_turn.get() == turn_id:
+            _current_turn.set(None)
+        if turn is None:
+            return None
+        record = turn.record()
+        self._history.append(record)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"写入 trace 失败: {e}")
+        return record
+
+    @staticmethod
+    def stage_values(record: Dict) -> Dict[str, float]:
+        """一轮记录中各阶段的耗时：时间点取相对基准事件的毫秒数，span 取持续时间（同名多次时求和）"""
+        anchor = next((e["t_ms"] for e in record["events"] if e["name"] == ANCHOR_EVENT), 0.0)
+        values = {}
+        for event in record["events"]:
+            # 同名事件取最后一次（如一轮中多次等待播放完成，以最后一次为准）
+            if event["name"] != ANCHOR_EVENT:
+                values[event["name"]] = event["t_ms"] - anchor
+        for span in record["spans"]:
+            values[span["name"]] = values.get(span["name"], 0.0) + span["duration_ms"]
+        return values
+
+    def summary(self, records: Optional[List[Dict]] = None) -> Dict[str, Dict]:
+        """
+        统计最近若干轮（或给定记录，如从 JSONL 读回的）各阶段的 p50/p95（毫秒）
+        """
+        stages: Dict[str, List[float]] = {}
+        for record in (records if records is not None else list(self._history)):
+            for name, value in self.stage_values(record).items():
+                stages.setdefault(name, []).append(value)
+        result = {}
+        for name, values in stages.items():
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "p50_ms": round(_percentile(values, 0.5), 1),
+                "p95_ms": round(_percentile(values, 0.95), 1),
+            }
+        return result
+
+    def log_summary(self):
+        for name, item in sorted(self.summary().items(), key=lambda kv: kv[1]["p50_ms"]):
+            logger.info(f"trace 阶段 {name}: {item}")
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = (len(sorted_values) - 1) * p
+    low = int(index)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (index - low)
+
+
+def load_traces(path: str = DEFAULT_TRACE_PATH) -> List[Dict]:
+    """读取 JSONL trace 文件"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+# 全局 tracer：ASR、dispatcher、worker、TTS 共用
+tracer = Tracer()
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRACE_PATH
+    for stage, item in sorted(tracer.summary(load_traces(path)).items(), key=lambda kv: kv[1]["p50_ms"]):
+        print(f"{stage:32s} n={item['count']:<5d} p50={item['p50_ms']:>8.1f} ms  p95={item['p95_ms']:>8.1f} ms")
@@ -1,40 +1,96 @@
 import asyncio
 import edge_tts
-import subprocess  # 替换 pyaudio 为 subprocess
 import queue
 import threading
 import time
 import re
-import shutil
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Optional
 from logger import logger
+from utils.tracing import tracer
+from utils.audio_engine import AudioEngine, get_engine
+from utils.tts_cache import PhraseCache
 # from loguru import logger
 # 假设 text_splitter 在 utils 包下，如果在其他位置请调整引用
 from utils.text_splitter import TextSplitter
 # from text_splitter import TextSplitter
+
+
+class _Utterance:
+    """一次 add_text 的文本：它的音频全部写入引擎后在引擎中放一个 mark，播放到这个采样位置时 future 结果为 True，被打断为 False"""
+    def __init__(self, turn_id, generation: int):
+        self.turn_id = turn_id
+        self.generation = generation
+        self.future = Future()
+
+    def finish(self, played: bool):
+        if not self.future.done():
+            self.future.set_result(played)
+            if played:
+                tracer.mark("tts.playback_done", turn_id=self.turn_id)
+
+
+class _Segment:
+    """一个分段：在事件循环中合成，音频块按到达顺序放入 chunks，以 None 结束"""
+    def __init__(self, text: str, turn_id, ready_at: float, generation: int):
+        self.text = text
+        self.turn_id = turn_id
+        # 所属文本调用 add_text 的时间
+        self.ready_at = ready_at
+        # 提交时的打断代数，interrupt() 之后旧分段不再输出
+        self.generation = generation
+        self.chunks = queue.Queue()
+        self.future: Optional[Future] = None
+
+
 class CosyTTS:
-    def __init__(self, voice="zh-CN-XiaoxiaoNeural"):
+    def __init__(self, voice="zh-CN-XiaoxiaoNeural", communicate_cls=None, engine: Optional[AudioEngine] = None, lookahead: int = 3,
+                 cache: Optional[PhraseCache] = None):
+        """
+        :param communicate_cls: 语音合成类，接口同 edge_tts.Communicate(text, voice).stream()，默认 edge_tts
+        :param engine: 音频输出引擎，默认进程共用的 get_engine()；合成的 mp3 写入其中常驻的 "tts" 音源
+        两者可替换为本地实现（如 benchmarks 中的离线替身）
+        :param lookahead: 同时合成的分段数（含正在输出的一段），1 为逐段合成
+        :param cache: 短语音频缓存，命中的分段直接输出缓存的音频，不请求合成服务
+        """
         # server_ip 和 server_port 在 edge_tts 中不需要，保留以维持接口一致
         self.voice = voice 
-        
-        # 检查 ffplay 是否可用
-        if not shutil.which("ffplay"):
-            logger.error("未找到 ffplay，请确保安装了 FFmpeg 并将其加入了系统环境变量 PATH 中。")
+        self.communicate_cls = communicate_cls or edge_tts.Communicate
+        # 常驻的 TTS 音源：解码器、PCM 缓冲与声卡在整个会话中保持打开，播报时压低音乐
+        self.engine = engine or get_engine()
+        self.output = self.engine.open_stream("tts", fmt="mp3", ducking=True)
         
         # 文本队列：接收外部传入的完整文本
         self.text_queue = queue.Queue()
-        # 音频队列：存放待播放的音频数据块 (bytes)
+        # 音频队列：按顺序存放待播放的音频数据块 (bytes, 打断代数) 与每段文本的结束标记 _Utterance
         self.audio_queue = queue.Queue()
-        # 控制队列：用于接收播放控制信号（如刷新、停止）
-        self.control_queue = queue.Queue()
-        
-        # 播放完成事件：用于通知 wait_until_done 方法播放已完成
-        self.playback_done_event = threading.Event()
+        # 最近一次 add_text 的文本；各段文本按顺序播完，它完成时之前的文本都已播完
+        self._last_utterance: Optional[_Utterance] = None
         
         self.splitter = TextSplitter()
         self.is_running = False
-        
-        # 播放进程句柄
-        self.player_process = None
+        # 预合成：合成线程最多提前提交 lookahead 段到常驻事件循环并发合成，输出线程按分段顺序写入 audio_queue
+        self.lookahead = max(1, lookahead)
+        self._slots = threading.Semaphore(self.lookahead)
+        self._pending = queue.Queue()
+        self._loop = None
+        # 空闲后第一段的首个音频块延迟（从 add_text 起）与连续播报时相邻分段之间的空档（秒）
+        self.first_audio_times = deque(maxlen=200)
+        self.segment_gaps = deque(maxlen=200)
+        self.cache = cache
+        # 打断（barge-in）：每次 interrupt() 代数加一，之前提交的文本、分段与音频块全部作废
+        self._generation = 0
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+        # 多次打断逐个进行
+        self._interrupt_lock = threading.Lock()
+        # interrupt() 从调用到清空待播音频（下一个混音块起静音）的耗时（秒）
+        self.interrupt_latencies = deque(maxlen=200)
+        # 等待播放完成的上限：待播音频时长之外再等多少秒；这段时间内合成与播放都没有进展（输出卡住、线程退出）时放弃等待
+        self.playback_margin = 10.0
+        # 播放线程处理过的音频块与结束标记数，用于判断是否还有进展
+        self._handled = 0
         
         # 启动工作线程
         self.start()
@@ -45,194 +101,265 @@ class CosyTTS:
             return
         self.is_running = True
         
-        # 1. 合成线程：取文本 -> 分词 -> 请求API -> 存入音频队列
+        # 0. 常驻事件循环：所有分段的合成协程都在这里运行，不再每段 asyncio.run 一次
+        self._loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="tts-loop")
+        self.loop_thread.start()
+        
+        # 1. 合成线程：取文本 -> 分词 -> 提交合成；输出线程：按分段顺序把音频块存入音频队列
         self.synth_thread = threading.Thread(target=self._synthesis_worker, daemon=True)
         self.synth_thread.start()
+        self.emit_thread = threading.Thread(target=self._emit_worker, daemon=True, name="tts-emit")
+        self.emit_thread.start()
         
         # 2. 播放线程：取音频队列 -> 播放
         self.play_thread = threading.Thread(target=self._player_worker, daemon=True)
         self.play_thread.start()
         
-        logger.info("EdgeTTS 服务已启动 (使用 ffplay 播放)")
+        logger.info("EdgeTTS 服务已启动 (经音频引擎播放)")
 
-    def add_text(self, text: str):
+    def add_text(self, text: str) -> Future:
         """
         [外部接口] 添加文本到播放列表
+        返回这段文本的播放完成 Future：引擎实际播放到它最后一个采样时结果为 True，被打断（或 TTS 已停止）时为 False；
+        调用方可以只等自己的这段话（.result()，或在事件循环中 await asyncio.wrap_future(...)），不必等全部播完
         """
+        utterance = _Utterance(tracer.current_turn_id(), self._generation)
         if not text:
-            return
+            utterance.finish(True)
+            return utterance.future
         logger.info(f"TTS 收到文本: {text[:20]}...")
-        self.text_queue.put(text)
+        tracer.mark("tts.first_text", turn_id=utterance.turn_id, once=True)
+        self._last_utterance = utterance
+        self.text_queue.put((text, time.perf_counter(), utterance))
+        return utterance.future
+
+    @property
+    def speaking(self) -> bool:
+        """还有文本未合成、音频未写入引擎，或已写入的音频还没播完"""
+        return bool(self.text_queue.unfinished_tasks or self.audio_queue.unfinished_tasks or self.output.active)
+
+    def interrupt(self) -> float:
+        """
+        [外部接口] 用户打断：丢弃未合成的文本与未播放的音频，取消进行中的合成，清空引擎中已解码待播的音频
+        之后 add_text 的文本照常播报；返回从调用到清空的耗时（秒），扬声器在下一个混音块起静音
+        """
+        start = time.perf_counter()
+        with self._interrupt_lock:
+            self._generation += 1
+            # 1. 引擎中待播的音频：清空缓冲并重启解码器（也会唤醒阻塞在写入上的播放线程）
+            self.output.clear()
+            # 2. 文本队列：未开始合成的文本直接作废
+            dropped = [utterance for _, _, utterance in self._drain(self.text_queue, keep_sentinel=True)]
+            # 3. 进行中的合成：取消协程，并唤醒等在这些分段上的输出线程
+            with self._inflight_lock:
+                for segment in self._inflight:
+                    if segment.future is not None:
+                        segment.future.cancel()
+                    segment.chunks.put(None)
+            # 4. 音频队列中未写入引擎的音频块；以上各处丢弃的文本，播放完成 Future 结果为 False
+            dropped += [item for item in self._drain(self.audio_queue, keep_sentinel=True) if isinstance(item, _Utterance)]
+        for utterance in dropped:
+            utterance.finish(False)
+        latency = time.perf_counter() - start
+        self.interrupt_latencies.append(latency)
+        logger.info(f"TTS 已打断，{latency * 1000:.1f}ms 后静音")
+        return latency
+
+    @staticmethod
+    def _drain(q: queue.Queue, keep_sentinel: bool = False) -> list:
+        """清空队列并逐项 task_done，返回取出的内容；keep_sentinel 时遇到停止标记 None 放回"""
+        items = []
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None and keep_sentinel:
+                q.task_done()
+                q.put(None)
+                break
+            items.append(item)
+            q.task_done()
+        return items
 
     def _synthesis_worker(self):
         """
-        消费者-生产者中间层：
-        消费 text_queue (文本) -> 生产 audio_queue (音频流)
+        消费 text_queue (文本) -> 分段并提交到事件循环合成；
+        同时在合成或等待输出的分段不超过 lookahead 个，超出时等最早的一段输出完
         """
         while self.is_running:
+            item = self.text_queue.get()
+            if item is None:
+                self._pending.put(None)
+                break
+            text, ready_at, utterance = item
             try:
-                # 阻塞获取文本
-                text = self.text_queue.get()
-                if text is None: break
-                
                 # 1. 文本预处理 (可选)
                 # text = self._preprocess_text(text)
                 
-                # 2. 内部进行文本分段
-                segments = self.splitter.split_text(text)
-                
-                # 3. 逐段请求音频 (保证顺序)
-                for seg in segments:
+                # 2. 内部进行文本分段，逐段提交（输出线程保证顺序）
+                for seg in self.splitter.split_text(text):
                     if not seg.strip():
                         continue
-                    # 这里是阻塞的，必须等这一段的音频流全部接收并放入队列完毕
-                    self._stream_audio_to_queue(seg)
-                
-                self.text_queue.task_done()
-                
+                    self._slots.acquire()
+                    if utterance.generation != self._generation:
+                        # 等待名额期间被打断，这段文本剩余的分段不再合成
+                        self._slots.release()
+                        break
+                    segment = _Segment(seg, utterance.turn_id, ready_at, utterance.generation)
+                    with self._inflight_lock:
+                        self._inflight.add(segment)
+                    cacheable = self.cache is not None and self.cache.cacheable(seg)
+                    audio = self.cache.get(self.voice, seg) if cacheable else None
+                    if audio is not None:
+                        segment.chunks.put(audio)
+                        segment.chunks.put(None)
+                    else:
+                        store = cacheable and self.cache.admit(self.voice, seg)
+                        segment.future = asyncio.run_coroutine_threadsafe(self._synthesize(segment, store=store), self._loop)
+                    self._pending.put(segment)
             except Exception as e:
                 logger.error(f"TTS 合成线程异常: {e}")
-                time.sleep(1)
+            finally:
+                # 输出线程输出完这段文本的全部分段后，把结束标记放入 audio_queue
+                self._pending.put(utterance)
 
-    def _stream_audio_to_queue(self, text):
+    async def _synthesize(self, segment: _Segment, store: bool = False):
+        """在常驻事件循环中合成一段，音频块实时放入 segment.chunks；store=True 时完整合成后写入缓存"""
+        audio = []
+        try:
+            communicate = self.communicate_cls(segment.text, self.voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    # edge_tts 返回的是 mp3 数据块，稍后写入音频引擎，由常驻解码进程解码
+                    segment.chunks.put(chunk["data"])
+                    audio.append(chunk["data"])
+            if store:
+                self.cache.put(self.voice, segment.text, b"".join(audio))
+        except Exception as e:
+            logger.error(f"EdgeTTS 生成异常: {e}")
+        finally:
+            segment.chunks.put(None)
+
+    def prerender(self, phrases: List[str]) -> Optional[Future]:
         """
-        使用 edge_tts 生成音频并将流式数据实时推入 audio_queue
+        后台预合成常用短语（按播报时相同的规则分段）并写入缓存，不参与淘汰；已缓存的只做标记
+        不阻塞调用方，返回的 Future 结果为新合成的分段数
         """
-        async def _gen_audio():
+        if self.cache is None or not phrases:
+            return None
+        segments = list(dict.fromkeys(seg for phrase in phrases for seg in self.splitter.split_text(phrase) if seg.strip()))
+
+        async def _render_all():
+            semaphore = asyncio.Semaphore(self.lookahead)
+
+            async def _render(seg):
+                if self.cache.contains(self.voice, seg):
+                    self.cache.pin(self.voice, seg)
+                    return 0
+                async with semaphore:
+                    try:
+                        communicate = self.communicate_cls(seg, self.voice)
+                        audio = b"".join([chunk["data"] async for chunk in communicate.stream() if chunk["type"] == "audio"])
+                    except Exception as e:
+                        logger.warning(f"预合成失败: {seg}: {e}")
+                        return 0
+                self.cache.put(self.voice, seg, audio, pin=True)
+                return 1
+
+            rendered = sum(await asyncio.gather(*[_render(seg) for seg in segments]))
+            logger.info(f"TTS 预合成完成: {len(segments)} 段，新合成 {rendered} 段")
+            return rendered
+
+        return asyncio.run_coroutine_threadsafe(_render_all(), self._loop)
+
+    def _emit_worker(self):
+        """
+        按提交顺序输出分段：当前段的音频块边合成边放入 audio_queue，后面几段同时在合成，
+        轮到它们时已缓冲的音频块立即输出
+        """
+        # 上一段最后一个音频块放入 audio_queue 的时间
+        last_end = None
+        while True:
+            segment = self._pending.get()
+            if segment is None:
+                break
+            if isinstance(segment, _Utterance):
+                self.audio_queue.put(segment)
+                self.text_queue.task_done()
+                continue
+            first = True
             try:
-                communicate = edge_tts.Communicate(text, self.voice)
-                async for chunk in communicate.stream():
-                    if chunk["type"] == "audio":
-                        # edge_tts 返回的是 mp3 数据块，直接放入队列
-                        # 稍后由 ffplay 通过 pipe:0 自动解码播放
-                        self.audio_queue.put(chunk["data"])
-            except Exception as e:
-                logger.error(f"EdgeTTS 生成异常: {e}")
+                while segment.generation == self._generation:
+                    chunk = segment.chunks.get()
+                    if chunk is None or segment.generation != self._generation:
+                        break
+                    if first:
+                        first = False
+                        now = time.perf_counter()
+                        tracer.mark("tts.first_audio", turn_id=segment.turn_id, once=True)
+                        if last_end is not None and segment.ready_at <= last_end:
+                            # 上一段输出完时这段文本已经到达：连续播报中的空档
+                            self.segment_gaps.append(now - last_end)
+                        else:
+                            self.first_audio_times.append(now - segment.ready_at)
+                    self.audio_queue.put((chunk, segment.generation))
+            finally:
+                with self._inflight_lock:
+                    self._inflight.discard(segment)
+                self._slots.release()
+            if segment.generation != self._generation:
+                # 被打断的分段：之后的文本从空闲开始，计入首个音频块延迟而不是分段空档
+                last_end = None
+            elif not first:
+                last_end = time.perf_counter()
 
-        try:
-            asyncio.run(_gen_audio())
-        except Exception as e:
-            logger.error(f"运行 asyncio 异常: {e}")
+    def stats(self) -> dict:
+        """首个音频块延迟与分段空档的 p50 / p95（毫秒）"""
+        def pct(samples, q):
+            samples = sorted(samples)
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000) if samples else None
+        first_audio, gaps = list(self.first_audio_times), list(self.segment_gaps)
+        return {
+            "lookahead": self.lookahead,
+            "first_audio_p50_ms": pct(first_audio, 0.5),
+            "first_audio_p95_ms": pct(first_audio, 0.95),
+            "gap_n": len(gaps),
+            "gap_p50_ms": pct(gaps, 0.5),
+            "gap_p95_ms": pct(gaps, 0.95),
+            "gap_max_ms": round(max(gaps) * 1000) if gaps else None,
+            # 引擎播放时音频没有及时解码出来的次数
+            "underruns": self.output.underruns,
+        }
 
     def _player_worker(self):
         """
-        最终消费者：消费 audio_queue -> ffplay 进程 (stdin)
-        解决了之前 PyAudio 无法直接播放 MP3 的问题
+        最终消费者：消费 audio_queue -> 音频引擎的 TTS 音源（解码、缓冲、混音与声卡输出都在引擎中常驻）
+        每段文本的结束标记在引擎中放一个 mark，播放到那里时由引擎的完成回调结束这段文本，不轮询
         """
-        # 启动 ffplay 子进程，从 stdin 读取数据，不显示窗口，静默日志
-        # -autoexit 在 stdin 关闭后退出，但在流式播放中我们保持 stdin 打开
-        # -nodisp 隐藏图形窗口
-        # -cache 增大缓存以减少卡顿
-        cmd = [
-            'ffplay', 
-            '-i', 'pipe:0', 
-            '-nodisp', 
-            '-loglevel', 'quiet', 
-            '-autoexit'
-        ]
-        
-        def _start_player():
-            """启动一个新的 ffplay 播放器进程"""
+        while True:
+            item = self.audio_queue.get()
+            if item is None:
+                break
             try:
-                self.player_process = subprocess.Popen(
-                    cmd, 
-                    stdin=subprocess.PIPE, 
-                    stderr=subprocess.PIPE,
-                    bufsize=0 # 无缓冲写入
-                )
-                return True
-            except FileNotFoundError:
-                logger.error("启动播放器失败：未找到 ffplay 命令")
-                return False
+                # 先记下引擎的代数再检查打断代数：两次检查之间被打断时，写入与 mark 都会被引擎按代数作废
+                epoch = self.output.generation
+                if isinstance(item, _Utterance):
+                    if item.generation != self._generation:
+                        item.finish(False)
+                    else:
+                        self.output.mark(epoch).add_done_callback(lambda mark, utterance=item: utterance.finish(mark.result()))
+                else:
+                    chunk, generation = item
+                    if generation == self._generation:
+                        # 写满缓冲时在这里等待（按播放速度反压）
+                        self.output.write(chunk, epoch)
             except Exception as e:
-                logger.error(f"启动播放器异常: {e}")
-                return False
-
-        # 初始启动播放器
-        if not _start_player():
-            return
-
-        try:
-            while self.is_running:
-                try:
-                    # 非阻塞获取音频块（超时100ms）
-                    chunk = None
-                    try:
-                        chunk = self.audio_queue.get(timeout=0.1)
-                        if chunk is None: break
-                    except queue.Empty:
-                        # 音频队列空，检查控制队列
-                        pass
-
-                    # 检查控制队列（非阻塞）
-                    control_cmd = None
-                    try:
-                        control_cmd = self.control_queue.get_nowait()
-                    except queue.Empty:
-                        pass
-
-                    # 处理音频数据
-                    if chunk:
-                        # 将 MP3 数据块写入 ffplay 的标准输入
-                        if self.player_process and self.player_process.stdin:
-                            try:
-                                self.player_process.stdin.write(chunk)
-                                self.player_process.stdin.flush()
-                            except (BrokenPipeError, OSError):
-                                logger.warning("播放器管道断开，尝试重启播放器...")
-                                # 尝试重启播放器
-                                if self.player_process:
-                                    self.player_process.kill()
-                                if _start_player():
-                                    self.player_process.stdin.write(chunk)
-                                    self.player_process.stdin.flush()
-                        self.audio_queue.task_done()
-                    
-                    # 处理控制命令
-                    if control_cmd == "flush":
-                        logger.info("收到播放刷新命令，等待当前音频播放完成...")
-                        # 关闭 stdin，让 ffplay 播放完缓冲的音频后自动退出
-                        if self.player_process and self.player_process.stdin:
-                            try:
-                                self.player_process.stdin.close()
-                            except Exception as e:
-                                logger.error(f"关闭播放器 stdin 失败: {e}")
-                        
-                        # 等待播放器进程退出
-                        try:
-                            self.player_process.wait()
-                            logger.info("当前音频播放完成")
-                            # 触发播放完成事件
-                            self.playback_done_event.set()
-                            # 重置事件，为下次使用做准备
-                            self.playback_done_event.clear()
-                        except subprocess.TimeoutExpired:
-                            logger.warning("播放器超时未退出，强制终止")
-                            self.player_process.kill()
-                        
-                        # 重新启动播放器，准备下一次播放
-                        _start_player()
-                    
-                    # 检查播放器进程是否意外退出
-                    if self.player_process and self.player_process.poll() is not None:
-                        logger.warning("播放器进程意外退出，重新启动")
-                        _start_player()
-                    
-                except Exception as e:
-                    logger.error(f"TTS 播放线程异常: {e}")
-        finally:
-            # 清理工作
-            if self.player_process:
-                try:
-                    if self.player_process.stdin:
-                        self.player_process.stdin.close()
-                    self.player_process.terminate()
-                    self.player_process.wait(timeout=2)
-                except Exception:
-                    pass
-            
-            # 确保播放完成事件被触发
-            self.playback_done_event.set()
+                logger.error(f"TTS 播放线程异常: {e}")
+            finally:
+                self._handled += 1
+                self.audio_queue.task_done()
 
     def _preprocess_text(self, text):
         replacements = {
@@ -247,39 +374,90 @@ class CosyTTS:
         return text
 
     def stop(self):
+        """停止工作线程，事件循环取消完未完成的合成任务后退出；不等待，需要等待时用 close()"""
+        if not self.is_running:
+            return
         self.is_running = False
-        # 放入 None 以解除队列阻塞
+        # 未合成的文本不再播报；放入 None 以解除队列阻塞
+        for _, _, utterance in self._drain(self.text_queue):
+            utterance.finish(False)
         self.text_queue.put(None)
         self.audio_queue.put(None)
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown_loop(), self._loop)
         
-        if self.player_process:
+        # 关闭 TTS 音源（停止解码进程，未播完的文本结果为 False）；引擎与声卡由其他音源继续使用
+        self.output.stop()
+
+    async def _shutdown_loop(self):
+        """取消并等待事件循环中其他未完成的任务（合成、预合成），再停止事件循环，任务不会在循环停止后被丢弃"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.get_running_loop().stop()
+
+    def close(self, timeout: float = 5.0):
+        """stop() 并等待事件循环退出后关闭它（进程退出或不再使用这个 TTS 时调用）"""
+        self.stop()
+        if self._loop is None or self._loop.is_closed():
+            return
+        self.loop_thread.join(timeout)
+        if self.loop_thread.is_alive():
+            logger.warning("TTS 事件循环未能及时退出，未关闭")
+            return
+        self._loop.close()
+
+    def _progress(self) -> tuple:
+        return self._generation, self._handled, self.output.generation, self.output.played, self.output.expected
+
+    def _wait_window(self) -> float:
+        """一次等待的时长：引擎中已写入未播放的音频时长 + playback_margin"""
+        pending = self.output.expected - self.output.played if self.output.expected is not None else 0
+        return max(0.0, pending) / self.engine.sample_rate + self.playback_margin
+
+    def wait_for(self, utterance: Future, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞等待一段话（add_text 返回的 Future）播完，返回 False 表示被打断或放弃等待
+        timeout 为 None 时只要合成或播放仍有进展就继续等，一个等待窗口内毫无进展时记录错误并返回
+        """
+        try:
+            if timeout is not None:
+                return utterance.result(timeout)
+            while True:
+                progress = self._progress()
+                try:
+                    return utterance.result(self._wait_window())
+                except FutureTimeoutError:
+                    if self._progress() == progress:
+                        raise
+        except FutureTimeoutError:
+            logger.error("等待语音播放完成超时，不再等待")
+            return False
+
+    async def await_for(self, utterance: Future) -> bool:
+        """wait_for 的异步版本：在事件循环中等待，不占用线程"""
+        waiter = asyncio.wrap_future(utterance)
+        while True:
+            progress = self._progress()
             try:
-                self.player_process.terminate()
-            except:
-                pass
+                return await asyncio.wait_for(asyncio.shield(waiter), self._wait_window())
+            except asyncio.TimeoutError:
+                if self._progress() == progress:
+                    logger.error("等待语音播放完成超时，不再等待")
+                    return False
 
-    def wait_until_done(self):
+    def wait_until_done(self, timeout: Optional[float] = None) -> bool:
         """
-        可选：阻塞等待所有文本和音频播放完毕
-        确保最后一句语音播放完毕
+        阻塞等待已添加的全部文本播放完毕（只等自己的一段话时用 add_text 返回的 Future 与 wait_for）
+        各段文本按顺序播放，等最后一段的播放完成 Future 即可；返回 False 表示被打断或超时
         """
-        # 1. 等待文本处理完成（所有文本都已转换为音频块）
-        logger.info("等待文本处理完成...")
-        self.text_queue.join()
-        
-        # 2. 等待所有音频块都被发送到播放器
-        logger.info("等待音频数据发送完成...")
-        self.audio_queue.join()
-        
-        # 3. 发送刷新命令，让播放器播放完剩余音频后通知我们
-        logger.info("发送播放刷新命令...")
-        self.control_queue.put("flush")
-        
-        # 4. 等待播放完成事件（最长等待10秒）
-        logger.info("等待最后一段音频播放完成...")
-        self.playback_done_event.wait(timeout=10)
-        
-        logger.info("所有音频播放完毕")
+        utterance = self._last_utterance
+        if utterance is None:
+            return True
+        played = self.wait_for(utterance.future, timeout)
+        logger.info("所有音频播放完毕" if played else "播报未播完")
+        return played
 
 if __name__ == "__main__":
     # 测试代码
@@ -291,4 +469,4 @@ if __name__ == "__main__":
     logger.info("等待所有语音播放完毕...")
     tts.wait_until_done()
     logger.info("测试完成，退出程序")
-    tts.stop()
\ No newline at end of file
+    tts.close()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import configparser
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from logger import logger
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "tts_cache")
+# 记录未命中次数的键数上限，超出时丢弃最久未见的
+MISS_WINDOW = 4096
+
+
+def normalize_text(text: str) -> str:
+    """缓存键使用的文本：去掉首尾与连续空白（空白不影响合成结果）"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(voice: str, text: str) -> str:
+    return hashlib.sha1(f"{voice}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class PhraseCache:
+    """
+    TTS 短语音频缓存：键为 sha1(音色 + 规范化文本)，值为合成得到的完整音频（mp3 字节）
+    - 磁盘层：directory/<键前两位>/<键>.mp3，总大小超过 max_bytes 时按最近使用时间淘汰（预合成的短语不淘汰）
+    - 内存层：最近使用的音频，总大小不超过 memory_bytes
+    只缓存不超过 max_chars 字的分段，长回复逐句都不同，缓存它们只会挤掉常用短语；
+    未预合成的分段第 admit_misses 次未命中时才写入（见 admit），只出现一次的短句不占用缓存
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 200 * 1024 * 1024, memory_bytes: int = 8 * 1024 * 1024,
+                 max_chars: int = 40, admit_misses: int = 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.max_chars = max_chars
+        self.admit_misses = admit_misses
+        self._lock = threading.Lock()
+        # 内存层与磁盘索引：键 -> 音频 / 文件大小，按最近使用排序（最久未用的在前）
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._pinned = set()
+        # 最近未命中的键 -> 未命中次数
+        self._miss_counts: "OrderedDict[str, int]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self._load_index()
+
+    @classmethod
+    def from_config(cls, cfg: configparser.ConfigParser) -> Optional["PhraseCache"]:
+        """从 [TTSCache] 段落创建；未启用时返回 None"""
+        if not cfg.has_section("TTSCache") or not cfg.getboolean("TTSCache", "enabled", fallback=False):
+            return None
+        directory = cfg.get("TTSCache", "directory", fallback="") or DEFAULT_CACHE_DIR
+        return cls(directory=directory,
+                   max_bytes=int(cfg.getfloat("TTSCache", "max_mb", fallback=200) * 1024 * 1024),
+                   memory_bytes=int(cfg.getfloat("TTSCache", "memory_mb", fallback=8) * 1024 * 1024),
+                   max_chars=cfg.getint("TTSCache", "max_chars", fallback=40),
+                   admit_misses=cfg.getint("TTSCache", "admit_misses", fallback=2))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _load_index(self):
+        """启动时扫描缓存目录，按文件修改时间（即最近使用时间）建立磁盘索引"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for sub in os.listdir(self.directory):
+                sub_dir = os.path.join(self.directory, sub)
+                if not os.path.isdir(sub_dir):
+                    continue
+                for filename in os.listdir(sub_dir):
+                    if filename.endswith(".mp3"):
+                        stat = os.stat(os.path.join(sub_dir, filename))
+                        entries.append((stat.st_mtime, filename[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(normalize_text(text)) <= self.max_chars
+
+    def contains(self, voice: str, text: str) -> bool:
+        key = cache_key(voice, text)
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, voice: str, text: str) -> Optional[bytes]:
+        """命中时返回音频并刷新最近使用时间；未命中返回 None"""
+        key = cache_key(voice, text)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return audio
+            if key not in self._disk:
+                self._record_miss(key)
+                return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            # 修改时间即最近使用时间，重启后仍按它排序淘汰
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+                self._record_miss(key)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, audio)
+            self.stats["disk_hits"] += 1
+        return audio
+
+    def _record_miss(self, key: str):
+        self.stats["misses"] += 1
+        self._miss_counts[key] = self._miss_counts.pop(key, 0) + 1
+        if len(self._miss_counts) > MISS_WINDOW:
+            self._miss_counts.popitem(last=False)
+
+    def admit(self, voice: str, text: str) -> bool:
+        """未命中的分段合成后是否写入缓存：最近未命中次数达到 admit_misses 时写入"""
+        with self._lock:
+            return self._miss_counts.get(cache_key(voice, text), 0) >= self.admit_misses
+
+    def put(self, voice: str, text: str, audio: bytes, pin: bool = False):
+        """写入一条完整的音频；pin=True（预合成的短语）时不参与磁盘淘汰"""
+        if not audio:
+            return
+        key = cache_key(voice, text)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"TTS 缓存写入失败: {e}")
+            return
+        with self._lock:
+            self._miss_counts.pop(key, None)
+            if pin:
+                self._pinned.add(key)
+            self._disk_size += len(audio) - self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            self._remember(key, audio)
+            self.stats["stored"] += 1
+            evict = self._evict_disk()
+        for old_key in evict:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def pin(self, voice: str, text: str):
+        with self._lock:
+            self._pinned.add(cache_key(voice, text))
+
+    def _remember(self, key: str, audio: bytes):
+        """放入内存层，超出 memory_bytes 时丢弃最久未用的（磁盘上仍保留）"""
+        if len(audio) > self.memory_bytes:
+            return
+        self._memory_size += len(audio) - len(self._memory.pop(key, b""))
+        self._memory[key] = audio
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def _evict_disk(self) -> List[str]:
+        """磁盘总大小超出 max_bytes 时按最近使用时间淘汰，返回要删除的键（在锁外删除文件）"""
+        evict = []
+        for key in list(self._disk):
+            if self._disk_size <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self._disk_size -= self._disk.pop(key)
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_size -= len(old)
+            evict.append(key)
+        self.stats["evicted"] += len(evict)
+        return evict
+
+    def summary(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {**self.stats, "hit_rate": round(hits / lookups, 3) if lookups else None, "entries": len(self._disk),
+                    "disk_mb": round(self._disk_size / 1024 / 1024, 2), "memory_mb": round(self._memory_size / 1024 / 1024, 2)}
+
+
+def prerender_phrases(cfg: configparser.ConfigParser) -> List[str]:
+    """启动时预合成的短语：[TTSCache] prerender（| 分隔）与各 [Intent.*] 的过渡语"""
+    raw = cfg.get("TTSCache", "prerender", fallback="") if cfg.has_section("TTSCache") else ""
+    phrases = [p.strip() for p in raw.split("|") if p.strip()]
+    for section in cfg.sections():
+        if section.startswith("Intent."):
+            transition = cfg.get(section, "transition", fallback="").strip()
+            if transition:
+                phrases.append(transition)
+    return list(dict.fromkeys(phrases))
@@ -0,0 +1,251 @@
+import configparser
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from brain import base_url as default_base_url, client_pool
+from llm_router import router
+from logger import logger
+
+# Ollama 未指定 keep_alive 时模型的驻留时间（秒）
+OLLAMA_DEFAULT_KEEP_ALIVE = 300.0
+WARMUP_MESSAGES = [{"role": "user", "content": "/no_think\n你好"}]
+
+
+def parse_keep_alive(value) -> float:
+    """把 Ollama 的 keep_alive（如 30m、1h、300、-1）换算为秒；负数表示常驻，返回 inf"""
+    if value is None or value == "":
+        return OLLAMA_DEFAULT_KEEP_ALIVE
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value))
+    if not match:
+        return OLLAMA_DEFAULT_KEEP_ALIVE
+    seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+
+def _parse_expires_at(text: Optional[str]) -> Optional[float]:
+    """/api/ps 返回的 expires_at（纳秒精度的 ISO 时间）换算为距现在的秒数"""
+    if not text:
+        return None
+    try:
+        text = re.sub(r"(\.\d{6})\d+", r"\1", text).replace("Z", "+00:00")
+        return (datetime.fromisoformat(text) - datetime.now(timezone.utc)).total_seconds()
+    except ValueError:
+        return None
+
+
+class ModelResidency:
+    """一个 (端点, 模型) 的驻留状态与预热请求的首 token 延迟"""
+    def __init__(self, endpoint_name: str, base_url: str, api_key: str, model: str, extra_body: Optional[Dict]):
+        self.endpoint_name = endpoint_name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        # 与该模型实际请求相同的 Ollama 参数（keep_alive、options.num_ctx），num_ctx 不同时预热的实例会被重新加载
+        self.extra_body = extra_body
+        self.keep_alive = (extra_body or {}).get("keep_alive")
+        self.num_ctx = (extra_body or {}).get("options", {}).get("num_ctx")
+        # None 表示端点不提供 /api/ps（非 Ollama），按最近一次预热时间推算
+        self.resident: Optional[bool] = None
+        self.expires_in: Optional[float] = None
+        self.last_warm: Optional[float] = None
+        # 需要加载模型（冷启动）与模型已驻留时的首 token 延迟
+        self.load_ttft = deque(maxlen=50)
+        self.warm_ttft = deque(maxlen=50)
+        self.warmups = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def assumed_resident(self) -> bool:
+        """没有 /api/ps 时：最近一次预热后未超过 keep_alive 即视为仍驻留"""
+        if self.resident is not None:
+            return self.resident
+        return self.last_warm is not None and time.monotonic() - self.last_warm < parse_keep_alive(self.keep_alive)
+
+    def stats(self) -> Dict:
+        def p50(samples):
+            return round(sorted(samples)[len(samples) // 2] * 1000) if samples else None
+        return {
+            "endpoint": self.endpoint_name,
+            "model": self.model,
+            "resident": self.resident,
+            "expires_in_s": round(self.expires_in) if self.expires_in is not None else None,
+            "warmups": self.warmups,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "load_ttft_p50_ms": p50(self.load_ttft),
+            "warm_ttft_p50_ms": p50(self.warm_ttft),
+            "last_error": self.last_error,
+        }
+
+
+class ModelWarmup:
+    """
+    模型预热与驻留管理：启动时与每隔 interval 秒，对配置中引用的每个模型（dispatcher、各 Worker、工具声明的模型）
+    在每个提供它的端点上发一次最小请求（1 个输出 token，带 keep_alive），让 Ollama 提前加载并保持驻留
+    - Ollama 端点通过 /api/ps 查询驻留状态：模型仍驻留且剩余时间超过两个周期时跳过本次请求，不占用推理
+    - 每次预热记录首 token 延迟，按请求前是否驻留分别计入 load_ttft（含模型加载）与 warm_ttft，见 stats()
+    预热请求直接发往各端点，不经过 llm_router，不影响路由的延迟统计
+    """
+    def __init__(self, interval: float = 240.0, keep_alive: Optional[str] = "30m", timeout: float = 120.0):
+        self.interval = interval
+        # 模型自身没有配置 keep_alive 时使用
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._models: Dict[str, Optional[Dict]] = {}
+        self._residency: Dict[tuple, ModelResidency] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def from_config(cls, cfg: configparser.ConfigParser) -> Optional["ModelWarmup"]:
+        """从 [Warmup] 段落创建；未启用时返回 None"""
+        if not cfg.has_section("Warmup") or not cfg.getboolean("Warmup", "enabled", fallback=False):
+            return None
+        return cls(interval=cfg.getfloat("Warmup", "interval", fallback=240.0),
+                   keep_alive=cfg.get("Warmup", "keep_alive", fallback="30m") or None,
+                   timeout=cfg.getfloat("Warmup", "timeout", fallback=120.0))
+
+    def add_model(self, model: str, extra_body: Optional[Dict] = None):
+        """
+        登记要预热的模型；extra_body 为使用它的 LLM 的请求参数（LLM_Ollama.extra_body：keep_alive 与 options.num_ctx），
+        预热请求带上相同的参数，驻留的才是实际请求使用的实例；未配置 keep_alive 时使用 [Warmup] keep_alive
+        同一模型多处登记时取第一个（先登记 dispatcher）；num_ctx 不同时 Ollama 会来回重新加载，记录警告
+        """
+        if not model:
+            return
+        extra_body = dict(extra_body or {})
+        if self.keep_alive and "keep_alive" not in extra_body:
+            extra_body["keep_alive"] = self.keep_alive
+        num_ctx = extra_body.get("options", {}).get("num_ctx")
+        with self._lock:
+            registered = (self._models.get(model) or {}).get("options", {}).get("num_ctx")
+            if model not in self._models or (num_ctx and not registered):
+                # 先登记的（如工具声明的模型）没有 num_ctx 时，以配置了 num_ctx 的 LLM 为准
+                self._models[model] = extra_body or None
+                return
+        if num_ctx and num_ctx != registered:
+            logger.warning(f"模型 {model} 配置了不同的 num_ctx（{registered} / {num_ctx}），Ollama 会在两者之间重新加载，预热按 {registered}")
+
+    @property
+    def models(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    def start(self):
+        """后台线程：立即预热一轮，之后每隔 interval 秒一轮"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="model-warmup")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.warm_all()
+            except Exception as e:
+                logger.error(f"模型预热异常: {e}")
+            if self._stop_event.wait(self.interval):
+                return
+
+    def _targets(self) -> List[ModelResidency]:
+        """每个模型在每个提供它的端点上的驻留记录；没有配置端点的模型使用默认地址"""
+        targets = []
+        configured = [ep for ep in router.endpoints() if not ep.implicit]
+        with self._lock:
+            for model, extra_body in self._models.items():
+                endpoints = [(ep.name, ep.base_url, ep.api_key) for ep in configured if ep.serves(model)]
+                for name, url, api_key in endpoints or [("default", default_base_url, "ollama")]:
+                    key = (url.rstrip("/"), model)
+                    if key not in self._residency:
+                        self._residency[key] = ModelResidency(name, url, api_key, model, extra_body)
+                    targets.append(self._residency[key])
+        return targets
+
+    def warm_all(self) -> List[Dict]:
+        """预热一轮（阻塞），返回各模型的统计"""
+        residency_by_host: Dict[str, Optional[Dict]] = {}
+        for target in self._targets():
+            if self._stop_event.is_set():
+                break
+            if target.base_url not in residency_by_host:
+                residency_by_host[target.base_url] = self._query_resident(target)
+            self._update_residency(target, residency_by_host[target.base_url])
+            margin = 2 * self.interval
+            if target.resident and target.expires_in is not None and target.expires_in > margin:
+                target.skipped += 1
+                continue
+            self._warm(target)
+        stats = self.stats()
+        for item in stats:
+            logger.info(f"模型驻留: {item}")
+        return stats
+
+    def _query_resident(self, target: ModelResidency) -> Optional[Dict]:
+        """Ollama /api/ps：已加载模型名 -> (expires_at, context_length)；端点不支持时返回 None"""
+        root = re.sub(r"/v1$", "", target.base_url)
+        try:
+            response = httpx.get(f"{root}/api/ps", timeout=5, headers={"Authorization": f"Bearer {target.api_key}"})
+            if response.status_code != 200:
+                return None
+            return {m.get("name") or m.get("model"): (m.get("expires_at"), m.get("context_length"))
+                    for m in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    @staticmethod
+    def _update_residency(target: ModelResidency, loaded: Optional[Dict]):
+        if loaded is None:
+            target.resident = None
+            target.expires_in = None
+            return
+        names = [target.model] if ":" in target.model else [target.model, f"{target.model}:latest"]
+        name = next((n for n in names if n in loaded), None)
+        expires_at, context_length = loaded[name] if name else (None, None)
+        # 以其他 num_ctx 加载的实例不算驻留：实际请求到来时 Ollama 仍会重新加载（旧版本不返回 context_length 时不比较）
+        if name and target.num_ctx and context_length and context_length != target.num_ctx:
+            name = None
+        target.resident = name is not None
+        target.expires_in = _parse_expires_at(expires_at) if name else None
+
+    def _warm(self, target: ModelResidency):
+        was_resident = target.assumed_resident()
+        start = time.perf_counter()
+        try:
+            client = client_pool.get(target.base_url, target.api_key)
+            stream = client.with_options(timeout=self.timeout).chat.completions.create(
+                model=target.model, messages=WARMUP_MESSAGES, max_tokens=1, stream=True, extra_body=target.extra_body)
+            try:
+                for _ in stream:
+                    break
+            finally:
+                stream.close()
+        except Exception as e:
+            target.failures += 1
+            target.last_error = str(e)
+            logger.warning(f"模型预热失败: {target.model} @ {target.endpoint_name}: {e}")
+            return
+        ttft = time.perf_counter() - start
+        (target.warm_ttft if was_resident else target.load_ttft).append(ttft)
+        target.warmups += 1
+        target.last_warm = time.monotonic()
+        target.last_error = None
+        if target.resident is not None:
+            target.resident = True
+        logger.info(f"模型预热: {target.model} @ {target.endpoint_name} {'已驻留' if was_resident else '加载'} ttft={ttft * 1000:.0f}ms")
+
+    def stats(self) -> List[Dict]:
+        """各 (端点, 模型) 的驻留状态、预热次数与加载 / 驻留时的首 token 延迟 p50"""
+        with self._lock:
+            return [r.stats() for r in self._residency.values()]